@@ -0,0 +1,135 @@
+"""
+In-memory handoff of intermediate audio between process_audio stages.
+
+The pipeline used to pass audio between stages as files on the /data
+Volume: noise reduction wrote a FLOAT WAV for Matchering to read, and
+Matchering wrote a 24-bit WAV that the mastering chain then read back once
+to meter and once more per render pass. For a multi-hour episode that is
+several GB of network-volume I/O per job, for files nobody keeps.
+
+A `Handoff` keeps each intermediate as a float32 (frames, channels) array
+instead. If holding it would leave too little memory for the next stage it
+is spilled to a raw float32 memmap on the container's local scratch disk
+(never the Volume), which downstream code reads through the same array
+interface.
+
+Each buffer records how many times it was read, so `summary()` can report
+the Volume I/O the job avoided: one WAV write plus one WAV read per pass
+(and, separately, any local scratch I/O done instead).
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+import numpy as np
+
+# Local container disk, not the /data Volume
+SCRATCH_DIR = os.environ.get("MASTERING_SCRATCH_DIR", tempfile.gettempdir())
+
+# Memory to leave free for whatever consumes the buffer (streamed mastering
+# chain, excerpts, uploads). Anything that doesn't fit alongside it spills.
+RESERVE_BYTES = 1 << 30
+
+# Bytes per sample of the WAV the buffer replaces
+WAV_FLOAT = 4
+WAV_PCM24 = 3
+
+
+def available_memory() -> int:
+    """Bytes this process can still allocate: the tighter of the cgroup
+    limit (what Modal's `memory=` sets) and the kernel's MemAvailable."""
+    limits = []
+    try:
+        with open("/sys/fs/cgroup/memory.max") as f:
+            raw_max = f.read().strip()
+        with open("/sys/fs/cgroup/memory.current") as f:
+            current = int(f.read().strip())
+        if raw_max != "max":
+            limits.append(int(raw_max) - current)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    limits.append(int(line.split()[1]) * 1024)
+                    break
+    except (OSError, ValueError):
+        pass
+    return max(0, min(limits)) if limits else 0
+
+
+class Handoff:
+    """Intermediate audio buffers for one job."""
+
+    def __init__(self, job_id: str, scratch_dir: str = SCRATCH_DIR):
+        self.job_id = job_id
+        self.scratch_dir = scratch_dir
+        self.buffers: list[dict] = []
+
+    def hold(self, name: str, audio: np.ndarray, sample_rate: int, wav_bytes_per_sample: int) -> dict:
+        """Keep `audio` (frames, channels) for the next stage.
+
+        Returns a buffer dict: {"name", "audio", "sample_rate", "where",
+        "path", "nbytes", "wav_bytes", "reads"}. `audio` is a float32
+        ndarray or, when spilled, a read-only memmap over local scratch."""
+        if audio.ndim == 1:
+            audio = audio[:, None]
+        frames, channels = audio.shape
+        nbytes = frames * channels * 4
+
+        buf = {
+            "name": name,
+            "sample_rate": int(sample_rate),
+            "path": None,
+            "nbytes": nbytes,
+            "wav_bytes": frames * channels * wav_bytes_per_sample,
+            "reads": 0,
+        }
+        if nbytes + RESERVE_BYTES <= available_memory():
+            buf["where"] = "memory"
+            buf["audio"] = np.ascontiguousarray(audio, dtype=np.float32)
+        else:
+            path = os.path.join(self.scratch_dir, f"{self.job_id}_{name}.f32")
+            spill = np.memmap(path, dtype=np.float32, mode="w+", shape=(frames, channels))
+            step = 1 << 20
+            for start in range(0, frames, step):
+                spill[start:start + step] = audio[start:start + step]
+            spill.flush()
+            del spill
+            buf["where"] = "scratch"
+            buf["path"] = path
+            buf["audio"] = np.memmap(path, dtype=np.float32, mode="r", shape=(frames, channels))
+            print(f"[handoff] {name}: {nbytes / 1e6:.0f} MB spilled to {path} (low memory)")
+
+        self.buffers.append(buf)
+        return buf
+
+    def read(self, buf: dict) -> np.ndarray:
+        """The buffer's audio, for a consumer that takes it whole (streamed
+        consumers go through mastering_chain.iter_blocks)."""
+        buf["reads"] += 1
+        return buf["audio"]
+
+    def release(self, buf: dict) -> None:
+        """Drop a buffer's audio once its consumer is done with it."""
+        buf["audio"] = None
+        if buf["path"] and os.path.exists(buf["path"]):
+            os.remove(buf["path"])
+
+    def cleanup(self) -> None:
+        for buf in self.buffers:
+            self.release(buf)
+
+    def summary(self) -> dict:
+        """Volume I/O this job avoided, and the local scratch I/O (if any)
+        it did instead. Bytes."""
+        saved = scratch = 0
+        for buf in self.buffers:
+            passes = 1 + buf["reads"]   # one write, then each read
+            saved += buf["wav_bytes"] * passes
+            if buf["where"] == "scratch":
+                scratch += buf["nbytes"] * passes
+        return {"volume_bytes_saved": saved, "scratch_bytes": scratch}
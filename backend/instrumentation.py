@@ -0,0 +1,148 @@
+"""
+Per-stage spans for a mastering job.
+
+Each stage of master_job runs inside `spans.span(name)`. A span records:
+
+    wall_s        wall-clock seconds
+    cpu_s         process CPU seconds (all threads — numpy, pedalboard and
+                  noisereduce do their heavy lifting off the main thread)
+    peak_rss_mb   highest resident set size reached during the stage
+    bytes         bytes the stage consumed or produced (set by the caller)
+
+Peak RSS is per stage: the kernel's high-water mark (VmHWM) is reset at the
+start of each span by writing "5" to /proc/self/clear_refs. Where that
+isn't allowed, the span falls back to the process-lifetime peak and is
+marked "rss_scope": "process". Spans are sequential, not nested.
+
+The list of span dicts is stored in the job_metrics Dict (not in the job
+status, which every status poll returns) and summarized by `summarize()`
+for /metrics.
+"""
+
+from __future__ import annotations
+
+import resource
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# Content-length buckets for /metrics, in seconds of audio
+DURATION_BUCKETS = (
+    ("<15m", 15 * 60),
+    ("15-60m", 60 * 60),
+    ("1-2h", 2 * 60 * 60),
+    (">2h", float("inf")),
+)
+
+
+def _reset_peak_rss() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Spans:
+    """Stage spans for one job."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.spans: list[dict] = []
+
+    @contextmanager
+    def span(self, name: str, nbytes: int = 0) -> Iterator[dict]:
+        """Time the enclosed stage. The yielded dict is the span record;
+        set `record["bytes"]` (or add extra keys) inside the block."""
+        record = {"stage": name, "bytes": int(nbytes)}
+        scoped = _reset_peak_rss()
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall0, 3)
+            record["cpu_s"] = round(time.process_time() - cpu0, 3)
+            record["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+            if not scoped:
+                record["rss_scope"] = "process"
+            self.spans.append(record)
+            print(
+                f"[span] {name}: {record['wall_s']:.2f} s wall, {record['cpu_s']:.2f} s cpu, "
+                f"peak {record['peak_rss_mb']:.0f} MB, {record['bytes'] / 1e6:.1f} MB"
+            )
+
+    def to_list(self) -> list[dict]:
+        return [dict(s) for s in self.spans]
+
+
+def duration_bucket(duration_s: float | None) -> str:
+    if not duration_s:
+        return "unknown"
+    for name, upper in DURATION_BUCKETS:
+        if duration_s < upper:
+            return name
+    return DURATION_BUCKETS[-1][0]
+
+
+def summarize(records: list[dict]) -> dict:
+    """Aggregate job_metrics records ({"duration", "spans", ...}) per content
+    length bucket and stage: job count, mean/max wall time, mean CPU time,
+    max peak RSS, mean seconds per second of audio, and which stage takes
+    the most wall time in that bucket. Per bucket also the mean Volume I/O
+    the in-memory handoff saved (`intermediate_io`)."""
+    buckets: dict[str, dict] = {}
+    for record in records:
+        bucket = buckets.setdefault(
+            duration_bucket(record.get("duration")), {"jobs": 0, "stages": {}, "volume_bytes_saved": 0},
+        )
+        bucket["jobs"] += 1
+        bucket["volume_bytes_saved"] += (record.get("intermediate_io") or {}).get("volume_bytes_saved", 0)
+        duration = record.get("duration") or 0
+        for span in record.get("spans", []):
+            stage = bucket["stages"].setdefault(span["stage"], {
+                "count": 0, "wall_s": 0.0, "max_wall_s": 0.0, "cpu_s": 0.0,
+                "max_peak_rss_mb": 0.0, "bytes": 0, "audio_s": 0.0,
+            })
+            stage["count"] += 1
+            stage["wall_s"] += span["wall_s"]
+            stage["max_wall_s"] = max(stage["max_wall_s"], span["wall_s"])
+            stage["cpu_s"] += span["cpu_s"]
+            stage["max_peak_rss_mb"] = max(stage["max_peak_rss_mb"], span["peak_rss_mb"])
+            stage["bytes"] += span.get("bytes", 0)
+            stage["audio_s"] += duration
+
+    summary = {}
+    for name, bucket in buckets.items():
+        stages = {}
+        for stage_name, s in bucket["stages"].items():
+            stages[stage_name] = {
+                "count": s["count"],
+                "mean_wall_s": round(s["wall_s"] / s["count"], 3),
+                "max_wall_s": s["max_wall_s"],
+                "mean_cpu_s": round(s["cpu_s"] / s["count"], 3),
+                "max_peak_rss_mb": s["max_peak_rss_mb"],
+                "mean_bytes": s["bytes"] // s["count"],
+                "wall_s_per_audio_s": round(s["wall_s"] / s["audio_s"], 4) if s["audio_s"] else None,
+            }
+        dominant = max(stages, key=lambda k: stages[k]["mean_wall_s"]) if stages else None
+        summary[name] = {
+            "jobs": bucket["jobs"],
+            "dominant_stage": dominant,
+            "mean_volume_mb_saved": round(bucket["volume_bytes_saved"] / bucket["jobs"] / 1e6, 1),
+            "stages": stages,
+        }
+    return summary
@@ -0,0 +1,228 @@
+"""
+Job status storage for the local server (main.py).
+
+Jobs used to live in a module-level dict: gone on restart, invisible to
+other uvicorn workers and never pruned. Two stores with the same methods
+replace it:
+
+  * `SQLiteJobStore` — one `jobs` table in a WAL-mode database, so several
+    worker processes on the box share it (readers never block the writer).
+    `status` and `created_at` are indexed for the active-job lookup and
+    TTL compaction. Progress-only updates are buffered and written in one
+    transaction every `flush_interval_s`; an update that changes `status`
+    is written straight away, together with anything buffered for the job.
+  * `MemoryJobStore` — the old dict behaviour, for tests and JOB_STORE=memory.
+
+A job is a flat dict of COLUMNS. `owner` identifies the server process
+that queued it, so a restarted server can fail jobs whose process is gone.
+
+Usage:
+    store = SQLiteJobStore("jobs.db")
+    store.create({"job_id": job_id, "status": "pending", "progress": 0, ...})
+    store.update(job_id, progress=40, message="Analyzing...")   # batched
+    store.update(job_id, status="completed", progress=100)       # immediate
+    expired = store.compact(ttl_s=7 * 24 * 3600)
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+
+COLUMNS = ("job_id", "status", "progress", "message", "output_file", "owner", "created_at", "updated_at")
+ACTIVE_STATUSES = ("pending", "processing")
+FINISHED_STATUSES = ("completed", "failed")
+FLUSH_INTERVAL_S = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    progress    INTEGER NOT NULL DEFAULT 0,
+    message     TEXT,
+    output_file TEXT,
+    owner       TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+"""
+
+
+def _check_fields(fields: dict) -> None:
+    unknown = set(fields) - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+
+
+class MemoryJobStore:
+    """In-process dict store (per worker, lost on restart)."""
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: dict) -> None:
+        _check_fields(job)
+        now = time.time()
+        with self._lock:
+            self._jobs[job["job_id"]] = {
+                **dict.fromkeys(COLUMNS), "progress": 0,
+                "created_at": now, "updated_at": now, **job,
+            }
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, **fields) -> None:
+        _check_fields(fields)
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def delete(self, job_id: str) -> dict | None:
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+    def active(self) -> list[dict]:
+        with self._lock:
+            return [dict(j) for j in self._jobs.values() if j["status"] in ACTIVE_STATUSES]
+
+    def compact(self, ttl_s: float) -> list[dict]:
+        """Drop finished jobs created more than `ttl_s` ago; returns them."""
+        cutoff = time.time() - ttl_s
+        with self._lock:
+            expired = [
+                job_id for job_id, j in self._jobs.items()
+                if j["status"] in FINISHED_STATUSES and j["created_at"] < cutoff
+            ]
+            return [self._jobs.pop(job_id) for job_id in expired]
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteJobStore:
+    """WAL-mode SQLite store shared by every server process on the box."""
+
+    def __init__(self, path: str, flush_interval_s: float = FLUSH_INTERVAL_S):
+        self.path = path
+        self.flush_interval_s = flush_interval_s
+        # One connection, serialized by _lock: writes are a few ms and
+        # SQLite takes one writer at a time anyway
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending: dict[str, dict] = {}
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="job-store-flush", daemon=True)
+        self._thread.start()
+
+    def create(self, job: dict) -> None:
+        _check_fields(job)
+        now = time.time()
+        row = {**dict.fromkeys(COLUMNS), "progress": 0, "created_at": now, "updated_at": now, **job}
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                [row[c] for c in COLUMNS],
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            # Buffered progress from this process is newer than the row
+            return {**dict(row), **self._pending.get(job_id, {})}
+
+    def update(self, job_id: str, **fields) -> None:
+        """Buffer a progress update; a `status` change is written at once."""
+        _check_fields(fields)
+        fields["updated_at"] = time.time()
+        with self._lock:
+            pending = self._pending.setdefault(job_id, {})
+            pending.update(fields)
+            if "status" in fields:
+                self._write([(job_id, self._pending.pop(job_id))])
+
+    def delete(self, job_id: str) -> dict | None:
+        with self._lock:
+            self._pending.pop(job_id, None)
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            return dict(row) if row else None
+
+    def active(self) -> list[dict]:
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({', '.join('?' for _ in ACTIVE_STATUSES)})",
+                ACTIVE_STATUSES,
+            ).fetchall()
+            return [dict(r) for r in rows]
+
+    def compact(self, ttl_s: float) -> list[dict]:
+        """Drop finished jobs created more than `ttl_s` ago; returns them."""
+        cutoff = time.time() - ttl_s
+        where = f"status IN ({', '.join('?' for _ in FINISHED_STATUSES)}) AND created_at < ?"
+        params = (*FINISHED_STATUSES, cutoff)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(f"SELECT * FROM jobs WHERE {where}", params).fetchall()
+                self._conn.execute(f"DELETE FROM jobs WHERE {where}", params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            for row in rows:
+                self._pending.pop(row["job_id"], None)
+        return [dict(r) for r in rows]
+
+    def _write(self, updates: list[tuple[str, dict]]) -> None:
+        """Apply updates in one transaction. Caller holds _lock."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for job_id, fields in updates:
+                self._conn.execute(
+                    f"UPDATE jobs SET {', '.join(f'{c} = ?' for c in fields)} WHERE job_id = ?",
+                    (*fields.values(), job_id),
+                )
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            updates = list(self._pending.items())
+            self._pending.clear()
+            try:
+                self._write(updates)
+            except sqlite3.Error as e:
+                # Keep them for the next flush; newer values win on merge
+                print(f"[jobs] progress flush failed: {e}")
+                for job_id, fields in updates:
+                    self._pending[job_id] = {**fields, **self._pending.get(job_id, {})}
+
+    def _run(self) -> None:
+        while not self._closed.wait(self.flush_interval_s):
+            self.flush()
+
+    def close(self) -> None:
+        self._closed.set()
+        self._thread.join()
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -7,22 +7,42 @@ https://github.com/sergree/matchering
 import os
 import uuid
 import asyncio
+import glob
+import hashlib
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+import aiofiles
 import matchering as mg
 
+from job_store import MemoryJobStore, SQLiteJobStore
+from progress import job_progress
+from status_stream import SSE_HEADERS, StatusWatchers
+
 # Configuration
 UPLOAD_DIR = Path("uploads")
 OUTPUT_DIR = Path("outputs")
 UPLOAD_DIR.mkdir(exist_ok=True)
 OUTPUT_DIR.mkdir(exist_ok=True)
 
+ALLOWED_EXTENSIONS = {".wav", ".mp3", ".flac", ".aiff", ".ogg", ".m4a"}
+
+# Uploads are streamed to disk in chunks, never held whole in memory.
+# 4 GB covers a 4-hour 24-bit stereo WAV.
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 4 * 1024 ** 3))
+
 # Custom Matchering config for long podcasts (up to 4 hours at 44.1kHz)
 # Default max_length is ~15 minutes, we extend to ~4 hours
 # 4 hours * 60 min * 60 sec * 44100 samples/sec = 635,040,000 samples
@@ -30,8 +50,147 @@ PODCAST_CONFIG = mg.Config(
     max_length=635_040_000,  # ~4 hours at 44.1kHz
 )
 
-# Store processing status
-processing_jobs: dict[str, dict] = {}
+# Job execution. Matchering runs in a process pool by default so concurrent
+# jobs don't contend for one GIL; MASTERING_EXECUTOR=thread runs them in
+# threads of this process instead. Jobs wait in a bounded FIFO queue and
+# /master answers 503 once MAX_QUEUED_JOBS are waiting.
+MASTERING_EXECUTOR = os.environ.get("MASTERING_EXECUTOR", "process")
+MAX_QUEUED_JOBS = int(os.environ.get("MAX_QUEUED_JOBS", 16))
+# Rough peak memory of one job; Matchering holds several float64 copies
+# of both files, so long stereo episodes need this much or more
+JOB_MEMORY_MB = int(os.environ.get("JOB_MEMORY_MB", 8192))
+
+
+def available_memory_mb() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 ** 2)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_max_concurrent_jobs() -> int:
+    """One job per core, but no more than fit in available RAM."""
+    cores = os.cpu_count() or 1
+    memory_mb = available_memory_mb()
+    if memory_mb is None:
+        return cores
+    return max(1, min(cores, memory_mb // JOB_MEMORY_MB))
+
+
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS") or default_max_concurrent_jobs())
+
+# Job status store. The SQLite default keeps job history across restarts
+# and is shared by all uvicorn workers on the box (each worker still runs
+# its own queue and pool, so the limits above are per worker).
+JOB_STORE = os.environ.get("JOB_STORE", "sqlite")
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "jobs.db")
+# Finished jobs (and their outputs) are dropped this long after creation
+JOB_TTL_HOURS = float(os.environ.get("JOB_TTL_HOURS", 72))
+COMPACT_INTERVAL_S = 3600
+
+# Store processing status (set up in lifespan)
+processing_jobs = None
+
+
+def process_owner(pid: Optional[int] = None) -> str:
+    """pid plus start time, so a reused pid isn't taken for the old process"""
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f"{pid}:{f.read().rsplit(')', 1)[1].split()[19]}"
+    except (OSError, IndexError):
+        return str(pid)
+
+
+def owner_alive(owner: Optional[str]) -> bool:
+    if not owner:
+        return False
+    pid = int(owner.split(":")[0])
+    if ":" in owner:
+        return process_owner(pid) == owner
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def fail_orphaned_jobs():
+    """Fail queued/running jobs whose server process is gone (restart)"""
+    for job in processing_jobs.active():
+        if not owner_alive(job["owner"]):
+            processing_jobs.update(
+                job["job_id"], status="failed", message="Error: server restarted before the job finished"
+            )
+
+
+def compact_jobs():
+    """Drop expired finished jobs and their output files"""
+    expired = processing_jobs.compact(JOB_TTL_HOURS * 3600)
+    for job in expired:
+        if job.get("output_file"):
+            (OUTPUT_DIR / job["output_file"]).unlink(missing_ok=True)
+    if expired:
+        print(f"[jobs] compacted {len(expired)} finished job(s)")
+
+
+async def compact_periodically():
+    while True:
+        await asyncio.to_thread(compact_jobs)
+        await asyncio.sleep(COMPACT_INTERVAL_S)
+
+# Set up in lifespan: the job queue, pending job_ids in FIFO order (for
+# queue_position), the executor and the queue workers send progress on
+job_queue: Optional[asyncio.Queue] = None
+queued_jobs: deque[str] = deque()
+executor = None
+progress_queue = None
+
+# file_id -> {"path", "original_name", "size", "sha256", "uploaded_at"}, so
+# /master and /cleanup never scan UPLOAD_DIR. Rebuilt from disk at startup.
+upload_index: dict[str, dict] = {}
+
+
+def index_existing_uploads():
+    """Index uploads left from a previous run (no hash: not re-read)."""
+    for f in UPLOAD_DIR.iterdir():
+        if f.suffix.lower() in ALLOWED_EXTENSIONS and f.stem not in upload_index:
+            stat = f.stat()
+            upload_index[f.stem] = {
+                "path": f,
+                "original_name": f.name,
+                "size": stat.st_size,
+                "sha256": None,
+                "uploaded_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            }
+
+
+def find_upload(file_id: str) -> Optional[Path]:
+    """Path of an upload; falls back to disk for files another worker took"""
+    if file_id in upload_index:
+        return upload_index[file_id]["path"]
+    for ext in ALLOWED_EXTENSIONS:
+        path = UPLOAD_DIR / f"{file_id}{ext}"
+        if path.exists():
+            stat = path.stat()
+            upload_index[file_id] = {
+                "path": path,
+                "original_name": path.name,
+                "size": stat.st_size,
+                "sha256": None,
+                "uploaded_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            }
+            return path
+    return None
 
 
 class ProcessingStatus(BaseModel):
@@ -40,6 +199,7 @@ class ProcessingStatus(BaseModel):
     progress: int  # 0-100
     message: Optional[str] = None
     output_file: Optional[str] = None
+    queue_position: Optional[int] = None  # 1 = next to start
 
 
 class MasteringRequest(BaseModel):
@@ -50,11 +210,30 @@ class MasteringRequest(BaseModel):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
-    # Startup: create directories
+    # Startup: create directories, index what's already uploaded
     UPLOAD_DIR.mkdir(exist_ok=True)
     OUTPUT_DIR.mkdir(exist_ok=True)
+    index_existing_uploads()
+    global job_queue, processing_jobs
+    processing_jobs = SQLiteJobStore(JOB_DB_PATH) if JOB_STORE == "sqlite" else MemoryJobStore()
+    fail_orphaned_jobs()
+    compactor = asyncio.create_task(compact_periodically())
+    job_queue = asyncio.Queue(maxsize=MAX_QUEUED_JOBS)
+    start_executor()
+    workers = [asyncio.create_task(job_worker()) for _ in range(MAX_CONCURRENT_JOBS)]
+    print(
+        f"[jobs] {MAX_CONCURRENT_JOBS} concurrent job(s) in a {MASTERING_EXECUTOR} pool, "
+        f"up to {MAX_QUEUED_JOBS} queued"
+    )
     yield
-    # Shutdown: cleanup could go here
+    # Shutdown: stop taking jobs, abandon queued ones (failed on next start)
+    compactor.cancel()
+    for worker in workers:
+        worker.cancel()
+    executor.shutdown(wait=False, cancel_futures=True)
+    if progress_queue is not None:
+        progress_queue.put(None)
+    processing_jobs.close()
 
 
 app = FastAPI(
@@ -74,71 +253,147 @@ app.add_middleware(
 )
 
 
-def process_audio_sync(job_id: str, target_path: str, reference_path: str, output_path: str):
+def process_audio_sync(job_id: str, target_path: str, reference_path: str, output_path: str, report):
     """
     Synchronous audio processing function using Matchering
-    This runs in a thread pool executor
+    This runs in a pool worker (process or thread); status changes go
+    through report(**fields) rather than touching processing_jobs directly
     """
     try:
-        processing_jobs[job_id]["status"] = "processing"
-        processing_jobs[job_id]["progress"] = 10
-        processing_jobs[job_id]["message"] = "Loading audio files..."
+        report(status="processing", progress=10, message="Loading audio files...")
 
         # Custom log handler to update progress
         def log_handler(message: str):
             # Parse matchering log messages to estimate progress
-            processing_jobs[job_id]["message"] = message
+            update = {"message": message}
             
             if "Loading" in message:
-                processing_jobs[job_id]["progress"] = 20
+                update["progress"] = 20
             elif "Analyzing" in message:
-                processing_jobs[job_id]["progress"] = 40
+                update["progress"] = 40
             elif "Matching" in message:
-                processing_jobs[job_id]["progress"] = 60
+                update["progress"] = 60
             elif "Limiting" in message:
-                processing_jobs[job_id]["progress"] = 80
+                update["progress"] = 80
             elif "Saving" in message:
-                processing_jobs[job_id]["progress"] = 90
-
-        # Set up matchering logging
-        mg.log(log_handler)
+                update["progress"] = 90
+            report(**update)
 
         # Process the audio using Matchering with custom config for long podcasts
         # Reference: https://github.com/sergree/matchering
-        mg.process(
-            target=target_path,
-            reference=reference_path,
-            config=PODCAST_CONFIG,  # Use custom config for longer audio
-            results=[
-                mg.pcm16(output_path),  # 16-bit WAV output
-            ],
+        # Its log is routed to this job's handler, so jobs sharing a process
+        # (MASTERING_EXECUTOR=thread) don't get each other's progress
+        with job_progress(job_id, log_handler):
+            mg.process(
+                target=target_path,
+                reference=reference_path,
+                config=PODCAST_CONFIG,  # Use custom config for longer audio
+                results=[
+                    mg.pcm16(output_path),  # 16-bit WAV output
+                ],
+            )
+
+        report(
+            status="completed",
+            progress=100,
+            message="Mastering complete!",
+            output_file=os.path.basename(output_path),
         )
 
-        processing_jobs[job_id]["status"] = "completed"
-        processing_jobs[job_id]["progress"] = 100
-        processing_jobs[job_id]["message"] = "Mastering complete!"
-        processing_jobs[job_id]["output_file"] = os.path.basename(output_path)
-
     except Exception as e:
-        processing_jobs[job_id]["status"] = "failed"
-        processing_jobs[job_id]["message"] = f"Error: {str(e)}"
+        report(status="failed", message=f"Error: {str(e)}")
         raise
 
 
+# Set in each pool process by _init_worker
+_worker_progress_queue = None
+
+
+def _init_worker(queue):
+    global _worker_progress_queue
+    _worker_progress_queue = queue
+
+
+def process_audio_in_worker(job_id: str, target_path: str, reference_path: str, output_path: str):
+    """Pool-process entry point: progress goes back over the shared queue"""
+    def report(**fields):
+        _worker_progress_queue.put((job_id, fields))
+
+    process_audio_sync(job_id, target_path, reference_path, output_path, report)
+
+
+def apply_progress(queue):
+    """Thread in the server process: apply workers' updates in order"""
+    while (item := queue.get()) is not None:
+        job_id, fields = item
+        processing_jobs.update(job_id, **fields)
+
+
+def start_executor():
+    global executor, progress_queue
+    if MASTERING_EXECUTOR == "thread":
+        executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="mastering")
+        return
+    # spawn, not fork: the server process already runs threads
+    context = multiprocessing.get_context("spawn")
+    if progress_queue is None:
+        progress_queue = context.Queue()
+        threading.Thread(target=apply_progress, args=(progress_queue,), daemon=True).start()
+    executor = ProcessPoolExecutor(
+        max_workers=MAX_CONCURRENT_JOBS,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(progress_queue,),
+    )
+
+
 async def process_audio(job_id: str, target_path: str, reference_path: str, output_path: str):
     """
     Async wrapper for audio processing
-    Runs the CPU-intensive Matchering process in a thread pool
+    Runs the CPU-intensive Matchering process in the job executor
     """
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(
-        None, 
-        process_audio_sync, 
-        job_id, 
-        target_path, 
-        reference_path, 
-        output_path
-    )
+    loop = asyncio.get_running_loop()
+    pool = executor
+    try:
+        if MASTERING_EXECUTOR == "thread":
+            def report(**fields):
+                processing_jobs.update(job_id, **fields)
+
+            await loop.run_in_executor(
+                pool, process_audio_sync, job_id, target_path, reference_path, output_path, report
+            )
+        else:
+            await loop.run_in_executor(
+                pool, process_audio_in_worker, job_id, target_path, reference_path, output_path
+            )
+    except BrokenProcessPool:
+        # A worker died mid-job (usually OOM-killed); the pool is unusable
+        # until replaced. Jobs running alongside it fail the same way.
+        processing_jobs.update(job_id, status="failed", message="Error: mastering worker crashed")
+        if executor is pool:
+            print("[jobs] process pool broke, starting a new one")
+            pool.shutdown(wait=False)
+            start_executor()
+    except Exception as e:
+        job = processing_jobs.get(job_id)
+        if job and job["status"] != "failed":
+            processing_jobs.update(job_id, status="failed", message=f"Error: {str(e)}")
+
+
+async def job_worker():
+    """Take jobs off the queue in FIFO order, one at a time"""
+    while True:
+        job_id, args = await job_queue.get()
+        try:
+            queued_jobs.remove(job_id)
+        except ValueError:
+            pass
+        try:
+            # Skip jobs cleaned up while they were waiting
+            if processing_jobs.get(job_id):
+                await process_audio(job_id, *args)
+        finally:
+            job_queue.task_done()
 
 
 @app.get("/")
@@ -152,57 +407,78 @@ async def upload_file(file: UploadFile = File(...)):
     """
     Upload an audio file (target or reference)
     Returns the file ID for later use
+
+    The body is streamed to disk UPLOAD_CHUNK_SIZE at a time (hashed on the
+    way) and rejected with 413 once it passes MAX_UPLOAD_BYTES.
     """
     # Validate file type
-    allowed_extensions = {".wav", ".mp3", ".flac", ".aiff", ".ogg", ".m4a"}
     file_ext = Path(file.filename).suffix.lower()
     
-    if file_ext not in allowed_extensions:
+    if file_ext not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=400,
-            detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+            detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
     # Generate unique filename
     file_id = str(uuid.uuid4())
     filename = f"{file_id}{file_ext}"
     file_path = UPLOAD_DIR / filename
+    partial_path = UPLOAD_DIR / f"{filename}.part"
 
     # Save the file
+    size = 0
+    sha256 = hashlib.sha256()
     try:
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        async with aiofiles.open(partial_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large (max {MAX_UPLOAD_BYTES // (1024 ** 2)} MB)",
+                    )
+                sha256.update(chunk)
+                await f.write(chunk)
+        os.replace(partial_path, file_path)
+    except HTTPException:
+        partial_path.unlink(missing_ok=True)
+        raise
     except Exception as e:
+        partial_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    finally:
+        await file.close()
+
+    upload_index[file_id] = {
+        "path": file_path,
+        "original_name": file.filename,
+        "size": size,
+        "sha256": sha256.hexdigest(),
+        "uploaded_at": datetime.now().isoformat(),
+    }
 
     return {
         "file_id": file_id,
         "filename": filename,
         "original_name": file.filename,
-        "size": len(content),
+        "size": size,
+        "sha256": upload_index[file_id]["sha256"],
     }
 
 
 @app.post("/master")
 async def start_mastering(
-    background_tasks: BackgroundTasks,
     target_file_id: str,
     reference_file_id: str,
 ):
     """
-    Start the audio mastering process
-    Returns a job ID to track progress
+    Queue the audio mastering process
+    Returns a job ID to track progress, or 503 if the queue is full
     """
     # Find the uploaded files
-    target_file = None
-    reference_file = None
-    
-    for f in UPLOAD_DIR.iterdir():
-        if f.stem == target_file_id:
-            target_file = f
-        if f.stem == reference_file_id:
-            reference_file = f
+    target_file = find_upload(target_file_id)
+    reference_file = find_upload(reference_file_id)
 
     if not target_file or not target_file.exists():
         raise HTTPException(status_code=404, detail="Target file not found")
@@ -210,48 +486,92 @@ async def start_mastering(
     if not reference_file or not reference_file.exists():
         raise HTTPException(status_code=404, detail="Reference file not found")
 
+    if job_queue.full():
+        raise HTTPException(
+            status_code=503,
+            detail=f"Mastering queue is full ({MAX_QUEUED_JOBS} jobs waiting), try again later",
+            headers={"Retry-After": "60"},
+        )
+
     # Create job
     job_id = str(uuid.uuid4())
     output_filename = f"{job_id}_mastered.wav"
     output_path = OUTPUT_DIR / output_filename
 
-    processing_jobs[job_id] = {
+    processing_jobs.create({
         "job_id": job_id,
         "status": "pending",
         "progress": 0,
         "message": "Queued for processing...",
         "output_file": None,
-    }
+        "owner": process_owner(),
+    })
 
-    # Start processing in background
-    background_tasks.add_task(
-        process_audio,
-        job_id,
-        str(target_file),
-        str(reference_file),
-        str(output_path),
-    )
+    # Queue for the job workers
+    queued_jobs.append(job_id)
+    job_queue.put_nowait((job_id, (str(target_file), str(reference_file), str(output_path))))
 
-    return {"job_id": job_id, "message": "Mastering job started"}
+    return {"job_id": job_id, "message": "Mastering job queued", "queue_position": len(queued_jobs)}
 
 
 @app.get("/status/{job_id}")
 async def get_status(job_id: str):
     """Get the status of a mastering job"""
-    if job_id not in processing_jobs:
+    job = processing_jobs.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return ProcessingStatus(**processing_jobs[job_id])
+    return public_status(job)
+
+
+def public_status(job: dict) -> dict:
+    job_id = job["job_id"]
+    queue_position = queued_jobs.index(job_id) + 1 if job_id in queued_jobs else None
+    return ProcessingStatus(**job, queue_position=queue_position).model_dump()
+
+
+async def fetch_status(job_id: str):
+    # Public fields only, so queue_position moves count as changes and
+    # internal bookkeeping (updated_at) doesn't
+    job = processing_jobs.get(job_id)
+    return public_status(job) if job else None
+
+
+# One store reader per watched job, shared by all its streams / long polls
+status_watchers = StatusWatchers(fetch_status, interval_s=0.5)
+
+
+@app.get("/status/{job_id}/stream")
+async def stream_status(job_id: str):
+    """
+    Server-sent events instead of polling /status: the full status first,
+    then only the changed fields, and an `end` event once the job is done
+    """
+    if processing_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        status_watchers.sse(job_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+@app.get("/status/{job_id}/wait")
+async def wait_for_status(job_id: str, etag: Optional[str] = None, timeout: float = 25):
+    """Long poll: answers once the status differs from `etag` (or after timeout)"""
+    status, new_etag = await status_watchers.wait_for_change(job_id, etag, timeout)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {**status, "etag": new_etag}
 
 
 @app.get("/download/{job_id}")
 async def download_result(job_id: str):
     """Download the mastered audio file"""
-    if job_id not in processing_jobs:
+    job = processing_jobs.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = processing_jobs[job_id]
-    
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Job not completed yet")
     
@@ -270,22 +590,24 @@ async def download_result(job_id: str):
 @app.delete("/cleanup/{job_id}")
 async def cleanup_job(job_id: str):
     """Clean up files associated with a job"""
-    if job_id in processing_jobs:
-        job = processing_jobs[job_id]
-        
+    job = processing_jobs.delete(job_id)
+    if job is not None:
         # Remove output file if exists
         if job.get("output_file"):
             output_file = OUTPUT_DIR / job["output_file"]
             if output_file.exists():
                 output_file.unlink()
         
-        # Remove job from memory
-        del processing_jobs[job_id]
+        # A queued job is skipped once it's out of the store
+        if job_id in queued_jobs:
+            queued_jobs.remove(job_id)
     
-    # Clean up any files with this job_id prefix in uploads
-    for f in UPLOAD_DIR.iterdir():
-        if f.stem == job_id or f.stem.startswith(job_id):
-            f.unlink()
+    # Clean up any uploads with this job_id prefix; from disk too, since
+    # another worker may have received them
+    for file_id in [i for i in upload_index if i.startswith(job_id)]:
+        upload_index.pop(file_id)["path"].unlink(missing_ok=True)
+    for path in UPLOAD_DIR.glob(f"{glob.escape(job_id)}*"):
+        path.unlink(missing_ok=True)
     
     return {"message": "Cleanup completed"}
 
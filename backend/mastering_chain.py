@@ -0,0 +1,258 @@
+"""
+Post-Matchering polish + loudness + write, streamed in fixed-size blocks.
+
+The old stage read the whole Matchering output with `sf.read` and made
+several full-length copies (transpose, contiguous copy, nan_to_num, clip)
+before `sf.write`. A 4-hour stereo episode at 48 kHz is ~5.5 GB per float32
+copy. Here every stage runs on BLOCK_FRAMES-sized blocks pulled through
+`sf.SoundFile`, with pedalboard plugin state carried across blocks
+(`reset=False`), so peak memory is a few blocks regardless of duration.
+
+The source is either a file or a handoff buffer (handoff.py) holding the
+Matchering result in memory, so the chain never needs an intermediate WAV.
+
+None of the plugins we use report latency (filters, compressor, JUCE
+limiter), so block-wise output is sample-identical to a whole-file render.
+
+Loudness is set by `solve_makeup_gain()` instead of a measure / render /
+re-measure loop: the unlimited loudness at any gain comes straight from the
+meter's per-hop energies, and the limiter's effect is measured on a few
+seconds of excerpts kept from the metering pass. The full file is then
+rendered once, and the meter on that render is the verification.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from typing import Iterator
+
+import numpy as np
+import soundfile as sf
+from pedalboard import (
+    Pedalboard, HighpassFilter, PeakFilter, Compressor, Gain, Limiter,
+)
+
+from loudness import LoudnessMeter
+
+# 2^18 frames ≈ 6 s @ 44.1 kHz ≈ 2 MB per float32 stereo block
+BLOCK_FRAMES = 1 << 18
+
+LIMITER_RELEASE_MS = 100.0
+
+# Seconds of evenly spaced audio kept from the metering pass to calibrate the
+# limiter's effect on loudness. Short files are kept whole.
+EXCERPT_SECONDS = 30.0
+
+# Same convergence tolerance the old 3-pass loop used
+LOUDNESS_TOLERANCE_LU = 0.3
+MAX_GAIN_DB = 24.0
+SOLVER_ITERATIONS = 6
+
+
+def build_polish_chain(audio_type: str) -> Pedalboard:
+    """Polish chain shape depends on what we're mastering. Voice content
+    benefits from de-essing and a presence lift around 2.8 kHz; music
+    has full-spectrum content where those moves would dull cymbals,
+    harshen drums, or scoop the body of guitars/keys."""
+    if audio_type == "music":
+        print("Polish chain: music (HPF + gentle glue)")
+        return Pedalboard([
+            HighpassFilter(cutoff_frequency_hz=25.0),                                # preserve bass; just kill subsonic
+            Compressor(threshold_db=-20.0, ratio=1.6, attack_ms=20.0, release_ms=150.0),  # gentle glue, slower attack
+        ])
+    print("Polish chain: podcast (HPF + EQ + de-ess + glue)")
+    return Pedalboard([
+        HighpassFilter(cutoff_frequency_hz=40.0),                       # remove subsonic / DC
+        PeakFilter(cutoff_frequency_hz=200.0,  gain_db=-1.0, q=0.7),    # tame low-mud
+        PeakFilter(cutoff_frequency_hz=2800.0, gain_db= 1.0, q=0.8),    # subtle presence
+        PeakFilter(cutoff_frequency_hz=6500.0, gain_db=-2.5, q=2.5),    # gentle de-esser
+        Compressor(threshold_db=-18.0, ratio=2.0, attack_ms=8.0, release_ms=100.0),  # glue + level
+    ])
+
+
+def build_finalize_chain(gain_db: float, ceiling_db: float) -> Pedalboard:
+    """Makeup gain into the true-peak brickwall limiter."""
+    return Pedalboard([
+        Gain(gain_db=gain_db),
+        Limiter(threshold_db=ceiling_db, release_ms=LIMITER_RELEASE_MS),
+    ])
+
+
+def source_info(source: str | dict) -> tuple[int, int, int]:
+    """(sample_rate, channels, frames) of an audio file or handoff buffer."""
+    if isinstance(source, dict):
+        frames, channels = source["audio"].shape
+        return source["sample_rate"], channels, frames
+    info = sf.info(source)
+    return info.samplerate, info.channels, info.frames
+
+
+def iter_blocks(source: str | dict, block_frames: int = BLOCK_FRAMES) -> Iterator[np.ndarray]:
+    """Yield (frames, channels) float32 blocks from an audio file, or from a
+    handoff buffer (see handoff.py) whose `reads` count is bumped per pass."""
+    if isinstance(source, dict):
+        audio = source["audio"]
+        for start in range(0, audio.shape[0], block_frames):
+            yield audio[start:start + block_frames]
+        source["reads"] += 1
+        return
+    with sf.SoundFile(source) as f:
+        while True:
+            block = f.read(block_frames, dtype="float32", always_2d=True)
+            if block.shape[0] == 0:
+                break
+            yield block
+
+
+def _polished_blocks(source: str | dict, polish_chain: Pedalboard, sample_rate: int,
+                     block_frames: int) -> Iterator[np.ndarray]:
+    """Stream `source` through the polish chain. Yields (channels, frames)."""
+    polish_chain.reset()
+    for block in iter_blocks(source, block_frames):
+        # pedalboard expects (channels, samples)
+        yield polish_chain(np.ascontiguousarray(block.T), sample_rate, reset=False)
+
+
+def _excerpt_stride(total_frames: int, sample_rate: int, block_frames: int) -> tuple[int, int]:
+    """(stride, count) for keeping ~EXCERPT_SECONDS of evenly spaced blocks."""
+    n_blocks = max(1, math.ceil(total_frames / block_frames))
+    wanted = max(1, math.ceil(EXCERPT_SECONDS * sample_rate / block_frames))
+    return max(1, n_blocks // wanted), wanted
+
+
+def measure_polished(source: str | dict, polish_chain: Pedalboard,
+                     block_frames: int = BLOCK_FRAMES) -> tuple[LoudnessMeter, list[np.ndarray]]:
+    """Meter `source` (file path or handoff buffer) after the polish chain,
+    without keeping the polished audio around. Returns the meter plus
+    ~EXCERPT_SECONDS of evenly spaced polished blocks (channels, frames) for
+    `solve_makeup_gain()`."""
+    sr, channels, frames = source_info(source)
+    meter = LoudnessMeter(sr, channels)
+    stride, wanted = _excerpt_stride(frames, sr, block_frames)
+
+    excerpts: list[np.ndarray] = []
+    for i, polished in enumerate(_polished_blocks(source, polish_chain, sr, block_frames)):
+        meter.feed(polished.T)
+        if i % stride == 0 and len(excerpts) < wanted:
+            excerpts.append(polished)
+    return meter, excerpts
+
+
+def _excerpt_loudness(excerpts: list[np.ndarray], sample_rate: int) -> float:
+    meter = LoudnessMeter(sample_rate, excerpts[0].shape[0])
+    for excerpt in excerpts:
+        meter.feed(excerpt.T)
+    return meter.integrated_loudness()
+
+
+def solve_makeup_gain(meter: LoudnessMeter, excerpts: list[np.ndarray], sample_rate: int,
+                      target_lufs: float, ceiling_db: float) -> float:
+    """Predict the gain that makes Gain -> Limiter land on `target_lufs`.
+
+    predicted(g) = metered loudness re-gated at gain g (no re-filtering)
+                 + (limited - unlimited loudness of the excerpts at gain g)
+
+    Solved with a few secant steps; each step only renders the excerpts."""
+    source_lufs = meter.integrated_loudness()
+    if not np.isfinite(source_lufs) or source_lufs < -70.0 or not excerpts:
+        # Silent / near-silent input: same fallback as before (-40 LUFS)
+        return float(np.clip(target_lufs + 40.0, -MAX_GAIN_DB, MAX_GAIN_DB))
+
+    excerpt_lufs = _excerpt_loudness(excerpts, sample_rate)
+
+    def predict(gain_db: float) -> float:
+        unlimited = meter.integrated_loudness(gain_db)
+        if not np.isfinite(excerpt_lufs):
+            return unlimited
+        finalize = build_finalize_chain(gain_db, ceiling_db)
+        limited = _excerpt_loudness([finalize(e, sample_rate) for e in excerpts], sample_rate)
+        return unlimited + (limited - excerpt_lufs - gain_db)
+
+    g0 = float(np.clip(target_lufs - source_lufs, -MAX_GAIN_DB, MAX_GAIN_DB))
+    p0 = predict(g0)
+    g1 = float(np.clip(g0 + (target_lufs - p0), -MAX_GAIN_DB, MAX_GAIN_DB))
+    p1 = predict(g1)
+    for _ in range(SOLVER_ITERATIONS):
+        if abs(target_lufs - p1) < 0.05 or g1 == g0:
+            break
+        # Limiting only ever flattens the curve, so keep the slope in (0, 1]
+        slope = float(np.clip((p1 - p0) / (g1 - g0), 0.1, 1.0))
+        g0, p0 = g1, p1
+        g1 = float(np.clip(g1 + (target_lufs - p1) / slope, -MAX_GAIN_DB, MAX_GAIN_DB))
+        p1 = predict(g1)
+    return g1
+
+
+def render_master(source: str | dict, dst_path: str, polish_chain: Pedalboard,
+                  gain_db: float, ceiling_db: float, subtype: str,
+                  block_frames: int = BLOCK_FRAMES, stats: dict | None = None) -> LoudnessMeter:
+    """Polish -> gain -> limiter -> sanitize -> write, one block at a time.
+
+    Returns the meter of what was written (fed the float signal before
+    quantization). If `stats` is given, the seconds spent encoding/writing
+    the WAV are added to stats["write_s"] (the rest of the pass is DSP)."""
+    sr, channels, _ = source_info(source)
+    finalize = build_finalize_chain(gain_db, ceiling_db)
+    meter = LoudnessMeter(sr, channels)
+
+    with sf.SoundFile(dst_path, "w", samplerate=sr, channels=channels, subtype=subtype) as out:
+        for polished in _polished_blocks(source, polish_chain, sr, block_frames):
+            block = finalize(polished, sr, reset=False)
+            # Safety: no NaN/Inf, clamp to [-1, 1]
+            np.nan_to_num(block, copy=False, nan=0.0, posinf=1.0, neginf=-1.0)
+            np.clip(block, -1.0, 1.0, out=block)
+            meter.feed(block.T)
+            t0 = time.perf_counter()
+            out.write(block.T)
+            if stats is not None:
+                stats["write_s"] = stats.get("write_s", 0.0) + time.perf_counter() - t0
+
+    return meter
+
+
+def normalize_loudness(audio: np.ndarray, sample_rate: int, target_lufs: float,
+                       ceiling_db: float) -> tuple[np.ndarray, float, float, float, int]:
+    """In-memory version of the job's loudness stage for the reference
+    scripts. `audio` is (channels, samples).
+
+    Returns (output, source_lufs, final_lufs, gain_db, render_passes)."""
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    meter = LoudnessMeter(sample_rate, audio.shape[0])
+    meter.feed(audio.T)
+    source_lufs = meter.integrated_loudness()
+
+    stride, wanted = _excerpt_stride(audio.shape[1], sample_rate, BLOCK_FRAMES)
+    excerpts = [
+        audio[:, start:start + BLOCK_FRAMES]
+        for start in range(0, audio.shape[1], stride * BLOCK_FRAMES)
+    ][:wanted]
+
+    gain_db = solve_makeup_gain(meter, excerpts, sample_rate, target_lufs, ceiling_db)
+    final_lufs = float("nan")
+    out = audio
+    passes = 0
+    for _ in range(2):  # one render; one correction only if verification misses
+        out = build_finalize_chain(gain_db, ceiling_db)(audio, sample_rate)
+        passes += 1
+        check = LoudnessMeter(sample_rate, out.shape[0])
+        check.feed(out.T)
+        final_lufs = check.integrated_loudness()
+        if not np.isfinite(final_lufs) or abs(target_lufs - final_lufs) < LOUDNESS_TOLERANCE_LU:
+            break
+        gain_db = float(np.clip(gain_db + (target_lufs - final_lufs), -MAX_GAIN_DB, MAX_GAIN_DB))
+
+    out = np.nan_to_num(out, nan=0.0, posinf=1.0, neginf=-1.0)
+    out = np.clip(out, -1.0, 1.0)
+    return out, source_lufs, final_lufs, gain_db, passes
+
+
+def master_clip(audio: np.ndarray, sample_rate: int, polish_chain: Pedalboard,
+                target_lufs: float, ceiling_db: float) -> tuple[np.ndarray, float]:
+    """Polish -> solved gain -> limiter for a short clip held in memory (the
+    /preview path). `audio` is (channels, samples).
+
+    Returns (output, final_lufs)."""
+    polished = polish_chain(np.ascontiguousarray(audio, dtype=np.float32), sample_rate)
+    out, _, final_lufs, _, _ = normalize_loudness(polished, sample_rate, target_lufs, ceiling_db)
+    return out, final_lufs
@@ -32,14 +32,21 @@ image = (
         "vercel-blob>=0.1.0",  # For direct Vercel Blob uploads
         "openai-whisper>=20231117",  # For transcription
         # Loudness + post-processing chain
-        "pyloudnorm>=0.1.1",       # ITU-R BS.1770 LUFS measurement
+        "scipy>=1.11.0",           # K-weighting filters for the streamed BS.1770 meter
         "pedalboard>=0.9.0",       # Spotify's DSP host (compressor, limiter, EQ, gain)
         "noisereduce>=3.0.0",      # Spectral noise reduction (optional pre-stage)
         "numpy>=1.26.0",
     )
     .add_local_dir("references", "/references")  # Bake reference templates into image
+    .add_local_python_source(
+        "loudness", "mastering_chain", "reference_analysis", "handoff", "routing",
+        "instrumentation", "r2_transfer", "status_publisher", "progress",
+        "status_stream", "status_cache",
+    )  # Pipeline helpers
 )
 
+from routing import TIERS, LARGEST_TIER, choose_tier
+
 # Loudness targets (integrated LUFS)
 # Standard = Spotify spec; this is the default for the new pipeline.
 LOUDNESS_TARGETS = {
@@ -66,6 +73,10 @@ LEGACY_LIMITER_MODE_MAP = {
 # `_pick_reference_path()` below prefers a `.wav` sibling if it exists
 # (re-mastered via scripts/remaster_references.py) so we can upgrade the
 # reference audio quality without changing this dict.
+#
+# `analysis_path` points at the precomputed Matchering analysis written by
+# scripts/build_reference_analysis.py. When it's present (and still matches
+# the audio), jobs skip decoding + analyzing the reference entirely.
 _REFERENCE_TEMPLATE_DEFS = [
     {
         "id": "voice-optimized",
@@ -106,6 +117,14 @@ def _pick_reference_path(base_path: str) -> str:
     return wav if os.path.exists(wav) else mp3
 
 
+def _pick_analysis_path(template: dict) -> str | None:
+    """Manifest-listed analysis file, else a `<base_path>.analysis.npz`
+    sibling, else None (Matchering analyzes the reference audio)."""
+    import os
+    path = template.get("analysis_path") or template["base_path"] + ".analysis.npz"
+    return path if os.path.exists(path) else None
+
+
 def _load_manifest_templates() -> list[dict]:
     """Load extra reference presets generated by
     scripts/build_preset_library.py. Each entry in the manifest gets merged
@@ -113,7 +132,8 @@ def _load_manifest_templates() -> list[dict]:
 
     Manifest schema (per entry):
       { "id": "podcast-<slug>", "name": "...", "description": "...",
-        "file": "podcast-<slug>.mp3" }
+        "file": "podcast-<slug>.mp3",
+        "analysis": "podcast-<slug>.analysis.npz" }   # optional
     """
     import json
     import os
@@ -142,6 +162,7 @@ def _load_manifest_templates() -> list[dict]:
                 # Legacy manifest entries (podcast presets) have no `kind`; default
                 # to "podcast" so they don't accidentally show up in the music UI.
                 "kind": entry.get("kind", "podcast"),
+                "analysis_path": f"/references/{entry['analysis']}" if entry.get("analysis") else None,
             })
         except (KeyError, TypeError) as e:
             print(f"[manifest] skipping malformed entry: {e}")
@@ -154,6 +175,7 @@ REFERENCE_TEMPLATES = {
         "name": t["name"],
         "description": t["description"],
         "file_path": _pick_reference_path(t["base_path"]),
+        "analysis_path": _pick_analysis_path(t),
         "kind": t.get("kind", "podcast"),
     }
     for t in (_REFERENCE_TEMPLATE_DEFS + _load_manifest_templates())
@@ -167,6 +189,35 @@ VOLUME_PATH = "/data"
 job_statuses = modal.Dict.from_name("podcast-mastering-jobs", create_if_missing=True)
 file_metadata = modal.Dict.from_name("podcast-mastering-file-metadata", create_if_missing=True)
 
+# job_id -> file_id of the upload it masters. Written by /master and
+# /master/batch so workers and cleanup find a job's upload without scanning
+# file_metadata; a file mastered several times has several entries.
+job_files = modal.Dict.from_name("podcast-mastering-job-files", create_if_missing=True)
+
+# Upload file_ids, one Queue partition per upload hour ("YYYY-MM-DDTHH").
+# Puts are atomic appends, so concurrent uploads never drop each other's
+# entries, and cleanup reads only the hours that have expired.
+expiry_queue = modal.Queue.from_name("podcast-mastering-expiry-queue", create_if_missing=True)
+# Partitions outlive retention by a couple of days so a missed cleanup run
+# can still catch up; anything older is left to the weekly full scan.
+EXPIRY_PARTITION_TTL = 3 * 24 * 3600
+
+# "_cursor" -> the first upload hour cleanup has not walked yet
+expiry_buckets = modal.Dict.from_name("podcast-mastering-expiry", create_if_missing=True)
+EXPIRY_CURSOR_KEY = "_cursor"
+
+# Completed masters keyed by (target content, reference, settings), so the same
+# upload re-submitted with the same settings reuses the existing R2 output.
+result_cache = modal.Dict.from_name("podcast-mastering-result-cache", create_if_missing=True)
+
+# /master/batch records: batch_id -> shared settings + the job_id of each item
+batch_statuses = modal.Dict.from_name("podcast-mastering-batches", create_if_missing=True)
+
+# Per-stage spans of finished jobs (see instrumentation.py), for /metrics.
+# Kept longer than the files so there's enough history to compare lengths.
+job_metrics = modal.Dict.from_name("podcast-mastering-metrics", create_if_missing=True)
+METRICS_RETENTION_DAYS = 14
+
 # R2 Configuration - stored as Modal secrets
 r2_secret = modal.Secret.from_name("r2-credentials")
 
@@ -181,31 +232,175 @@ R2_ENDPOINT = f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com"
 # Frontend webhook URL for job completion notifications
 WEBHOOK_URL = "https://freepodcastmastering.com/api/webhooks/job-complete"
 BLOB_UPLOAD_URL = "https://freepodcastmastering.com/api/files/get-blob-upload-url"
+BLOB_API_URL = "https://blob.vercel-storage.com"
+
+# Output delivery: both uploads run at once, each as parallel multipart.
+# Blob parts must be >= 5 MB (except the last); R2 parts >= 5 MB too.
+BLOB_MULTIPART_THRESHOLD = 32 * 1024 * 1024
+BLOB_PART_SIZE = 16 * 1024 * 1024
+BLOB_UPLOAD_CONCURRENCY = 4
+R2_PART_SIZE = 32 * 1024 * 1024
+R2_UPLOAD_CONCURRENCY = 8
+
+# Browser multipart uploads (/upload/multipart). R2 wants every part but
+# the last to be the same size; S3 allows 10,000 parts of at most 5 GB.
+MULTIPART_PART_SIZE = 64 * 1024 * 1024
+MULTIPART_MAX_PARTS = 10_000
+MULTIPART_MAX_PART_SIZE = 5 * 1024 ** 3
+MULTIPART_URL_BATCH = 100       # part URLs per request
+MULTIPART_URL_EXPIRY = 7200
 
 # File retention period (24 hours)
 FILE_RETENTION_HOURS = 24
 
+# cleanup_old_files: S3 DeleteObjects limit, and how old a leftover in
+# /data/processing must be to count as orphaned — longer than any worker's
+# timeout (process_batch: 24 h), so a running job's files are never touched
+R2_DELETE_BATCH = 1000
+PROCESSING_ORPHAN_AGE = timedelta(hours=25)
+
+# Preview clips: decoded window length, default start (skips most intros),
+# and how long the presigned before/after URLs stay valid.
+PREVIEW_SECONDS = 30.0
+PREVIEW_DEFAULT_START_SECONDS = 60.0
+PREVIEW_MIN_SECONDS = 5.0
+PREVIEW_URL_EXPIRY = 3600
+
+# /master/batch: items per request, and items per worker container. Each
+# worker loads the reference and builds the chain once for its whole slice.
+MAX_BATCH_ITEMS = 50
+BATCH_ITEMS_PER_WORKER = 5
+
+# POST /status/batch: job ids per request
+MAX_STATUS_BATCH = 200
+
+# fastapi_app: threads for blocking calls (boto3, ffprobe) off the event loop
+API_BLOCKING_THREADS = 32
+
+# Bump when a pipeline change should stop earlier outputs from being reused
+RESULT_CACHE_VERSION = 1
+# A hit is copied to the new job's own output key straight away; skip
+# outputs that cleanup could delete before the copy runs
+RESULT_CACHE_MIN_REMAINING = timedelta(minutes=10)
+
+
+def r2_content_hash(s3, metadata: dict) -> str | None:
+    """Content identity of an uploaded file: R2's ETag (the MD5 of the body
+    for single-part uploads) plus its size. Recorded at /confirm-upload;
+    looked up with HEAD for older metadata."""
+    etag = metadata.get("etag")
+    size = metadata.get("size")
+    if not etag:
+        response = s3.head_object(Bucket=R2_BUCKET, Key=metadata["r2_key"])
+        etag = response.get("ETag", "").strip('"')
+        size = response.get("ContentLength", 0)
+    return f"{etag}:{size}" if etag else None
+
+
+def probe_upload(s3, r2_key: str) -> dict | None:
+    """{"duration", "channels", "sample_rate"} of an upload, read by ffprobe
+    from a presigned URL — only the container header (plus a seek for some
+    formats) is fetched, not the file. None if it can't be probed."""
+    import json
+    import subprocess
+
+    url = s3.generate_presigned_url(
+        "get_object", Params={"Bucket": R2_BUCKET, "Key": r2_key}, ExpiresIn=300,
+    )
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "format=duration:stream=sample_rate,channels",
+             "-of", "json", url],
+            capture_output=True, text=True, timeout=60, check=True,
+        )
+        info = json.loads(result.stdout)
+        stream = info["streams"][0]
+        return {
+            "duration": float(info["format"]["duration"]),
+            "channels": int(stream["channels"]),
+            "sample_rate": int(stream["sample_rate"]),
+        }
+    except Exception as e:
+        print(f"Probe failed for {r2_key}: {e}")
+        return None
+
 
-def upload_to_vercel_blob(job_id: str, output_path: str, file_size: int):
+def multipart_part_size(size: int) -> int | None:
+    """Part size for a multipart upload of `size` bytes: MULTIPART_PART_SIZE,
+    or larger (whole MB) if that would need too many parts. None if the
+    file is too big for a multipart upload."""
+    part_size = MULTIPART_PART_SIZE
+    if size > part_size * MULTIPART_MAX_PARTS:
+        mb = 1024 * 1024
+        part_size = -(-size // (MULTIPART_MAX_PARTS * mb)) * mb
+    return part_size if part_size <= MULTIPART_MAX_PART_SIZE else None
+
+
+def multipart_part_status(s3, r2_key: str, multipart: dict) -> tuple[list[dict], list[int]]:
+    """(uploaded parts, missing part numbers) of a multipart upload. A part
+    whose size isn't what was assigned counts as missing (re-uploading it
+    replaces it)."""
+    parts = []
+    marker = 0
+    while True:
+        response = s3.list_parts(
+            Bucket=R2_BUCKET, Key=r2_key, UploadId=multipart["upload_id"], PartNumberMarker=marker,
+        )
+        parts.extend(response.get("Parts", []))
+        if not response.get("IsTruncated"):
+            break
+        marker = response["NextPartNumberMarker"]
+
+    part_size, part_count = multipart["part_size"], multipart["part_count"]
+    last_size = multipart["size"] - part_size * (part_count - 1)
+    uploaded = [
+        {"part_number": p["PartNumber"], "size": p["Size"], "etag": p["ETag"]}
+        for p in parts
+        if p["Size"] == (last_size if p["PartNumber"] == part_count else part_size)
+    ]
+    have = {p["part_number"] for p in uploaded}
+    return uploaded, [n for n in range(1, part_count + 1) if n not in have]
+
+
+def result_cache_key(target_hash: str, reference_id: str, output_quality: str,
+                     loudness_target: str, noise_reduction: bool, audio_type: str) -> str:
+    """Key for result_cache. Everything that changes the mastered output."""
+    import hashlib
+    raw = "|".join([
+        f"v{RESULT_CACHE_VERSION}",
+        target_hash,
+        reference_id,
+        output_quality,
+        loudness_target,
+        "nr" if noise_reduction else "-",
+        audio_type,
+    ])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def request_blob_credentials(job_id: str, file_name: str, file_size: int) -> dict | None:
     """
-    Upload the mastered file directly to Vercel Blob for premium users.
-    Returns the blob URL if successful, None otherwise.
+    Ask the frontend whether this job's output goes to Vercel Blob (premium
+    users) and for the token + pathname to upload it with. Only needs the
+    output's name and (expected) size, so master_job starts it in the
+    background while the audio is still being mastered.
+    Returns None if the output shouldn't (or can't) be uploaded.
     """
     import requests
-    
+
     webhook_token = os.environ.get("WEBHOOK_SECRET")
     if not webhook_token:
         print(f"[BLOB] Warning: WEBHOOK_SECRET not configured, skipping blob upload for job {job_id}")
         return None
-    
+
     try:
-        # Step 1: Get blob upload credentials from frontend
         print(f"[BLOB] Requesting upload credentials for job {job_id}")
         cred_response = requests.post(
             BLOB_UPLOAD_URL,
             json={
                 "jobId": job_id,
-                "fileName": os.path.basename(output_path),
+                "fileName": file_name,
                 "fileSize": file_size,
             },
             headers={
@@ -214,60 +409,183 @@ def upload_to_vercel_blob(job_id: str, output_path: str, file_size: int):
             },
             timeout=30,
         )
-        
+
         if not cred_response.ok:
             print(f"[BLOB] Failed to get credentials: {cred_response.status_code} - {cred_response.text}")
             return None
-        
+
         cred_data = cred_response.json()
-        
+
         if not cred_data.get("shouldUpload"):
             print(f"[BLOB] Skipping upload: {cred_data.get('reason', 'unknown reason')}")
             return None
-        
-        blob_token = cred_data["blobToken"]
-        blob_pathname = cred_data["blobPathname"]
-        subscription_id = cred_data.get("subscriptionId")
-        output_file_name = cred_data.get("outputFileName")
-        
-        # Step 2: Upload directly to Vercel Blob using their API
-        print(f"[BLOB] Uploading {file_size} bytes to {blob_pathname}")
-        
-        with open(output_path, "rb") as f:
-            # Use Vercel Blob's direct upload API
-            upload_response = requests.put(
-                f"https://blob.vercel-storage.com/{blob_pathname}",
-                data=f,
-                headers={
-                    "Authorization": f"Bearer {blob_token}",
-                    "Content-Type": "audio/wav",
-                    "x-api-version": "7",
-                    "x-content-type": "audio/wav",
-                },
-                timeout=600,  # 10 minute timeout for large files
+        return cred_data
+
+    except Exception as e:
+        print(f"[BLOB] Error requesting credentials: {e}")
+        return None
+
+
+def _blob_put(output_path: str, pathname: str, headers: dict) -> dict:
+    """Single-request upload (small files)."""
+    import requests
+
+    with open(output_path, "rb") as f:
+        response = requests.put(f"{BLOB_API_URL}/{pathname}", data=f, headers=headers, timeout=600)
+    response.raise_for_status()
+    return response.json()
+
+
+def _blob_multipart(output_path: str, file_size: int, pathname: str, headers: dict) -> dict:
+    """
+    Vercel Blob multipart upload (the `/mpu` API the @vercel/blob SDK uses):
+    create, upload BLOB_PART_SIZE parts BLOB_UPLOAD_CONCURRENCY at a time,
+    complete. Parts are read with pread so the threads share one fd.
+    """
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.parse import quote
+
+    url = f"{BLOB_API_URL}/mpu?pathname={quote(pathname)}"
+    create = requests.post(url, headers={**headers, "x-mpu-action": "create"}, timeout=30)
+    create.raise_for_status()
+    upload = create.json()
+    mpu_headers = {
+        **headers,
+        "x-mpu-key": quote(upload["key"]),
+        "x-mpu-upload-id": upload["uploadId"],
+    }
+
+    fd = os.open(output_path, os.O_RDONLY)
+    try:
+        def put_part(part_number: int) -> dict:
+            offset = (part_number - 1) * BLOB_PART_SIZE
+            body = os.pread(fd, min(BLOB_PART_SIZE, file_size - offset), offset)
+            response = requests.post(
+                url,
+                data=body,
+                headers={**mpu_headers, "x-mpu-action": "upload", "x-mpu-part-number": str(part_number)},
+                timeout=300,
             )
-        
-        if not upload_response.ok:
-            print(f"[BLOB] Upload failed: {upload_response.status_code} - {upload_response.text}")
-            return None
-        
-        blob_result = upload_response.json()
-        blob_url = blob_result.get("url")
-        
-        print(f"[BLOB] Successfully uploaded to: {blob_url}")
-        
-        return {
-            "blobUrl": blob_url,
-            "blobPathname": blob_pathname,
-            "subscriptionId": subscription_id,
-            "outputFileName": output_file_name,
-            "fileSize": file_size,
-        }
-        
+            response.raise_for_status()
+            return {"partNumber": part_number, "etag": response.json()["etag"]}
+
+        n_parts = -(-file_size // BLOB_PART_SIZE)
+        with ThreadPoolExecutor(max_workers=BLOB_UPLOAD_CONCURRENCY) as pool:
+            parts = list(pool.map(put_part, range(1, n_parts + 1)))
+    finally:
+        os.close(fd)
+
+    complete = requests.post(
+        url,
+        json=parts,
+        headers={**mpu_headers, "x-mpu-action": "complete", "Content-Type": "application/json"},
+        timeout=60,
+    )
+    complete.raise_for_status()
+    return complete.json()
+
+
+def upload_to_vercel_blob(job_id: str, output_path: str, file_size: int, credentials: dict = None):
+    """
+    Upload the mastered file directly to Vercel Blob for premium users.
+    `credentials` is a request_blob_credentials() result obtained earlier;
+    without it they're requested now. Files over BLOB_MULTIPART_THRESHOLD
+    go up as parallel multipart parts.
+    Returns the blob data if successful, None otherwise.
+    """
+    if credentials is None:
+        credentials = request_blob_credentials(job_id, os.path.basename(output_path), file_size)
+    if not credentials:
+        return None
+
+    blob_pathname = credentials["blobPathname"]
+    headers = {
+        "Authorization": f"Bearer {credentials['blobToken']}",
+        "x-api-version": "7",
+        "x-content-type": "audio/wav",
+    }
+
+    try:
+        print(f"[BLOB] Uploading {file_size} bytes to {blob_pathname}")
+        if file_size > BLOB_MULTIPART_THRESHOLD:
+            blob_result = _blob_multipart(output_path, file_size, blob_pathname, headers)
+        else:
+            blob_result = _blob_put(output_path, blob_pathname, {**headers, "Content-Type": "audio/wav"})
     except Exception as e:
-        print(f"[BLOB] Error uploading: {e}")
+        print(f"[BLOB] Upload failed: {e}")
         return None
 
+    blob_url = blob_result.get("url")
+    print(f"[BLOB] Successfully uploaded to: {blob_url}")
+
+    return {
+        "blobUrl": blob_url,
+        "blobPathname": blob_pathname,
+        "subscriptionId": credentials.get("subscriptionId"),
+        "outputFileName": credentials.get("outputFileName"),
+        "fileSize": file_size,
+    }
+
+
+def copy_r2_object(s3, source_key: str, dest_key: str) -> None:
+    """Server-side copy within R2 (multipart copy above R2_PART_SIZE), so
+    the bytes never pass through the container."""
+    from boto3.s3.transfer import TransferConfig
+
+    s3.copy(
+        {"Bucket": R2_BUCKET, "Key": source_key}, R2_BUCKET, dest_key,
+        Config=TransferConfig(
+            multipart_threshold=R2_PART_SIZE,
+            multipart_chunksize=R2_PART_SIZE,
+            max_concurrency=R2_UPLOAD_CONCURRENCY,
+        ),
+    )
+
+
+def deliver_output(s3, job_id: str, output_path: str, output_r2_key: str, blob_credentials=None) -> tuple:
+    """
+    Upload the finished master to R2 and (premium) Vercel Blob at the same
+    time, each as parallel multipart. `blob_credentials` may be a Future
+    from request_blob_credentials started during mastering.
+
+    Returns (blob_data, timings) where timings has r2_upload_s and
+    blob_upload_s. An R2 failure raises (the job can't complete without
+    it); a Blob failure only means blob_data is None.
+    """
+    import time
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from boto3.s3.transfer import TransferConfig
+
+    file_size = os.path.getsize(output_path)
+    transfer_config = TransferConfig(
+        multipart_threshold=R2_PART_SIZE,
+        multipart_chunksize=R2_PART_SIZE,
+        max_concurrency=R2_UPLOAD_CONCURRENCY,
+    )
+    timings = {}
+
+    def upload_r2():
+        t0 = time.perf_counter()
+        s3.upload_file(output_path, R2_BUCKET, output_r2_key, Config=transfer_config)
+        timings["r2_upload_s"] = round(time.perf_counter() - t0, 3)
+
+    def upload_blob():
+        credentials = blob_credentials.result() if isinstance(blob_credentials, Future) else blob_credentials
+        if credentials is None and blob_credentials is not None:
+            return None     # asked already: not a premium job, or the request failed
+        t0 = time.perf_counter()
+        result = upload_to_vercel_blob(job_id, output_path, file_size, credentials)
+        timings["blob_upload_s"] = round(time.perf_counter() - t0, 3)
+        return result
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        r2 = pool.submit(upload_r2)
+        blob = pool.submit(upload_blob)
+        r2.result()
+        blob_data = blob.result()
+    return blob_data, timings
+
 
 def notify_job_complete(job_id: str, status: str, output_file: str = None, blob_data: dict = None):
     """
@@ -320,337 +638,549 @@ def notify_job_complete(job_id: str, status: str, output_file: str = None, blob_
 
 
 def get_r2_client():
-    """Create an S3 client configured for Cloudflare R2"""
-    import boto3
-    return boto3.client(
-        "s3",
-        endpoint_url=R2_ENDPOINT,
-        aws_access_key_id=os.environ["R2_ACCESS_KEY_ID"],
-        aws_secret_access_key=os.environ["R2_SECRET_ACCESS_KEY"],
-        region_name="auto",
-    )
+    """The container's S3 client for Cloudflare R2 (created once, reused)"""
+    from r2_transfer import shared_client
+    return shared_client(R2_ENDPOINT)
+
+
+def expiry_bucket(ts: datetime) -> str:
+    return ts.strftime("%Y-%m-%dT%H")
+
+
+def register_expiry(file_id: str, uploaded_at: datetime):
+    """Append an upload to its hour's expiry partition. A failed put only
+    delays the upload's cleanup until the weekly full scan."""
+    try:
+        expiry_queue.put(
+            file_id,
+            partition=expiry_bucket(uploaded_at),
+            partition_ttl=EXPIRY_PARTITION_TTL,
+        )
+    except Exception as e:
+        print(f"Error registering expiry for {file_id}: {e}")
+
+
+def delete_r2_keys(s3, keys) -> int:
+    """Delete keys with DeleteObjects, R2_DELETE_BATCH at a time (missing
+    keys are not errors). Returns how many were deleted."""
+    keys = list(dict.fromkeys(k for k in keys if k))
+    deleted = 0
+    for start in range(0, len(keys), R2_DELETE_BATCH):
+        batch = keys[start:start + R2_DELETE_BATCH]
+        try:
+            response = s3.delete_objects(
+                Bucket=R2_BUCKET,
+                Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+            )
+        except Exception as e:
+            print(f"Error deleting {len(batch)} objects from R2: {e}")
+            continue
+        errors = response.get("Errors", [])
+        for error in errors:
+            print(f"Error deleting {error.get('Key')} from R2: {error.get('Code')} {error.get('Message')}")
+        deleted += len(batch) - len(errors)
+    return deleted
 
 
-@app.function(image=image, secrets=[r2_secret], schedule=modal.Cron("0 0 * * *"))
+@app.function(
+    image=image,
+    secrets=[r2_secret],
+    volumes={VOLUME_PATH: volume},
+    schedule=modal.Cron("0 * * * *"),
+    timeout=3600,
+)
 def cleanup_old_files():
     """
     Scheduled function that runs every hour to clean up files older than 24 hours.
-    Deletes files from R2 storage.
+
+    Expired uploads are read from the expiry_queue partitions of the hours
+    between the stored cursor and the cutoff, and only their metadata is
+    read. Uploads from before the index existed are caught by a full
+    file_metadata scan on the first run and then weekly (Sunday
+    00:00 UTC). R2 objects are removed with batched
+    DeleteObjects calls. Also sweeps orphaned files from /data/processing.
     """
     now = datetime.utcnow()
     cutoff = now - timedelta(hours=FILE_RETENTION_HOURS)
-    
-    deleted_count = 0
+    # Buckets before this hour hold only uploads older than the cutoff
+    expired_until = cutoff.replace(minute=0, second=0, microsecond=0)
+
     checked_count = 0
-    
     s3 = get_r2_client()
-    
-    # Check all tracked files
-    files_to_delete = []
-    for file_id, metadata in file_metadata.items():
-        checked_count += 1
-        upload_time = datetime.fromisoformat(metadata.get("uploaded_at", "2000-01-01"))
-        
-        if upload_time < cutoff:
-            files_to_delete.append((file_id, metadata))
-    
-    # Delete expired files from R2
-    for file_id, metadata in files_to_delete:
+
+    cursor = expiry_buckets.get(EXPIRY_CURSOR_KEY)
+    full_scan = cursor is None or (now.weekday() == 6 and now.hour == 0)
+
+    # Expired hours not walked yet; partitions older than their TTL are gone
+    done_buckets = []
+    if cursor is not None:
+        hour = max(
+            datetime.strptime(cursor, "%Y-%m-%dT%H"),
+            expired_until - timedelta(seconds=EXPIRY_PARTITION_TTL),
+        )
+        while hour < expired_until:
+            done_buckets.append(expiry_bucket(hour))
+            hour += timedelta(hours=1)
+
+    expired = {}        # file_id -> metadata
+    expired_jobs = []
+    if full_scan:
+        for file_id, metadata in file_metadata.items():
+            checked_count += 1
+            if datetime.fromisoformat(metadata.get("uploaded_at", "2000-01-01")) < cutoff:
+                expired[file_id] = metadata
+        # Index entries whose upload is expired or already gone, including
+        # jobs that predate the per-file job_ids list
+        for job_id, file_id in list(job_files.items()):
+            if file_id in expired or file_id not in file_metadata:
+                expired_jobs.append(job_id)
+    else:
+        for bucket in done_buckets:
+            for file_id in expiry_queue.iterate(partition=bucket):
+                checked_count += 1
+                metadata = file_metadata.get(file_id)
+                if metadata:
+                    expired[file_id] = metadata
+
+    # Every job of an expired upload, not just the latest one: its output,
+    # its status and its job_files entry
+    r2_keys = []
+    for file_id, metadata in expired.items():
+        job_ids = metadata.get("job_ids") or [metadata.get("job_id")]
+        expired_jobs.extend(j for j in job_ids if j)
+        r2_keys.append(metadata.get("r2_key"))
+        r2_keys.append(metadata.get("output_r2_key"))
+    expired_jobs = list(dict.fromkeys(expired_jobs))
+    r2_keys.extend(f"outputs/{job_id}_mastered.wav" for job_id in expired_jobs)   # no-op if none
+    deleted_outputs = {k for k in r2_keys if k and k.startswith("outputs/")}
+    deleted_count = delete_r2_keys(s3, r2_keys)
+
+    # Multipart uploads never completed: their parts aren't an object yet,
+    # so DeleteObjects leaves them behind
+    for file_id, metadata in expired.items():
+        multipart = metadata.get("multipart")
+        if multipart and not multipart.get("completed"):
+            try:
+                s3.abort_multipart_upload(Bucket=R2_BUCKET, Key=metadata["r2_key"], UploadId=multipart["upload_id"])
+            except Exception as e:
+                print(f"Error aborting multipart upload for {file_id}: {e}")
+
+    for file_id in expired:
+        try:
+            del file_metadata[file_id]
+        except Exception as e:
+            print(f"Error cleaning up file {file_id}: {e}")
+    for job_id in expired_jobs:
+        try:
+            if job_id in job_statuses:
+                del job_statuses[job_id]
+            if job_id in job_files:
+                del job_files[job_id]
+        except Exception as e:
+            print(f"Error cleaning up job {job_id}: {e}")
+
+    for bucket in done_buckets:
         try:
-            # Delete uploaded files from R2
-            r2_key = metadata.get("r2_key")
-            if r2_key:
+            expiry_queue.clear(partition=bucket)
+        except Exception as e:
+            print(f"Error clearing expiry partition {bucket}: {e}")
+    expiry_buckets[EXPIRY_CURSOR_KEY] = expiry_bucket(expired_until)
+
+    # Preview clips aren't tracked in file_metadata; sweep them by age
+    paginator = s3.get_paginator("list_objects_v2")
+    preview_keys = [
+        obj["Key"]
+        for page in paginator.paginate(Bucket=R2_BUCKET, Prefix="previews/")
+        for obj in page.get("Contents", [])
+        if obj["LastModified"].replace(tzinfo=None) < cutoff
+    ]
+    deleted_count += delete_r2_keys(s3, preview_keys)
+
+    # Intermediates left behind by workers that crashed or timed out
+    orphan_count = 0
+    processing_dir = f"{VOLUME_PATH}/processing"
+    volume.reload()
+    if os.path.isdir(processing_dir):
+        orphan_cutoff = (now - PROCESSING_ORPHAN_AGE).timestamp()
+        for entry in os.scandir(processing_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < orphan_cutoff:
+                    os.remove(entry.path)
+                    orphan_count += 1
+            except OSError as e:
+                print(f"Error removing orphan {entry.path}: {e}")
+        if orphan_count:
+            volume.commit()
+
+    # Small, slow-growing Dicts and the result cache: once a day is enough
+    evicted_count = 0
+    if now.hour == 0:
+        # Batch records only index job_ids; drop them with the uploads
+        for batch_id, batch in list(batch_statuses.items()):
+            if datetime.fromisoformat(batch.get("created_at", "2000-01-01")) < cutoff:
                 try:
-                    s3.delete_object(Bucket=R2_BUCKET, Key=r2_key)
-                    deleted_count += 1
+                    del batch_statuses[batch_id]
                 except Exception as e:
-                    print(f"Error deleting {r2_key} from R2: {e}")
-            
-            # Delete output file from R2 if exists
-            output_key = metadata.get("output_r2_key")
-            if output_key:
+                    print(f"Error removing batch {batch_id}: {e}")
+
+        # Stage metrics outlive the jobs they describe, but not forever
+        metrics_cutoff = now - timedelta(days=METRICS_RETENTION_DAYS)
+        for job_id, record in list(job_metrics.items()):
+            if datetime.fromisoformat(record.get("finished_at", "2000-01-01")) < metrics_cutoff:
                 try:
-                    s3.delete_object(Bucket=R2_BUCKET, Key=output_key)
-                    deleted_count += 1
+                    del job_metrics[job_id]
                 except Exception as e:
-                    print(f"Error deleting {output_key} from R2: {e}")
-            
-            # Remove from metadata tracking
-            del file_metadata[file_id]
-            
-            # Clean up job status if exists
-            job_id = metadata.get("job_id")
-            if job_id and job_id in job_statuses:
-                del job_statuses[job_id]
-                
-        except Exception as e:
-            print(f"Error cleaning up file {file_id}: {e}")
-    
-    print(f"Cleanup complete: checked {checked_count} files, deleted {deleted_count} expired files")
-    return {"checked": checked_count, "deleted": deleted_count}
+                    print(f"Error removing metrics for {job_id}: {e}")
 
+        # Result cache entries live exactly as long as the output they point
+        # at. Lookups already ignore expired entries; this only reclaims them.
+        for cache_key, entry in list(result_cache.items()):
+            expires_at = datetime.fromisoformat(entry.get("expires_at", "2000-01-01"))
+            if expires_at < now or entry.get("output_file") in deleted_outputs:
+                try:
+                    del result_cache[cache_key]
+                    evicted_count += 1
+                except Exception as e:
+                    print(f"Error evicting result cache entry {cache_key}: {e}")
 
-@app.function(
-    image=image,
-    volumes={VOLUME_PATH: volume},
-    secrets=[r2_secret, webhook_secret],
-    timeout=36000,  # 10 hour timeout for very long podcasts
-    cpu=4,  # Use 4 CPUs for faster processing
-    memory=8192,  # 8GB RAM for large audio files
-)
-def process_audio(
+    print(
+        f"Cleanup complete ({'full scan' if full_scan else f'{len(done_buckets)} expiry hours'}): "
+        f"checked {checked_count} files, deleted {deleted_count} expired files, "
+        f"removed {orphan_count} orphaned intermediates, evicted {evicted_count} cached results"
+    )
+    return {
+        "checked": checked_count,
+        "deleted": deleted_count,
+        "orphans": orphan_count,
+        "evicted": evicted_count,
+        "full_scan": full_scan,
+    }
+
+
+def load_reference(s3, job_id: str, reference_source: str, is_template: bool, matchering_config) -> dict:
+    """
+    Resolve a job's reference to {"analysis", "path", "is_template",
+    "cleanup"}: the cached analysis for templates (None if stale — analyzed
+    on first use), or the downloaded upload for custom references.
+    """
+    from reference_analysis import load_analysis
+    from r2_transfer import download_file
+
+    if is_template:
+        template = REFERENCE_TEMPLATES.get(reference_source)
+        if not template:
+            raise ValueError(f"Unknown template: {reference_source}")
+        print(f"Using built-in template: {template['name']}")
+        analysis = load_analysis(template["analysis_path"], matchering_config, template["file_path"])
+        if analysis is not None:
+            print("Using precomputed reference analysis")
+        elif template["analysis_path"]:
+            print(f"Reference analysis {template['analysis_path']} is stale — analyzing audio")
+        # Baked into the image — never delete
+        return {"analysis": analysis, "path": template["file_path"], "is_template": True, "cleanup": []}
+
+    os.makedirs(f"{VOLUME_PATH}/processing", exist_ok=True)
+    reference_path = f"{VOLUME_PATH}/processing/{job_id}_reference.wav"
+    download_file(s3, R2_BUCKET, reference_source, reference_path)
+    return {"analysis": None, "path": reference_path, "is_template": False, "cleanup": [reference_path]}
+
+
+def fail_job(job_id: str, error_msg: str):
+    # Keep fields other writers added (batch_id)
+    job_statuses[job_id] = {
+        **(job_statuses.get(job_id) or {}),
+        "status": "failed",
+        "progress": 0,
+        "message": f"Error: {error_msg}",
+        "output_file": None,
+    }
+    notify_job_complete(job_id, "failed", None)
+
+
+def file_for_job(job_id: str) -> str | None:
+    """file_id of the upload a job masters, from the job_files index. Jobs
+    started before the index existed fall back to scanning file_metadata."""
+    file_id = job_files.get(job_id)
+    if file_id:
+        return file_id
+    for file_id, meta in file_metadata.items():
+        if meta.get("job_id") == job_id:
+            return file_id
+    return None
+
+
+def master_job(
+    s3,
     job_id: str,
     target_r2_key: str,
-    reference_source: str,
-    is_template: bool = False,
-    output_quality: str = "standard",      # "standard" (16-bit) or "high" (24-bit)
-    loudness_target: str = "standard",     # "conservative" | "standard" | "loud"
-    noise_reduction: bool = False,         # AI spectral noise reduction pre-pass
-    audio_type: str = "podcast",           # "podcast" | "music" — selects polish chain
-):
+    reference: dict,
+    matchering_config,
+    polish_chain,
+    output_quality: str = "standard",
+    loudness_target: str = "standard",
+    noise_reduction: bool = False,
+    cache_key: str = None,
+) -> dict:
     """
-    Mastering pipeline. Stages:
-      1. Download target audio from R2
-      2. (optional) Spectral noise reduction
-      3. Matchering — spectral match + RMS match to reference template
-      4. Post-Matchering polish: subsonic HPF, presence lift, gentle de-ess, leveling compressor
-      5. LUFS measurement + makeup gain to hit the loudness target
-      6. True-peak brickwall limiter at -1 dBTP
-      7. Write at requested bit depth, upload to R2 (and Vercel Blob for premium)
-
-    Loudness targets (integrated LUFS):
-      conservative = -16 LUFS (Apple Podcasts / dialog-heavy)
-      standard     = -14 LUFS (Spotify)  ← default
-      loud         = -12 LUFS (broadcast-loud)
+    Master one target against an already-resolved reference (see
+    load_reference) with an already-built polish chain: download, noise
+    reduction, Matchering, loudness, upload, status + webhook. Shared by
+    process_audio and process_batch; never raises — failures are recorded
+    on the job and returned.
     """
-    import os
+    import filecmp
+    from concurrent.futures import ThreadPoolExecutor
     import numpy as np
     import soundfile as sf
-    import matchering as mg
-    import pyloudnorm as pyln
-    from pedalboard import (
-        Pedalboard, HighpassFilter, PeakFilter, Compressor, Gain, Limiter,
+    from mastering_chain import (
+        LOUDNESS_TOLERANCE_LU, MAX_GAIN_DB,
+        measure_polished, render_master, solve_makeup_gain,
     )
-
-    s3 = get_r2_client()
+    from reference_analysis import analyze_reference, match_array
+    from handoff import Handoff, WAV_FLOAT, WAV_PCM24
+    from instrumentation import Spans
+    from r2_transfer import HEADER_BYTES, RangedDownload, read_audio
+    from status_publisher import StatusPublisher
+    from progress import job_progress
 
     # Local paths for processing
     os.makedirs(f"{VOLUME_PATH}/processing", exist_ok=True)
     target_path        = f"{VOLUME_PATH}/processing/{job_id}_target.wav"
-    target_clean_path  = f"{VOLUME_PATH}/processing/{job_id}_target_clean.wav"
-    reference_path     = f"{VOLUME_PATH}/processing/{job_id}_reference.wav"
-    matched_path       = f"{VOLUME_PATH}/processing/{job_id}_matched.wav"
     output_path        = f"{VOLUME_PATH}/processing/{job_id}_mastered.wav"
     output_r2_key      = f"outputs/{job_id}_mastered.wav"
 
-    # Files we created and should remove on success/failure. Reference templates
-    # baked into the image are NOT in this list — never delete them.
-    files_to_cleanup = [target_path, target_clean_path, matched_path, output_path]
+    # Files we created and should remove on success/failure. The reference is
+    # owned by the caller (and templates baked into the image are never deleted).
+    files_to_cleanup = [target_path, output_path]
+
+    # Audio passed between stages (noise reduction -> Matchering -> mastering
+    # chain) stays in memory, or local scratch if memory is tight — never /data.
+    handoff = Handoff(job_id)
+
+    # Blob credentials are fetched in the background while the audio is
+    # still being mastered, so delivery doesn't start with a round-trip
+    background = ThreadPoolExecutor(max_workers=1)
+    blob_credentials = None
+
+    # Wall / CPU / peak RSS / bytes per stage, stored with the job
+    spans = Spans(job_id)
+    source = {}
+
+    def record_metrics(success: bool) -> list[dict]:
+        metrics = spans.to_list()
+        try:
+            job_metrics[job_id] = {
+                "job_id": job_id,
+                "success": success,
+                "finished_at": datetime.utcnow().isoformat(),
+                **source,
+                "spans": metrics,
+                # Volume I/O the in-memory handoff avoided (see handoff.py)
+                "intermediate_io": handoff.summary(),
+            }
+        except Exception as e:
+            print(f"Could not store metrics for {job_id}: {e}")
+        return metrics
+
+    # Progress is published from a background thread, coalesced; only
+    # stage changes skip the flush interval (see status_publisher.py)
+    status = StatusPublisher(job_statuses, job_id)
 
     def update_status(progress: int, message: str):
-        current = job_statuses.get(job_id, {}) or {}
-        current.update({"status": "processing", "progress": progress, "message": message, "output_file": None})
-        job_statuses[job_id] = current
+        status.update(stage=True, status="processing", progress=progress, message=message, output_file=None)
 
     try:
         # ============================================================
         # Stage 0 — Download inputs
         # ============================================================
         update_status(5, "Downloading your audio...")
-        s3.download_file(R2_BUCKET, target_r2_key, target_path)
+        # Parallel ranged download; WAV/AIFF is decoded as the bytes arrive
+        # (see r2_transfer.py), so this span covers download + decode
+        with spans.span("download") as span:
+            download = RangedDownload(s3, R2_BUCKET, target_r2_key, target_path).start()
 
-        update_status(10, "Loading reference template...")
-        if is_template:
-            template = REFERENCE_TEMPLATES.get(reference_source)
-            if not template:
-                raise ValueError(f"Unknown template: {reference_source}")
-            reference_path = template["file_path"]  # baked into image — don't delete
-            print(f"Using built-in template: {template['name']}")
-        else:
-            s3.download_file(R2_BUCKET, reference_source, reference_path)
-            files_to_cleanup.append(reference_path)
+            # The header is readable as soon as the first bytes land
+            download.wait_prefix(HEADER_BYTES)
+            try:
+                header = sf.info(target_path)
+                print(f"Source: {header.format}/{header.subtype}, {header.channels} ch, {header.samplerate} Hz, "
+                      f"{header.frames / header.samplerate / 60:.1f} min (probed mid-download)")
+            except RuntimeError:
+                pass    # compressed formats may need more than the head
+            print(
+                f"Settings: output_quality={output_quality}, "
+                f"loudness_target={loudness_target}, noise_reduction={noise_reduction}"
+            )
 
-        # Detect original sample rate so we preserve it end-to-end
-        target_info = sf.info(target_path)
-        sample_rate = target_info.samplerate
-        print(f"Source sample rate: {sample_rate} Hz")
-        print(
-            f"Settings: audio_type={audio_type}, output_quality={output_quality}, "
-            f"loudness_target={loudness_target}, noise_reduction={noise_reduction}"
-        )
+            audio, sr = read_audio(download)
+            span.update(download.stats)
+            span["decoded_bytes"] = audio.nbytes
+
+        # Original sample rate, preserved end-to-end
+        source.update({
+            "duration": audio.shape[0] / sr,
+            "channels": audio.shape[1],
+            "sample_rate": sr,
+        })
 
         # ============================================================
         # Stage 1 — Optional spectral noise reduction
         # ============================================================
-        matchering_input = target_path
 
         if noise_reduction:
             import noisereduce as nr
             update_status(18, "Removing background noise...")
 
-            audio, sr = sf.read(target_path, always_2d=True, dtype="float32")
-            # noisereduce expects (channels, samples) or (samples,)
-            audio_for_nr = audio.T
-            reduced = nr.reduce_noise(
-                y=audio_for_nr,
-                sr=sr,
-                stationary=False,
-                prop_decrease=0.75,
-                n_fft=1024,
-                time_constant_s=2.0,
-            )
-            audio = reduced.T
-
-            sf.write(target_clean_path, audio, sr, subtype="FLOAT")
-            matchering_input = target_clean_path
+            with spans.span("noise_reduction", audio.nbytes):
+                # noisereduce expects (channels, samples) or (samples,)
+                audio_for_nr = audio.T
+                reduced = nr.reduce_noise(
+                    y=audio_for_nr,
+                    sr=sr,
+                    stationary=False,
+                    prop_decrease=0.75,
+                    n_fft=1024,
+                    time_constant_s=2.0,
+                )
+                del audio_for_nr, audio
+                # Previously a FLOAT WAV on /data for Matchering to read back
+                clean_buf = handoff.hold("target_clean", reduced.T, sr, WAV_FLOAT)
+                del reduced
+                audio = handoff.read(clean_buf)
             print("Noise reduction complete")
 
         # ============================================================
         # Stage 2 — Matchering: spectral + RMS match to reference
         # ============================================================
-        # We deliberately leave headroom (threshold=0.95) so the post-Matchering
+        # podcast_config() leaves headroom (threshold=0.95) so the post-Matchering
         # chain (LUFS makeup gain + true-peak limiter) has room to work without
         # fighting Matchering's internal limiter.
-        podcast_config = mg.Config(
-            max_length=635_040_000,
-            threshold=0.95,
-        )
 
         def log_handler(message: str):
             print(f"Matchering: {message}")
-            current = job_statuses.get(job_id, {}) or {}
-            current["message"] = message
+            update = {"message": message}
             # Map matchering's internal stages to 25..70% of the overall progress bar
             lower = message.lower()
             if "loading" in lower:
-                current["progress"] = 25
+                update["progress"] = 25
             elif "analyzing" in lower:
-                current["progress"] = 40
+                update["progress"] = 40
             elif "matching" in lower:
-                current["progress"] = 55
+                update["progress"] = 55
             elif "limiting" in lower:
-                current["progress"] = 65
+                update["progress"] = 65
             elif "saving" in lower:
-                current["progress"] = 70
-            job_statuses[job_id] = current
-
-        mg.log(log_handler)
+                update["progress"] = 70
+            status.update(**update)
 
         update_status(25, "Matching reference tone & EQ...")
-        # Intermediate is 24-bit so we don't lose precision before the final stage.
-        mg.process(
-            target=matchering_input,
-            reference=reference_path,
-            config=podcast_config,
-            results=[mg.pcm24(matched_path)],
+        if not reference["is_template"] and filecmp.cmp(target_path, reference["path"], shallow=False):
+            raise ValueError("The target and reference are the same file")
+        # Matchering's log goes to this job only, even with other jobs in the container
+        with job_progress(job_id, log_handler):
+            if reference["analysis"] is None:
+                # Uploaded reference (or stale template cache): analyze it once,
+                # the first time it's needed. Same numbers mg.process would derive
+                # from it internally.
+                with spans.span("reference_analysis", os.path.getsize(reference["path"])):
+                    reference["analysis"] = analyze_reference(reference["path"], matchering_config)
+
+            with spans.span("matchering", audio.nbytes):
+                matched = match_array(audio, sr, reference["analysis"], matchering_config)
+                del audio
+                handoff.cleanup()   # noise-reduced input (if any) is no longer needed
+                # Previously a 24-bit WAV on /data, read back once per mastering pass.
+                # Matchering works at its internal rate, so that's the rate from here on.
+                matched_buf = handoff.hold("matched", matched, matchering_config.internal_sample_rate, WAV_PCM24)
+                del matched
+
+        # The output's size is fixed from here (frames x channels x bit depth)
+        out_frames, out_channels = matched_buf["audio"].shape
+        expected_size = out_frames * out_channels * (3 if output_quality == "high" else 2) + 44
+        blob_credentials = background.submit(
+            request_blob_credentials, job_id, os.path.basename(output_path), expected_size,
         )
 
         # ============================================================
         # Stage 3 — Post-Matchering polish + LUFS normalize + true-peak limit
         # ============================================================
+        # Everything from here to the final WAV is streamed in fixed-size
+        # blocks (see mastering_chain.py), so memory stays flat no matter
+        # how long the episode is.
         update_status(75, "Polishing tone and dynamics...")
-        audio, sr = sf.read(matched_path, always_2d=True, dtype="float32")
-
-        # pedalboard expects (channels, samples)
-        audio_pb = np.ascontiguousarray(audio.T)
-
-        # Polish chain shape depends on what we're mastering. Voice content
-        # benefits from de-essing and a presence lift around 2.8 kHz; music
-        # has full-spectrum content where those moves would dull cymbals,
-        # harshen drums, or scoop the body of guitars/keys.
-        if audio_type == "music":
-            polish_chain = Pedalboard([
-                HighpassFilter(cutoff_frequency_hz=25.0),                                # preserve bass; just kill subsonic
-                Compressor(threshold_db=-20.0, ratio=1.6, attack_ms=20.0, release_ms=150.0),  # gentle glue, slower attack
-            ])
-            print("Polish chain: music (HPF + gentle glue)")
-        else:
-            polish_chain = Pedalboard([
-                HighpassFilter(cutoff_frequency_hz=40.0),                       # remove subsonic / DC
-                PeakFilter(cutoff_frequency_hz=200.0,  gain_db=-1.0, q=0.7),    # tame low-mud
-                PeakFilter(cutoff_frequency_hz=2800.0, gain_db= 1.0, q=0.8),    # subtle presence
-                PeakFilter(cutoff_frequency_hz=6500.0, gain_db=-2.5, q=2.5),    # gentle de-esser
-                Compressor(threshold_db=-18.0, ratio=2.0, attack_ms=8.0, release_ms=100.0),  # glue + level
-            ])
-            print("Polish chain: podcast (HPF + EQ + de-ess + glue)")
-
-        audio_pb = polish_chain(audio_pb, sr)
-        audio = audio_pb.T  # back to (samples, channels)
-
-        # Measure loudness
+
+        # Measure loudness (keeps a few seconds of polished excerpts for the solver)
         update_status(82, "Measuring loudness...")
-        meter = pyln.Meter(sr)
-        try:
-            current_lufs = float(meter.integrated_loudness(audio))
-        except Exception:
-            current_lufs = -23.0  # neutral fallback
+        with spans.span("polish", matched_buf["nbytes"]):
+            meter, excerpts = measure_polished(matched_buf, polish_chain)
+        current_lufs = meter.integrated_loudness()
         if not np.isfinite(current_lufs) or current_lufs < -70.0:
             current_lufs = -40.0  # very-quiet fallback
 
         target_lufs = LOUDNESS_TARGETS.get(loudness_target, -14.0)
+        subtype = "PCM_24" if output_quality == "high" else "PCM_16"
 
-        # BS.1770 integrated loudness uses relative gating — applying a big gain
-        # can change which blocks are gated in/out, so single-pass "gain by
-        # (target - measured)" tends to overshoot by 1-3 dB on dynamic content.
-        # We iterate up to 3 times with a corrective gain to converge on target.
-        # Each pass: apply remaining gain delta, run limiter, re-measure.
-        audio_pb = np.ascontiguousarray(audio.T)
-        applied_gain_db = 0.0
-        delta_db = (target_lufs - current_lufs) + 0.3   # small overshoot for limiter loss
-
-        for pass_idx in range(3):
-            delta_db = float(np.clip(delta_db, -24.0, 24.0))
-            chain = Pedalboard([
-                Gain(gain_db=delta_db),
-                Limiter(threshold_db=TRUE_PEAK_CEILING_DB, release_ms=100.0),
-            ])
-            audio_pb = chain(audio_pb, sr)
-            applied_gain_db += delta_db
-
-            # Measure after this pass
-            try:
-                measured = float(meter.integrated_loudness(audio_pb.T))
-            except Exception:
-                break
+        # BS.1770 relative gating and the limiter both make loudness non-linear
+        # in gain, so "gain = target - measured" overshoots on dynamic content.
+        # The solver predicts the final loudness from the per-hop energies plus
+        # the limiter's effect on the excerpts, so the full file is rendered
+        # once. The meter on that render verifies it; a second render only
+        # happens if the prediction missed by more than the tolerance.
+        update_status(86, f"Setting loudness to {target_lufs:.0f} LUFS...")
+        with spans.span("loudness_solve", sum(e.nbytes for e in excerpts)):
+            gain_db = solve_makeup_gain(
+                meter, excerpts, meter.sample_rate, target_lufs, TRUE_PEAK_CEILING_DB,
+            )
+        del excerpts
+
+        render_passes = 0
+        for pass_idx in range(2):
+            update_status(88 + 2 * pass_idx, f"Setting loudness to {target_lufs:.0f} LUFS...")
+            # One full polish -> gain -> limiter -> write pass; "write_s" is
+            # the part of it spent encoding the WAV
+            with spans.span("loudness_pass", matched_buf["nbytes"]) as span:
+                output_meter = render_master(
+                    matched_buf, output_path, polish_chain,
+                    gain_db=gain_db, ceiling_db=TRUE_PEAK_CEILING_DB, subtype=subtype,
+                    stats=span,
+                )
+                span["pass"] = pass_idx + 1
+                span["write_s"] = round(span.get("write_s", 0.0), 3)
+                span["written_bytes"] = os.path.getsize(output_path)
+            measured = output_meter.integrated_loudness()
+            render_passes += 1
             if not np.isfinite(measured):
                 break
 
             diff = target_lufs - measured
-            print(f"  pass {pass_idx + 1}: gain {delta_db:+.2f} dB -> {measured:.2f} LUFS (target {target_lufs:.1f}, diff {diff:+.2f})")
-
-            # Converged within 0.3 dB tolerance — good enough
-            if abs(diff) < 0.3:
+            print(f"  pass {render_passes}: gain {gain_db:+.2f} dB -> {measured:.2f} LUFS (target {target_lufs:.1f}, diff {diff:+.2f})")
+            if abs(diff) < LOUDNESS_TOLERANCE_LU:
                 break
-            # Next pass corrects by the remaining diff
-            delta_db = diff
-
-        audio = audio_pb.T
+            gain_db = float(np.clip(gain_db + diff, -MAX_GAIN_DB, MAX_GAIN_DB))
 
-        # Safety: no NaN/Inf, clamp to [-1, 1]
-        audio = np.nan_to_num(audio, nan=0.0, posinf=1.0, neginf=-1.0)
-        audio = np.clip(audio, -1.0, 1.0)
+        print(f"Loudness: {current_lufs:.2f} LUFS source -> total gain {gain_db:+.2f} dB -> target {target_lufs:.1f} LUFS ({render_passes} render pass{'es' if render_passes > 1 else ''})")
+        print(f"Loudness range: {meter.loudness_range():.1f} LU source -> {output_meter.loudness_range():.1f} LU output")
+        print(f"Wrote {subtype} WAV at {matched_buf['sample_rate']} Hz")
 
-        update_status(88, f"Loudness set to {target_lufs:.0f} LUFS")
-        print(f"Loudness: {current_lufs:.2f} LUFS source -> total gain {applied_gain_db:+.2f} dB -> target {target_lufs:.1f} LUFS")
-
-        # ============================================================
-        # Stage 4 — Write output
-        # ============================================================
-        update_status(92, "Writing mastered audio...")
-        subtype = "PCM_24" if output_quality == "high" else "PCM_16"
-        sf.write(output_path, audio, sr, subtype=subtype)
-        print(f"Wrote {subtype} WAV at {sample_rate} Hz")
+        handoff.cleanup()
+        intermediate_io = handoff.summary()
+        print(
+            f"Intermediate I/O kept off {VOLUME_PATH}: {intermediate_io['volume_bytes_saved'] / 1e6:.0f} MB"
+            f" (local scratch: {intermediate_io['scratch_bytes'] / 1e6:.0f} MB)"
+        )
 
         # Get file size for blob upload
         output_file_size = os.path.getsize(output_path)
 
-        # Upload result to R2 (for download URL and fallback)
+        # Upload result to R2 (for download URL and fallback) and, for premium
+        # users, straight to Vercel Blob — both at once
         update_status(94, "Uploading mastered audio...")
-        s3.upload_file(output_path, R2_BUCKET, output_r2_key)
-
-        # Try to upload directly to Vercel Blob for premium users
-        update_status(96, "Saving to cloud storage...")
-        blob_data = upload_to_vercel_blob(job_id, output_path, output_file_size)
+        with spans.span("delivery", output_file_size) as span:
+            blob_data, upload_timings = deliver_output(
+                s3, job_id, output_path, output_r2_key, blob_credentials,
+            )
+            span.update(upload_timings)
+        background.shutdown(wait=False)
         if blob_data:
             print(f"Premium user file saved to Vercel Blob: {blob_data.get('blobUrl')}")
 
@@ -660,27 +1190,48 @@ def process_audio(
                 os.remove(path)
 
         # Update file metadata with output key
-        for file_id, meta in file_metadata.items():
-            if meta.get("job_id") == job_id:
-                meta["output_r2_key"] = output_r2_key
-                file_metadata[file_id] = meta
-                break
+        file_id = file_for_job(job_id)
+        meta = file_metadata.get(file_id) if file_id else None
+        if meta:
+            meta["output_r2_key"] = output_r2_key
+            file_metadata[file_id] = meta
+            if cache_key:
+                # cleanup_old_files deletes the output when this upload expires
+                uploaded_at = datetime.fromisoformat(meta.get("uploaded_at", datetime.utcnow().isoformat()))
+                result_cache[cache_key] = {
+                    "output_file": output_r2_key,
+                    "job_id": job_id,
+                    "created_at": datetime.utcnow().isoformat(),
+                    "expires_at": (uploaded_at + timedelta(hours=FILE_RETENTION_HOURS)).isoformat(),
+                }
+
+        metrics = record_metrics(True)
+        try:
+            status.close({
+                "status": "completed",
+                "progress": 100,
+                "message": "Mastering complete!",
+                "output_file": output_r2_key,
+            })
+        except Exception as e:
+            # The output is already delivered: don't report the job failed,
+            # and still send the completion webhook
+            print(f"ERROR writing completed status for {job_id}: {e}")
 
-        job_statuses[job_id] = {
-            "status": "completed",
-            "progress": 100,
-            "message": "Mastering complete!",
+        notify_job_complete(job_id, "completed", output_r2_key, blob_data)
+        return {
+            "success": True,
             "output_file": output_r2_key,
+            "blob_data": blob_data,
+            "intermediate_io": intermediate_io,
+            "metrics": metrics,
         }
 
-        notify_job_complete(job_id, "completed", output_r2_key, blob_data)
-        return {"success": True, "output_file": output_r2_key, "blob_data": blob_data}
-
     except Exception as e:
         import traceback
         error_msg = str(e)
         error_traceback = traceback.format_exc()
-        print(f"ERROR in process_audio: {error_msg}")
+        print(f"ERROR in job {job_id}: {error_msg}")
         print(f"Traceback: {error_traceback}")
 
         for path in files_to_cleanup:
@@ -689,39 +1240,384 @@ def process_audio(
                     os.remove(path)
                 except Exception:
                     pass
+        handoff.cleanup()
+        background.shutdown(wait=False)
+        record_metrics(False)
 
-        job_statuses[job_id] = {
-            "status": "failed",
-            "progress": 0,
-            "message": f"Error: {error_msg}",
-            "output_file": None,
-        }
-        notify_job_complete(job_id, "failed", None)
+        status.close()      # fail_job writes the final status
+        fail_job(job_id, error_msg)
         return {"success": False, "error": error_msg, "traceback": error_traceback}
 
 
+# Declared with the largest tier's resources, so a plain call fits any
+# upload; /master spawns the tier it picked via tier_function()
 @app.function(
     image=image,
-    secrets=[r2_secret],
-    timeout=300,  # 5 min timeout for API calls (not processing)
+    volumes={VOLUME_PATH: volume},
+    secrets=[r2_secret, webhook_secret],
+    **TIERS[LARGEST_TIER],
 )
-@modal.asgi_app()
-def fastapi_app():
-    """FastAPI web application for the API endpoints"""
-    from fastapi import FastAPI, HTTPException
-    from fastapi.middleware.cors import CORSMiddleware
-    from fastapi.responses import RedirectResponse
-    import uuid
-    
-    web_app = FastAPI(title="Podcast Mastering API")
-    
-    web_app.add_middleware(
-        CORSMiddleware,
-        allow_origins=["*"],  # In production, restrict to your frontend domain
-        allow_credentials=True,
-        allow_methods=["*"],
-        allow_headers=["*"],
-        expose_headers=["*"],
+def process_audio(
+    job_id: str,
+    target_r2_key: str,
+    reference_source: str,
+    is_template: bool = False,
+    output_quality: str = "standard",      # "standard" (16-bit) or "high" (24-bit)
+    loudness_target: str = "standard",     # "conservative" | "standard" | "loud"
+    noise_reduction: bool = False,         # AI spectral noise reduction pre-pass
+    audio_type: str = "podcast",           # "podcast" | "music" — selects polish chain
+    cache_key: str = None,                 # result_cache entry to record on success
+):
+    """
+    Mastering pipeline. Stages:
+      1. Download target audio from R2
+      2. (optional) Spectral noise reduction
+      3. Matchering — spectral match + RMS match to reference template
+      4. Post-Matchering polish: subsonic HPF, presence lift, gentle de-ess, leveling compressor
+      5. LUFS measurement + makeup gain to hit the loudness target
+      6. True-peak brickwall limiter at -1 dBTP
+      7. Write at requested bit depth, upload to R2 (and Vercel Blob for premium)
+
+    Loudness targets (integrated LUFS):
+      conservative = -16 LUFS (Apple Podcasts / dialog-heavy)
+      standard     = -14 LUFS (Spotify)  ← default
+      loud         = -12 LUFS (broadcast-loud)
+
+    /master runs it with the resources of the tier that fits the probed
+    upload (see routing.py and tier_function).
+    """
+    from mastering_chain import build_polish_chain
+    from reference_analysis import podcast_config
+
+    s3 = get_r2_client()
+    matchering_config = podcast_config()
+
+    try:
+        job_statuses[job_id] = {
+            "status": "processing", "progress": 2, "message": "Loading reference template...", "output_file": None,
+        }
+        reference = load_reference(s3, job_id, reference_source, is_template, matchering_config)
+    except Exception as e:
+        print(f"ERROR in process_audio ({job_id}): {e}")
+        fail_job(job_id, str(e))
+        return {"success": False, "error": str(e)}
+
+    try:
+        return master_job(
+            s3, job_id, target_r2_key, reference, matchering_config, build_polish_chain(audio_type),
+            output_quality=output_quality,
+            loudness_target=loudness_target,
+            noise_reduction=noise_reduction,
+            cache_key=cache_key,
+        )
+    finally:
+        for path in reference["cleanup"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@app.function(
+    image=image,
+    volumes={VOLUME_PATH: volume},
+    secrets=[r2_secret, webhook_secret],
+    **{**TIERS[LARGEST_TIER], "timeout": 86400},
+)
+def process_batch(
+    batch_id: str,
+    jobs: list[dict],                      # [{"job_id", "target_r2_key", "cache_key", "probe", "size"}]
+    reference_source: str,
+    is_template: bool = False,
+    output_quality: str = "standard",
+    loudness_target: str = "standard",
+    noise_reduction: bool = False,
+    audio_type: str = "podcast",
+):
+    """
+    Master a slice of a /master/batch request in one container. The R2
+    client, Matchering config, reference (analysis computed at most once)
+    and polish chain are set up once and shared by every job; each job
+    still gets its own status, output, cache entry and webhook.
+
+    The batch endpoint groups items by tier and runs each slice with that
+    tier's resources (see tier_function).
+    """
+    from mastering_chain import build_polish_chain
+    from reference_analysis import podcast_config
+
+    s3 = get_r2_client()
+    matchering_config = podcast_config()
+    print(f"Batch {batch_id}: {len(jobs)} job(s), audio_type={audio_type}")
+
+    try:
+        reference = load_reference(s3, batch_id, reference_source, is_template, matchering_config)
+    except Exception as e:
+        print(f"ERROR in process_batch {batch_id}: {e}")
+        for job in jobs:
+            fail_job(job["job_id"], str(e))
+        return {"batch_id": batch_id, "results": [{"job_id": j["job_id"], "success": False} for j in jobs]}
+
+    polish_chain = build_polish_chain(audio_type)
+    results = []
+    try:
+        for job in jobs:
+            result = master_job(
+                s3, job["job_id"], job["target_r2_key"], reference, matchering_config, polish_chain,
+                output_quality=output_quality,
+                loudness_target=loudness_target,
+                noise_reduction=noise_reduction,
+                cache_key=job.get("cache_key"),
+            )
+            results.append({"job_id": job["job_id"], "success": result.get("success", False)})
+    finally:
+        for path in reference["cleanup"]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    print(f"Batch {batch_id}: {sum(r['success'] for r in results)}/{len(results)} succeeded")
+    return {"batch_id": batch_id, "results": results}
+
+
+_tier_functions = {}
+
+
+def tier_function(function, tier: str, jobs: int = 1):
+    """`function` (process_audio / process_batch) with the CPU, memory and
+    timeout of routing.TIERS[tier]. A batch worker running `jobs` jobs one
+    after another gets the timeout once per job."""
+    key = (id(function), tier, jobs)
+    if key not in _tier_functions:
+        resources = TIERS[tier]
+        _tier_functions[key] = function.with_options(
+            cpu=resources["cpu"],
+            memory=resources["memory"],
+            timeout=min(86400, resources["timeout"] * jobs),
+        )
+    return _tier_functions[key]
+
+
+@app.function(
+    image=image,
+    secrets=[r2_secret],
+    timeout=120,
+    cpu=1,
+    memory=2048,
+)
+def preview_audio(
+    preview_id: str,
+    target_r2_key: str,
+    reference_source: str,
+    is_template: bool = False,
+    start_seconds: float = None,
+    loudness_target: str = "standard",
+    noise_reduction: bool = False,
+    audio_type: str = "podcast",
+):
+    """
+    Master a PREVIEW_SECONDS window of the target with the same chain as
+    process_audio and return presigned URLs for before/after clips.
+
+    Runs as its own small function so previews are scheduled (and show up
+    in usage) separately from full jobs. Only the window is decoded: ffmpeg
+    seeks into the presigned R2 URL with range requests, so a 2-hour upload
+    is never downloaded. Matchering analyses only the window, so the EQ
+    match is an approximation of what the full job will do.
+
+    The "before" clip is level-matched to the "after" clip, so the
+    comparison isn't just "louder sounds better".
+    """
+    import subprocess
+    import numpy as np
+    import soundfile as sf
+    from loudness import LoudnessMeter
+    from mastering_chain import build_polish_chain, master_clip
+    from reference_analysis import podcast_config, load_analysis, analyze_reference, match_array
+    from r2_transfer import download_file
+
+    s3 = get_r2_client()
+    work_dir = f"/tmp/preview_{preview_id}"
+    os.makedirs(work_dir, exist_ok=True)
+    window_path = f"{work_dir}/window.wav"
+    before_path = f"{work_dir}/before.wav"
+    after_path = f"{work_dir}/after.wav"
+
+    def decode_window(start: float) -> tuple[np.ndarray, int]:
+        url = s3.generate_presigned_url(
+            "get_object", Params={"Bucket": R2_BUCKET, "Key": target_r2_key}, ExpiresIn=600,
+        )
+        subprocess.run(
+            [
+                "ffmpeg", "-nostdin", "-v", "error", "-y",
+                "-ss", f"{start:.3f}", "-t", f"{PREVIEW_SECONDS:.3f}",
+                "-i", url, "-c:a", "pcm_f32le", window_path,
+            ],
+            check=True, timeout=60,
+        )
+        return sf.read(window_path, always_2d=True, dtype="float32")
+
+    try:
+        start = PREVIEW_DEFAULT_START_SECONDS if start_seconds is None else max(0.0, float(start_seconds))
+        audio, sr = decode_window(start)
+        if audio.shape[0] < PREVIEW_MIN_SECONDS * sr and start > 0:
+            # Window ran past the end of a short file — take the beginning instead
+            start = 0.0
+            audio, sr = decode_window(start)
+        if audio.shape[0] < PREVIEW_MIN_SECONDS * sr:
+            raise ValueError("Audio is too short to preview")
+
+        matchering_config = podcast_config()
+        analysis = None
+        if is_template:
+            template = REFERENCE_TEMPLATES.get(reference_source)
+            if not template:
+                raise ValueError(f"Unknown template: {reference_source}")
+            analysis = load_analysis(template["analysis_path"], matchering_config, template["file_path"])
+            reference_path = template["file_path"]
+        else:
+            reference_path = f"{work_dir}/reference"
+            download_file(s3, R2_BUCKET, reference_source, reference_path)
+        if analysis is None:
+            analysis = analyze_reference(reference_path, matchering_config)
+
+        matchering_input = audio
+        if noise_reduction:
+            import noisereduce as nr
+            matchering_input = nr.reduce_noise(
+                y=audio.T, sr=sr, stationary=False, prop_decrease=0.75,
+                n_fft=1024, time_constant_s=2.0,
+            ).T
+
+        matched = match_array(matchering_input, sr, analysis, matchering_config)
+        after_sr = matchering_config.internal_sample_rate
+        after, after_lufs = master_clip(
+            matched.T, after_sr, build_polish_chain(audio_type),
+            LOUDNESS_TARGETS.get(loudness_target, -14.0), TRUE_PEAK_CEILING_DB,
+        )
+
+        # Level-match "before" to "after"; if that would clip, turn both down
+        meter = LoudnessMeter(sr, audio.shape[1])
+        meter.feed(audio)
+        before_lufs = meter.integrated_loudness()
+        before_gain_db = after_lufs - before_lufs if np.isfinite(before_lufs) and np.isfinite(after_lufs) else 0.0
+        before = audio * 10.0 ** (before_gain_db / 20.0)
+        ceiling = 10.0 ** (TRUE_PEAK_CEILING_DB / 20.0)
+        peak = float(np.abs(before).max())
+        if peak > ceiling:
+            before *= ceiling / peak
+            after = after * (ceiling / peak)
+            after_lufs += 20.0 * np.log10(ceiling / peak)
+
+        sf.write(before_path, before, sr, subtype="PCM_16")
+        sf.write(after_path, after.T, after_sr, subtype="PCM_16")
+
+        urls = {}
+        for name, path in (("before", before_path), ("after", after_path)):
+            key = f"previews/{preview_id}/{name}.wav"
+            s3.upload_file(path, R2_BUCKET, key, ExtraArgs={"ContentType": "audio/wav"})
+            urls[f"{name}_url"] = s3.generate_presigned_url(
+                "get_object", Params={"Bucket": R2_BUCKET, "Key": key}, ExpiresIn=PREVIEW_URL_EXPIRY,
+            )
+
+        print(
+            f"Preview {preview_id}: {start:.0f}s +{PREVIEW_SECONDS:.0f}s, "
+            f"before {before_lufs:.1f} LUFS -> after {after_lufs:.1f} LUFS"
+        )
+        return {
+            "success": True,
+            "preview_id": preview_id,
+            "start_seconds": start,
+            "duration_seconds": audio.shape[0] / sr,
+            "output_lufs": after_lufs,
+            **urls,
+        }
+
+    except Exception as e:
+        print(f"ERROR in preview_audio: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        import shutil
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@app.function(
+    image=image,
+    secrets=[r2_secret, webhook_secret],
+    timeout=1800,
+)
+def deliver_cached_result(job_id: str, output_r2_key: str):
+    """
+    Finish a job that was served from result_cache: the same Vercel Blob
+    upload and completion webhook process_audio would have done, for the
+    already-mastered output.
+    """
+    from r2_transfer import download_file
+
+    s3 = get_r2_client()
+    # upload_to_vercel_blob names the blob after this file
+    local_path = f"/tmp/{job_id}_mastered.wav"
+    blob_data = None
+    try:
+        download_file(s3, R2_BUCKET, output_r2_key, local_path)
+        blob_data = upload_to_vercel_blob(job_id, local_path, os.path.getsize(local_path))
+    except Exception as e:
+        print(f"Error delivering cached result for job {job_id}: {e}")
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+    notify_job_complete(job_id, "completed", output_r2_key, blob_data)
+    return {"success": True, "output_file": output_r2_key, "blob_data": blob_data}
+
+
+@app.function(
+    image=image,
+    secrets=[r2_secret],
+    timeout=300,  # 5 min timeout for API calls (not processing)
+)
+# Status streams stay open for minutes; one container serves many of them
+# (and shares one status watcher per job between them)
+@modal.concurrent(max_inputs=500)
+@modal.asgi_app()
+def fastapi_app():
+    """FastAPI web application for the API endpoints"""
+    from fastapi import FastAPI, HTTPException, Query
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import RedirectResponse, StreamingResponse
+    from pydantic import BaseModel
+    import asyncio
+    import functools
+    import uuid
+    from concurrent.futures import ThreadPoolExecutor
+    from status_stream import SSE_HEADERS, StatusWatchers
+    from status_cache import TTLCache
+
+    web_app = FastAPI(title="Podcast Mastering API")
+
+    # Handlers serve many requests at once on one event loop, so nothing
+    # blocking runs on it: Dict calls use the .aio API, and boto3 / ffprobe
+    # / helpers that make several sync Dict calls run on this bounded pool.
+    blocking_pool = ThreadPoolExecutor(max_workers=API_BLOCKING_THREADS, thread_name_prefix="api-io")
+
+    async def run_blocking(fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(blocking_pool, functools.partial(fn, *args, **kwargs))
+
+    # Build the R2 client before serving; handlers then get it for free and
+    # presign locally on the event loop
+    get_r2_client()
+
+    # Status reads go through a sub-second per-container cache, so many
+    # polls (and streams) of the same job share one Dict read
+    status_cache = TTLCache(lambda job_id: job_statuses.get.aio(job_id))
+    transcription_cache = TTLCache(lambda job_id: transcription_jobs.get.aio(job_id))
+    status_watchers = StatusWatchers(status_cache.get)
+    
+    web_app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, restrict to your frontend domain
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["*"],
     )
     
     @web_app.get("/")
@@ -789,14 +1685,8 @@ def fastapi_app():
             },
         }
     
-    @web_app.post("/get-upload-url")
-    async def get_upload_url(filename: str, content_type: str = "audio/wav"):
-        """
-        Generate a presigned URL for direct upload to R2.
-        Client uploads directly to R2, bypassing our server.
-        """
-        from datetime import datetime
-        
+    def new_upload_key(filename: str) -> tuple[str, str]:
+        """(file_id, r2_key) for a new upload; 400 for unsupported types."""
         # Validate file extension
         allowed_extensions = {".wav", ".mp3", ".flac", ".aiff", ".ogg", ".m4a"}
         ext = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
@@ -809,7 +1699,17 @@ def fastapi_app():
         
         # Generate unique file ID and R2 key
         file_id = str(uuid.uuid4())
-        r2_key = f"uploads/{file_id}{ext}"
+        return file_id, f"uploads/{file_id}{ext}"
+
+    @web_app.post("/get-upload-url")
+    async def get_upload_url(filename: str, content_type: str = "audio/wav"):
+        """
+        Generate a presigned URL for direct upload to R2.
+        Client uploads directly to R2, bypassing our server.
+        """
+        from datetime import datetime
+        
+        file_id, r2_key = new_upload_key(filename)
         
         # Generate presigned PUT URL (valid for 2 hours)
         s3 = get_r2_client()
@@ -823,13 +1723,15 @@ def fastapi_app():
             ExpiresIn=7200,  # 2 hours
         )
         
-        # Track file metadata
-        file_metadata[file_id] = {
+        # Track file metadata, and when it expires
+        uploaded_at = datetime.utcnow()
+        await file_metadata.put.aio(file_id, {
             "r2_key": r2_key,
             "original_name": filename,
-            "uploaded_at": datetime.utcnow().isoformat(),
+            "uploaded_at": uploaded_at.isoformat(),
             "content_type": content_type,
-        }
+        })
+        await run_blocking(register_expiry, file_id, uploaded_at)
         
         return {
             "file_id": file_id,
@@ -843,22 +1745,27 @@ def fastapi_app():
         Confirm that a file was successfully uploaded to R2.
         Called by frontend after direct R2 upload completes.
         """
-        metadata = file_metadata.get(file_id)
+        metadata = await file_metadata.get.aio(file_id)
         if not metadata:
             raise HTTPException(status_code=404, detail="File not found")
+        if metadata.get("multipart") and not metadata["multipart"].get("completed"):
+            raise HTTPException(status_code=409, detail="Multipart upload not completed yet")
         
         # Verify file exists in R2
         s3 = get_r2_client()
         try:
-            response = s3.head_object(Bucket=R2_BUCKET, Key=metadata["r2_key"])
+            response = await run_blocking(s3.head_object, Bucket=R2_BUCKET, Key=metadata["r2_key"])
             actual_size = response.get("ContentLength", 0)
         except Exception:
             raise HTTPException(status_code=404, detail="File not found in storage")
         
-        # Update metadata with confirmed size
+        # Update metadata with confirmed size (+ ETag, for the result cache).
+        # The audio header is probed at /master, which keeps this call fast.
         metadata["size"] = actual_size
+        metadata["etag"] = response.get("ETag", "").strip('"')
         metadata["confirmed"] = True
-        file_metadata[file_id] = metadata
+        metadata.pop("multipart", None)
+        await file_metadata.put.aio(file_id, metadata)
         
         return {
             "file_id": file_id,
@@ -866,6 +1773,302 @@ def fastapi_app():
             "status": "confirmed",
         }
     
+    def presign_parts(s3, r2_key: str, upload_id: str, part_numbers: list[int]) -> list[dict]:
+        return [
+            {
+                "part_number": n,
+                "url": s3.generate_presigned_url(
+                    "upload_part",
+                    Params={"Bucket": R2_BUCKET, "Key": r2_key, "UploadId": upload_id, "PartNumber": n},
+                    ExpiresIn=MULTIPART_URL_EXPIRY,
+                ),
+            }
+            for n in part_numbers
+        ]
+
+    async def pending_multipart(file_id: str) -> tuple[dict, dict]:
+        """(metadata, multipart state) of an upload not yet confirmed."""
+        metadata = await file_metadata.get.aio(file_id)
+        if not metadata:
+            raise HTTPException(status_code=404, detail="File not found")
+        multipart = metadata.get("multipart")
+        if not multipart:
+            raise HTTPException(status_code=409, detail="Not a multipart upload, or already confirmed")
+        return metadata, multipart
+
+    async def list_multipart(s3, metadata: dict, multipart: dict) -> tuple[list[dict], list[int]]:
+        try:
+            return await run_blocking(multipart_part_status, s3, metadata["r2_key"], multipart)
+        except Exception as e:
+            if "NoSuchUpload" in str(e):
+                raise HTTPException(status_code=410, detail="Upload expired or aborted; start a new one")
+            raise
+
+    @web_app.post("/upload/multipart")
+    async def create_multipart_upload(filename: str, size: int, content_type: str = "audio/wav"):
+        """
+        Start a resumable, parallel upload of a large file straight to R2
+        (instead of /get-upload-url's single PUT, which tops out at 5 GB).
+
+        The browser splits the file into `part_count` parts of `part_size`
+        bytes (the last one shorter) and PUTs them, several at once, to the
+        presigned URLs. The first MULTIPART_URL_BATCH URLs come with this
+        response; then:
+          POST   /upload/multipart/{file_id}/urls      more part URLs
+          GET    /upload/multipart/{file_id}/parts     what's uploaded (to resume)
+          POST   /upload/multipart/{file_id}/complete  assemble the object
+          POST   /confirm-upload                       as for a single PUT
+          DELETE /upload/multipart/{file_id}           give up
+        """
+        from datetime import datetime
+
+        if size <= 0:
+            raise HTTPException(status_code=400, detail="size must be the file size in bytes")
+        part_size = multipart_part_size(size)
+        if part_size is None:
+            raise HTTPException(status_code=400, detail="File too large")
+        file_id, r2_key = new_upload_key(filename)
+
+        s3 = get_r2_client()
+        response = await run_blocking(
+            s3.create_multipart_upload, Bucket=R2_BUCKET, Key=r2_key, ContentType=content_type,
+        )
+        multipart = {
+            "upload_id": response["UploadId"],
+            "size": size,
+            "part_size": part_size,
+            "part_count": -(-size // part_size),
+            "completed": False,
+        }
+
+        # Track file metadata, and when it expires (cleanup_old_files aborts
+        # an upload that was never completed)
+        uploaded_at = datetime.utcnow()
+        await file_metadata.put.aio(file_id, {
+            "r2_key": r2_key,
+            "original_name": filename,
+            "uploaded_at": uploaded_at.isoformat(),
+            "content_type": content_type,
+            "multipart": multipart,
+        })
+        await run_blocking(register_expiry, file_id, uploaded_at)
+
+        first = range(1, min(multipart["part_count"], MULTIPART_URL_BATCH) + 1)
+        return {
+            "file_id": file_id,
+            "r2_key": r2_key,
+            "part_size": part_size,
+            "part_count": multipart["part_count"],
+            "part_urls": presign_parts(s3, r2_key, multipart["upload_id"], list(first)),
+        }
+
+    @web_app.post("/upload/multipart/{file_id}/urls")
+    async def multipart_part_urls(file_id: str, part_numbers: list[int] = Query(...)):
+        """Presigned PUT URLs for the given parts (repeat part_numbers, up
+        to MULTIPART_URL_BATCH). Ask again for parts whose URL expired."""
+        metadata, multipart = await pending_multipart(file_id)
+        part_numbers = sorted(set(part_numbers))
+        if len(part_numbers) > MULTIPART_URL_BATCH:
+            raise HTTPException(status_code=400, detail=f"At most {MULTIPART_URL_BATCH} parts per request")
+        if part_numbers[0] < 1 or part_numbers[-1] > multipart["part_count"]:
+            raise HTTPException(status_code=400, detail=f"Part numbers run from 1 to {multipart['part_count']}")
+        if multipart["completed"]:
+            raise HTTPException(status_code=409, detail="Upload already completed")
+        return {
+            "file_id": file_id,
+            "part_urls": presign_parts(get_r2_client(), metadata["r2_key"], multipart["upload_id"], part_numbers),
+        }
+
+    @web_app.get("/upload/multipart/{file_id}/parts")
+    async def multipart_parts(file_id: str):
+        """Parts R2 already has, and the part numbers still to send, so an
+        interrupted upload resumes where it stopped."""
+        metadata, multipart = await pending_multipart(file_id)
+        if multipart["completed"]:
+            uploaded, missing = [], []
+        else:
+            uploaded, missing = await list_multipart(get_r2_client(), metadata, multipart)
+        return {
+            "file_id": file_id,
+            "part_size": multipart["part_size"],
+            "part_count": multipart["part_count"],
+            "completed": multipart["completed"],
+            "parts": uploaded,
+            "missing": missing,
+        }
+
+    @web_app.post("/upload/multipart/{file_id}/complete")
+    async def complete_multipart(file_id: str):
+        """
+        Assemble the uploaded parts into one object. Part ETags come from R2
+        (ListParts), so the browser doesn't have to read them from the PUT
+        responses. 409 with the missing part numbers if any are absent.
+        Follow with /confirm-upload.
+        """
+        metadata, multipart = await pending_multipart(file_id)
+        if multipart["completed"]:
+            return {"file_id": file_id, "size": multipart["size"], "status": "uploaded"}
+
+        s3 = get_r2_client()
+        uploaded, missing = await list_multipart(s3, metadata, multipart)
+        if missing:
+            raise HTTPException(
+                status_code=409,
+                detail={
+                    "message": "Parts missing",
+                    "missing": missing[:MULTIPART_URL_BATCH],
+                    "missing_count": len(missing),
+                },
+            )
+        await run_blocking(
+            s3.complete_multipart_upload,
+            Bucket=R2_BUCKET,
+            Key=metadata["r2_key"],
+            UploadId=multipart["upload_id"],
+            MultipartUpload={"Parts": [{"PartNumber": p["part_number"], "ETag": p["etag"]} for p in uploaded]},
+        )
+        multipart["completed"] = True
+        await file_metadata.put.aio(file_id, metadata)
+        return {"file_id": file_id, "size": multipart["size"], "status": "uploaded"}
+
+    @web_app.delete("/upload/multipart/{file_id}")
+    async def abort_multipart(file_id: str):
+        """Cancel an unfinished multipart upload and discard its parts."""
+        metadata, multipart = await pending_multipart(file_id)
+        if multipart["completed"]:
+            raise HTTPException(status_code=409, detail="Upload already completed")
+        try:
+            await run_blocking(
+                get_r2_client().abort_multipart_upload,
+                Bucket=R2_BUCKET, Key=metadata["r2_key"], UploadId=multipart["upload_id"],
+            )
+        except Exception as e:
+            if "NoSuchUpload" not in str(e):
+                raise
+        await file_metadata.pop.aio(file_id)
+        return {"file_id": file_id, "status": "aborted"}
+
+    async def resolve_reference(template_id: str, reference_file_id: str) -> tuple[str, bool, dict]:
+        """(reference_source, is_template, reference_meta) for /master and /preview."""
+        if template_id:
+            if template_id not in REFERENCE_TEMPLATES:
+                raise HTTPException(status_code=404, detail=f"Template '{template_id}' not found")
+            return template_id, True, None
+        reference_meta = await file_metadata.get.aio(reference_file_id)
+        if not reference_meta:
+            raise HTTPException(status_code=404, detail="Reference file not found")
+        reference_source = reference_meta.get("r2_key")
+        if not reference_source:
+            raise HTTPException(status_code=400, detail="Reference file not properly uploaded")
+        return reference_source, False, reference_meta
+
+    def normalize_settings(output_quality: str, loudness_target: str, limiter_mode: str,
+                           noise_reduction: bool, audio_type: str) -> tuple[str, str, bool, str]:
+        """Coerce /master-style settings to supported values (with the legacy
+        limiter_mode fallback). Returns (output_quality, loudness_target,
+        noise_reduction, audio_type)."""
+        # Resolve loudness_target (with legacy fallback)
+        if loudness_target is None and limiter_mode is not None:
+            loudness_target = LEGACY_LIMITER_MODE_MAP.get(limiter_mode, "standard")
+        if loudness_target not in LOUDNESS_TARGETS:
+            loudness_target = "standard"
+
+        # Validate output_quality
+        if output_quality not in ["standard", "high"]:
+            output_quality = "standard"
+
+        # Validate audio_type (selects the polish chain shape)
+        if audio_type not in ["podcast", "music"]:
+            audio_type = "podcast"
+
+        # Coerce noise_reduction to bool (FastAPI usually handles this, but be defensive)
+        noise_reduction = bool(noise_reduction) if noise_reduction is not None else False
+        return output_quality, loudness_target, noise_reduction, audio_type
+
+    def reference_identity(s3, template_id: str, reference_meta: dict) -> str | None:
+        """Reference part of the result cache key."""
+        try:
+            if template_id:
+                template_path = REFERENCE_TEMPLATES[template_id]["file_path"]
+                return f"template:{template_id}:{os.path.basename(template_path)}:{os.path.getsize(template_path)}"
+            return r2_content_hash(s3, reference_meta)
+        except Exception as e:
+            print(f"Result cache: no reference identity: {e}")
+            return None
+
+    def lookup_result_cache(s3, target_file_id: str, target_meta: dict, reference_id: str,
+                            output_quality: str, loudness_target: str, noise_reduction: bool,
+                            audio_type: str) -> tuple[str, dict]:
+        """(cache_key, cached entry or None). The key is None if the target
+        or reference can't be identified; a hit that cleanup is about to
+        delete counts as a miss."""
+        if not reference_id:
+            return None, None
+        try:
+            target_hash = r2_content_hash(s3, target_meta)
+        except Exception as e:
+            print(f"Result cache key unavailable for {target_file_id}: {e}")
+            return None, None
+        if not target_hash:
+            return None, None
+        cache_key = result_cache_key(
+            target_hash, reference_id, output_quality, loudness_target, noise_reduction, audio_type,
+        )
+        cached = result_cache.get(cache_key)
+        if cached:
+            expires_at = datetime.fromisoformat(cached.get("expires_at", "2000-01-01"))
+            if expires_at - datetime.utcnow() < RESULT_CACHE_MIN_REMAINING:
+                cached = None
+        return cache_key, cached
+
+    async def serve_cached_result(job_id: str, file_id: str, target_meta: dict, cache_key: str,
+                                  cached: dict, **status_fields) -> bool:
+        """
+        Complete a new job from a result_cache hit. The cached output is
+        copied to this job's own output key, so it lives as long as this
+        upload rather than the one that produced it. False (treat as a
+        miss) if the copy fails, e.g. the source was just deleted.
+        """
+        output_r2_key = f"outputs/{job_id}_mastered.wav"
+        try:
+            await run_blocking(copy_r2_object, get_r2_client(), cached["output_file"], output_r2_key)
+        except Exception as e:
+            print(f"Result cache hit for job {job_id} unusable, mastering instead: {e}")
+            return False
+        print(f"Result cache hit for job {job_id}: copied {cached['output_file']} from job {cached.get('job_id')}")
+
+        target_meta["output_r2_key"] = output_r2_key
+        await file_metadata.put.aio(file_id, target_meta)
+        # Point the entry at whichever copy cleanup deletes last
+        uploaded_at = datetime.fromisoformat(target_meta.get("uploaded_at", datetime.utcnow().isoformat()))
+        expires_at = uploaded_at + timedelta(hours=FILE_RETENTION_HOURS)
+        if expires_at > datetime.fromisoformat(cached.get("expires_at", "2000-01-01")):
+            await result_cache.put.aio(cache_key, {
+                "output_file": output_r2_key,
+                "job_id": job_id,
+                "created_at": datetime.utcnow().isoformat(),
+                "expires_at": expires_at.isoformat(),
+            })
+
+        await job_statuses.put.aio(job_id, {
+            "status": "completed",
+            "progress": 100,
+            "message": "Mastering complete!",
+            "output_file": output_r2_key,
+            "cached": True,
+            **status_fields,
+        })
+        await deliver_cached_result.spawn.aio(job_id, output_r2_key)
+        return True
+
+    def target_probe(s3, file_id: str, target_meta: dict) -> dict | None:
+        """The upload's probe, run on its first /master and kept in its
+        metadata for later jobs on the same file."""
+        if "probe" not in target_meta:
+            target_meta["probe"] = probe_upload(s3, target_meta["r2_key"])
+            file_metadata[file_id] = target_meta
+        return target_meta["probe"]
+
     @web_app.post("/master")
     async def start_mastering(
         target_file_id: str,
@@ -898,25 +2101,12 @@ def fastapi_app():
                 detail="Either template_id or reference_file_id must be provided"
             )
 
-        # Resolve loudness_target (with legacy fallback)
-        if loudness_target is None and limiter_mode is not None:
-            loudness_target = LEGACY_LIMITER_MODE_MAP.get(limiter_mode, "standard")
-        if loudness_target not in LOUDNESS_TARGETS:
-            loudness_target = "standard"
-
-        # Validate output_quality
-        if output_quality not in ["standard", "high"]:
-            output_quality = "standard"
-
-        # Validate audio_type (selects the polish chain shape)
-        if audio_type not in ["podcast", "music"]:
-            audio_type = "podcast"
-
-        # Coerce noise_reduction to bool (FastAPI usually handles this, but be defensive)
-        noise_reduction = bool(noise_reduction) if noise_reduction is not None else False
+        output_quality, loudness_target, noise_reduction, audio_type = normalize_settings(
+            output_quality, loudness_target, limiter_mode, noise_reduction, audio_type,
+        )
 
         # Get target file metadata
-        target_meta = file_metadata.get(target_file_id)
+        target_meta = await file_metadata.get.aio(target_file_id)
         if not target_meta:
             raise HTTPException(status_code=404, detail="Target file not found")
 
@@ -924,38 +2114,43 @@ def fastapi_app():
         if not target_r2_key:
             raise HTTPException(status_code=400, detail="Target file not properly uploaded")
 
-        # Determine reference source
-        if template_id:
-            if template_id not in REFERENCE_TEMPLATES:
-                raise HTTPException(status_code=404, detail=f"Template '{template_id}' not found")
-            reference_source = template_id
-            is_template = True
-        else:
-            reference_meta = file_metadata.get(reference_file_id)
-            if not reference_meta:
-                raise HTTPException(status_code=404, detail="Reference file not found")
-            reference_source = reference_meta.get("r2_key")
-            if not reference_source:
-                raise HTTPException(status_code=400, detail="Reference file not properly uploaded")
-            is_template = False
+        reference_source, is_template, reference_meta = await resolve_reference(template_id, reference_file_id)
+
+        # Same audio + reference + settings as a job whose output is still in R2?
+        s3 = get_r2_client()
+        reference_id = await run_blocking(reference_identity, s3, template_id, reference_meta)
+        cache_key, cached = await run_blocking(
+            lookup_result_cache,
+            s3, target_file_id, target_meta, reference_id,
+            output_quality, loudness_target, noise_reduction, audio_type,
+        )
 
         # Create job
         job_id = str(uuid.uuid4())
 
         # Update metadata with job_id for cleanup tracking
         target_meta["job_id"] = job_id
-        file_metadata[target_file_id] = target_meta
+        target_meta.setdefault("job_ids", []).append(job_id)
+        await file_metadata.put.aio(target_file_id, target_meta)
+        await job_files.put.aio(job_id, target_file_id)
+
+        if cached and await serve_cached_result(job_id, target_file_id, target_meta, cache_key, cached):
+            return {"job_id": job_id, "message": "Mastering job completed (cached result)", "cached": True}
 
         # Initialize job status
-        job_statuses[job_id] = {
+        await job_statuses.put.aio(job_id, {
             "status": "pending",
             "progress": 0,
             "message": "Queued for processing...",
             "output_file": None,
-        }
-
-        # Spawn the processing function with all settings
-        process_audio.spawn(
+        })
+
+        # Spawn the processing function with all settings, in a container
+        # sized for this upload
+        probe = await run_blocking(target_probe, s3, target_file_id, target_meta)
+        tier = choose_tier(probe, noise_reduction, target_meta.get("size"))
+        print(f"Job {job_id}: {tier} container")
+        await tier_function(process_audio, tier).spawn.aio(
             job_id,
             target_r2_key,
             reference_source,
@@ -964,14 +2159,239 @@ def fastapi_app():
             loudness_target,
             noise_reduction,
             audio_type,
+            cache_key,
         )
 
-        return {"job_id": job_id, "message": "Mastering job started"}
+        return {"job_id": job_id, "message": "Mastering job started", "tier": tier}
     
+    @web_app.post("/master/batch")
+    async def start_batch_mastering(
+        target_file_ids: list[str] = Query(...),
+        template_id: str = None,
+        reference_file_id: str = None,
+        output_quality: str = "standard",
+        loudness_target: str = None,
+        noise_reduction: bool = False,
+        audio_type: str = "podcast",
+        limiter_mode: str = None,             # DEPRECATED — same fallback as /master
+    ):
+        """
+        Master many uploads (e.g. a whole season) with one reference and one
+        set of settings. Same parameters as /master, with `target_file_ids`
+        repeated once per episode.
+
+        Each item becomes a normal job (pollable via /status/{job_id},
+        downloadable via /download/{job_id}); /batch/{batch_id} reports them
+        together. Items are processed BATCH_ITEMS_PER_WORKER to a container.
+        """
+        if not template_id and not reference_file_id:
+            raise HTTPException(
+                status_code=400,
+                detail="Either template_id or reference_file_id must be provided"
+            )
+        target_file_ids = list(dict.fromkeys(target_file_ids))  # de-dupe, keep order
+        if not target_file_ids:
+            raise HTTPException(status_code=400, detail="No target files given")
+        if len(target_file_ids) > MAX_BATCH_ITEMS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_ITEMS} files per batch")
+
+        output_quality, loudness_target, noise_reduction, audio_type = normalize_settings(
+            output_quality, loudness_target, limiter_mode, noise_reduction, audio_type,
+        )
+
+        # Validate every item before creating any job
+        targets = []
+        for file_id in target_file_ids:
+            target_meta = await file_metadata.get.aio(file_id)
+            if not target_meta:
+                raise HTTPException(status_code=404, detail=f"Target file {file_id} not found")
+            if not target_meta.get("r2_key"):
+                raise HTTPException(status_code=400, detail=f"Target file {file_id} not properly uploaded")
+            targets.append((file_id, target_meta))
+
+        reference_source, is_template, reference_meta = await resolve_reference(template_id, reference_file_id)
+
+        s3 = get_r2_client()
+        reference_id = await run_blocking(reference_identity, s3, template_id, reference_meta)
+
+        batch_id = str(uuid.uuid4())
+        items = []
+        to_process = []
+        for file_id, target_meta in targets:
+            cache_key, cached = await run_blocking(
+                lookup_result_cache,
+                s3, file_id, target_meta, reference_id,
+                output_quality, loudness_target, noise_reduction, audio_type,
+            )
+            job_id = str(uuid.uuid4())
+            target_meta["job_id"] = job_id
+            target_meta.setdefault("job_ids", []).append(job_id)
+            await file_metadata.put.aio(file_id, target_meta)
+            await job_files.put.aio(job_id, file_id)
+            items.append({"file_id": file_id, "job_id": job_id})
+
+            if cached and await serve_cached_result(job_id, file_id, target_meta, cache_key, cached,
+                                                    batch_id=batch_id):
+                continue
+            await job_statuses.put.aio(job_id, {
+                "status": "pending",
+                "progress": 0,
+                "message": "Queued for processing...",
+                "output_file": None,
+                "batch_id": batch_id,
+            })
+            to_process.append({
+                "job_id": job_id,
+                "target_r2_key": target_meta["r2_key"],
+                "cache_key": cache_key,
+                "probe": await run_blocking(target_probe, s3, file_id, target_meta),
+                "size": target_meta.get("size"),
+            })
+
+        await batch_statuses.put.aio(batch_id, {
+            "created_at": datetime.utcnow().isoformat(),
+            "template_id": template_id,
+            "reference_file_id": reference_file_id,
+            "settings": {
+                "output_quality": output_quality,
+                "loudness_target": loudness_target,
+                "noise_reduction": noise_reduction,
+                "audio_type": audio_type,
+            },
+            "items": items,
+        })
+
+        # Slice within each job's own tier so one long episode doesn't pull
+        # short ones into a large container
+        by_tier = {}
+        for job in to_process:
+            by_tier.setdefault(choose_tier(job["probe"], noise_reduction, job["size"]), []).append(job)
+        slices = [
+            (tier, jobs[start:start + BATCH_ITEMS_PER_WORKER])
+            for tier, jobs in by_tier.items()
+            for start in range(0, len(jobs), BATCH_ITEMS_PER_WORKER)
+        ]
+        for tier, jobs in slices:
+            await tier_function(process_batch, tier, len(jobs)).spawn.aio(
+                batch_id,
+                jobs,
+                reference_source,
+                is_template,
+                output_quality,
+                loudness_target,
+                noise_reduction,
+                audio_type,
+            )
+
+        return {
+            "batch_id": batch_id,
+            "items": items,
+            "cached": len(items) - len(to_process),
+            "message": f"Batch of {len(items)} started",
+        }
+
+    @web_app.get("/batch/{batch_id}")
+    async def get_batch_status(batch_id: str):
+        """Per-item status of a /master/batch request, plus totals."""
+        batch = await batch_statuses.get.aio(batch_id)
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found")
+
+        items = []
+        counts = {"pending": 0, "processing": 0, "completed": 0, "failed": 0}
+        statuses = await status_cache.get_many([item["job_id"] for item in batch["items"]])
+        for item in batch["items"]:
+            status = statuses[item["job_id"]] or {"status": "failed", "progress": 0, "message": "Job expired"}
+            counts[status.get("status", "pending")] = counts.get(status.get("status", "pending"), 0) + 1
+            items.append({**item, **status})
+
+        done = counts["completed"] + counts["failed"]
+        return {
+            "batch_id": batch_id,
+            "status": "completed" if done == len(items) else "processing",
+            "progress": round(sum(
+                100 if i.get("status") in ("completed", "failed") else i.get("progress", 0) for i in items
+            ) / max(1, len(items))),
+            "counts": counts,
+            "settings": batch["settings"],
+            "items": items,
+        }
+
+    @web_app.post("/preview")
+    async def preview_mastering(
+        target_file_id: str,
+        template_id: str = None,
+        reference_file_id: str = None,
+        start_seconds: float = None,          # window start; default PREVIEW_DEFAULT_START_SECONDS
+        loudness_target: str = "standard",
+        noise_reduction: bool = False,
+        audio_type: str = "podcast",
+    ):
+        """
+        Master a 30-second window of the target and return before/after clips.
+
+        Same reference/settings parameters as /master (output is always
+        16-bit). Synchronous — returns presigned `before_url` / `after_url`
+        in a few seconds. No job is created and nothing is cached.
+        """
+        if not template_id and not reference_file_id:
+            raise HTTPException(
+                status_code=400,
+                detail="Either template_id or reference_file_id must be provided"
+            )
+        if loudness_target not in LOUDNESS_TARGETS:
+            loudness_target = "standard"
+        if audio_type not in ["podcast", "music"]:
+            audio_type = "podcast"
+
+        target_meta = await file_metadata.get.aio(target_file_id)
+        if not target_meta:
+            raise HTTPException(status_code=404, detail="Target file not found")
+        target_r2_key = target_meta.get("r2_key")
+        if not target_r2_key:
+            raise HTTPException(status_code=400, detail="Target file not properly uploaded")
+
+        reference_source, is_template, _ = await resolve_reference(template_id, reference_file_id)
+
+        result = await preview_audio.remote.aio(
+            str(uuid.uuid4()),
+            target_r2_key,
+            reference_source,
+            is_template,
+            start_seconds,
+            loudness_target,
+            bool(noise_reduction),
+            audio_type,
+        )
+        if not result.get("success"):
+            raise HTTPException(status_code=422, detail=f"Preview failed: {result.get('error')}")
+        return result
+
+    class StatusBatchRequest(BaseModel):
+        job_ids: list[str]
+
+    @web_app.post("/status/batch")
+    async def get_status_batch(request: StatusBatchRequest):
+        """
+        Status of many jobs in one request (dashboards), as a JSON body
+        `{"job_ids": [...]}`: 200 ids don't fit in a URL most proxies
+        accept. Unknown or expired jobs come back as null.
+        """
+        job_ids = list(dict.fromkeys(request.job_ids))
+        if len(job_ids) > MAX_STATUS_BATCH:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_STATUS_BATCH} jobs per request")
+        statuses = await status_cache.get_many(job_ids)
+        return {
+            "jobs": {
+                job_id: {"job_id": job_id, **status} if status else None
+                for job_id, status in statuses.items()
+            },
+        }
+
     @web_app.get("/status/{job_id}")
     async def get_status(job_id: str):
         """Get job status"""
-        status = job_statuses.get(job_id)
+        status = await status_cache.get(job_id)
         if not status:
             raise HTTPException(status_code=404, detail="Job not found")
         
@@ -979,11 +2399,61 @@ def fastapi_app():
             "job_id": job_id,
             **status,
         }
-    
+
+    @web_app.get("/status/{job_id}/stream")
+    async def stream_status(job_id: str):
+        """
+        Server-sent events instead of polling /status: a `status` event with
+        the full status, then one with just the changed fields whenever it
+        changes, and `end` once the job completes or fails. Streams close
+        after a few minutes; EventSource reconnects by itself.
+        """
+        if not await status_cache.get(job_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        return StreamingResponse(
+            status_watchers.sse(job_id, lambda s: {"job_id": job_id, **s}),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
+
+    @web_app.get("/status/{job_id}/wait")
+    async def wait_for_status(job_id: str, etag: str = None, timeout: float = 25):
+        """
+        Long poll: returns as soon as the status differs from the one `etag`
+        was returned with (or after `timeout` seconds, max 30), plus its new
+        etag. Without etag it returns straight away.
+        """
+        status, new_etag = await status_watchers.wait_for_change(
+            job_id, etag, timeout, lambda s: {"job_id": job_id, **s}
+        )
+        if status is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return {**status, "etag": new_etag}
+
+    @web_app.get("/metrics")
+    async def get_metrics(job_id: str = None):
+        """
+        Per-stage timing and resources (see instrumentation.py).
+
+        With job_id: that job's spans. Without: every recorded job aggregated
+        per content-length bucket and stage, with the stage that dominates
+        wall time in each bucket.
+        """
+        from instrumentation import summarize
+
+        if job_id:
+            record = await job_metrics.get.aio(job_id)
+            if not record:
+                raise HTTPException(status_code=404, detail="No metrics for this job")
+            return record
+
+        records = await run_blocking(lambda: [r for r in job_metrics.values() if r.get("success")])
+        return {"jobs": len(records), "buckets": summarize(records)}
+
     @web_app.get("/download/{job_id}")
     async def download_result(job_id: str):
         """Get a presigned download URL for the mastered audio"""
-        status = job_statuses.get(job_id)
+        status = await job_statuses.get.aio(job_id)
         if not status:
             raise HTTPException(status_code=404, detail="Job not found")
         
@@ -1020,16 +2490,16 @@ def fastapi_app():
         job_id = str(uuid.uuid4())
         
         # Initialize transcription status
-        transcription_jobs[job_id] = {
+        await transcription_jobs.put.aio(job_id, {
             "status": "processing",
             "progress": 0,
             "segments": None,
             "text": None,
             "started_at": datetime.utcnow().isoformat(),
-        }
+        })
         
         # Spawn transcription
-        transcribe_audio.spawn(audio_r2_key, job_id)
+        await transcribe_audio.spawn.aio(audio_r2_key, job_id)
         
         return {
             "job_id": job_id,
@@ -1040,7 +2510,7 @@ def fastapi_app():
     @web_app.get("/transcribe/{job_id}")
     async def get_transcription_status(job_id: str):
         """Get transcription status and results"""
-        status = transcription_jobs.get(job_id)
+        status = await transcription_cache.get(job_id)
         if not status:
             raise HTTPException(status_code=404, detail="Transcription job not found")
         
@@ -1102,6 +2572,7 @@ def transcribe_audio(audio_r2_key: str, job_id: str):
         import tempfile
         import os
         from datetime import datetime
+        from r2_transfer import download_file
         
         s3 = get_r2_client()
         
@@ -1117,7 +2588,7 @@ def transcribe_audio(audio_r2_key: str, job_id: str):
         }
         
         # Download audio
-        s3.download_file(R2_BUCKET, audio_r2_key, local_path)
+        download_file(s3, R2_BUCKET, audio_r2_key, local_path)
         
         # Update status
         transcription_jobs[job_id] = {
@@ -0,0 +1,68 @@
+"""
+Per-job routing of Matchering log messages.
+
+`mg.log(handler)` sets one process-wide handler. Registering a new handler
+for every job meant that with two jobs in the same process (concurrent
+container inputs, or the local server's thread pool) the last job to start
+received every message, and the other job's progress froze or jumped.
+
+Instead, one dispatcher is installed per process and each job runs inside
+`job_progress(job_id, handler)`, which binds the job id to the current
+context (a ContextVar, so per thread and per task). The dispatcher looks
+the id up and forwards the message to that job's handler. Messages logged
+outside any job context are printed.
+
+Usage:
+    with job_progress(job_id, log_handler):
+        mg.process(...)            # or match_array(...)
+"""
+
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+_current_job: ContextVar[str | None] = ContextVar("matchering_job", default=None)
+_handlers: dict[str, Callable[[str], None]] = {}
+_install_lock = threading.Lock()
+_installed = False
+
+
+def _dispatch(message: str) -> None:
+    job_id = _current_job.get()
+    handler = _handlers.get(job_id) if job_id else None
+    if handler is None:
+        print(f"Matchering: {message}")
+        return
+    try:
+        handler(message)
+    except Exception as e:
+        # A progress update must never fail the job
+        print(f"[progress] handler for {job_id} failed: {e}")
+
+
+def install() -> None:
+    """Point Matchering's log at the dispatcher (once per process)."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        import matchering as mg
+
+        mg.log(_dispatch)
+        _installed = True
+
+
+@contextmanager
+def job_progress(job_id: str, handler: Callable[[str], None]) -> Iterator[None]:
+    """Send Matchering messages logged in this context to `handler`."""
+    install()
+    _handlers[job_id] = handler
+    token = _current_job.set(job_id)
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+        _handlers.pop(job_id, None)
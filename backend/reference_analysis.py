@@ -0,0 +1,251 @@
+"""
+Precomputed Matchering reference analysis for the built-in templates.
+
+Everything Matchering needs from a reference boils down to four numbers /
+arrays: the normalization coefficient, the RMS of the loudest pieces, and
+the average mid and side spectra of those pieces. For the templates baked
+into the image those never change, yet `mg.process` decodes and re-analyzes
+the (sometimes multi-hour MP3) reference on every job.
+
+scripts/build_reference_analysis.py stores that analysis as
+`<reference>.analysis.npz` next to the audio. At job time `load_analysis()`
+reads it back and `match_array()` runs the same stages as `mg.process`
+against the cached values instead of the reference audio. The target comes
+in as an array and the result goes out as one, so nothing is written to
+disk between noise reduction, Matchering and the mastering chain. Uploaded
+(non-template) references, and templates whose cache is stale, go through
+`analyze_reference()` first.
+"""
+
+from __future__ import annotations
+
+import os
+
+import numpy as np
+from scipy import signal, interpolate
+
+import matchering as mg
+from matchering.log import Code, info, debug, debug_line, ModuleError
+from matchering.dsp import amplify, clip, size, channel_count, smooth_lowess
+from matchering.stage_helpers import (
+    normalize_reference,
+    analyze_levels,
+    convolve,
+    get_average_rms,
+    get_lpis_and_match_rms,
+    get_rms_c_and_amplify_pair,
+)
+from matchering.limiter import limit
+
+ANALYSIS_VERSION = 1
+ANALYSIS_SUFFIX = ".analysis.npz"
+
+# Config fields that change the reference analysis. A cached file built with
+# different values is ignored and the reference audio is analyzed instead.
+_FINGERPRINT_FIELDS = ("internal_sample_rate", "max_piece_size", "threshold", "min_value", "fft_size")
+
+
+def podcast_config() -> mg.Config:
+    """Matchering config shared by the job pipeline and the analysis builder.
+
+    We deliberately leave headroom (threshold=0.95) so the post-Matchering
+    chain (LUFS makeup gain + true-peak limiter) has room to work without
+    fighting Matchering's internal limiter."""
+    return mg.Config(
+        max_length=635_040_000,
+        threshold=0.95,
+    )
+
+
+def _average_fft(loudest_pieces: np.ndarray, config: mg.Config) -> np.ndarray:
+    *_, specs = signal.stft(
+        loudest_pieces,
+        config.internal_sample_rate,
+        window="boxcar",
+        nperseg=config.fft_size,
+        noverlap=0,
+        boundary=None,
+        padded=False,
+    )
+    return np.abs(specs).mean((0, 2))
+
+
+def _smooth_exponentially(matching_fft: np.ndarray, config: mg.Config) -> np.ndarray:
+    grid_linear = (
+        config.internal_sample_rate * 0.5 * np.linspace(0, 1, config.fft_size // 2 + 1)
+    )
+    grid_logarithmic = (
+        config.internal_sample_rate
+        * 0.5
+        * np.logspace(
+            np.log10(4 / config.fft_size),
+            0,
+            (config.fft_size // 2) * config.lin_log_oversampling + 1,
+        )
+    )
+
+    interpolator = interpolate.interp1d(grid_linear, matching_fft, "cubic")
+    matching_fft_log = interpolator(grid_logarithmic)
+    matching_fft_log_filtered = smooth_lowess(
+        matching_fft_log, config.lowess_frac, config.lowess_it, config.lowess_delta
+    )
+    interpolator = interpolate.interp1d(
+        grid_logarithmic, matching_fft_log_filtered, "cubic", fill_value="extrapolate"
+    )
+    matching_fft_filtered = interpolator(grid_linear)
+
+    matching_fft_filtered[0] = 0
+    matching_fft_filtered[1] = matching_fft[1]
+    return matching_fft_filtered
+
+
+def _fir(target_loudest_pieces: np.ndarray, reference_average_fft: np.ndarray,
+         name: str, config: mg.Config) -> np.ndarray:
+    """matchering.stage_helpers.get_fir, with the reference side precomputed."""
+    debug(f"Calculating the {name} FIR for the matching EQ...")
+    target_average_fft = _average_fft(target_loudest_pieces, config)
+    np.maximum(config.min_value, target_average_fft, out=target_average_fft)
+    matching_fft = reference_average_fft / target_average_fft
+
+    matching_fft_filtered = _smooth_exponentially(matching_fft, config)
+
+    fir = np.fft.irfft(matching_fft_filtered)
+    fir = np.fft.ifftshift(fir) * signal.windows.hann(len(fir))
+    return fir
+
+
+def analyze_reference(path: str, config: mg.Config) -> dict:
+    """Decode a reference and reduce it to what Matchering uses from it."""
+    temp_folder = config.temp_folder or os.path.dirname(os.path.abspath(path))
+    reference, sample_rate = mg.load(path, "reference", temp_folder)
+    reference, sample_rate = mg.check(reference, sample_rate, config, "reference")
+
+    reference, final_amplitude_coefficient = normalize_reference(reference, config)
+    _, _, mid_pieces, side_pieces, match_rms, *_ = analyze_levels(reference, "reference", config)
+
+    return {
+        "version": ANALYSIS_VERSION,
+        "source_file": os.path.basename(path),
+        "source_size": os.path.getsize(path),
+        "final_amplitude_coefficient": float(final_amplitude_coefficient),
+        "match_rms": float(match_rms),
+        "mid_fft": _average_fft(mid_pieces, config),
+        "side_fft": _average_fft(side_pieces, config),
+        **{field: getattr(config, field) for field in _FINGERPRINT_FIELDS},
+    }
+
+
+def save_analysis(analysis: dict, path: str) -> None:
+    # np.savez appends .npz when missing; our suffix already ends with it
+    np.savez(path, **{k: np.asarray(v) for k, v in analysis.items()})
+
+
+def load_analysis(path: str, config: mg.Config, reference_path: str) -> dict | None:
+    """Load a cached analysis, or None if it is missing or doesn't match the
+    reference file / config it would be used with."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            analysis = {k: data[k] for k in data.files}
+    except Exception as e:
+        print(f"[reference] failed to load analysis {path}: {e}")
+        return None
+
+    if int(analysis.get("version", -1)) != ANALYSIS_VERSION:
+        return None
+    if str(analysis.get("source_file")) != os.path.basename(reference_path):
+        return None
+    if int(analysis.get("source_size", -1)) != os.path.getsize(reference_path):
+        return None
+    for field in _FINGERPRINT_FIELDS:
+        if not np.isclose(float(analysis[field]), float(getattr(config, field))):
+            return None
+
+    analysis["final_amplitude_coefficient"] = float(analysis["final_amplitude_coefficient"])
+    analysis["match_rms"] = float(analysis["match_rms"])
+    return analysis
+
+
+def _match(target: np.ndarray, target_sample_rate: int, analysis: dict, config: mg.Config) -> np.ndarray:
+    """Levels, frequencies and level correction of `mg.process` for an
+    already-loaded target. Returns the pre-limiter result."""
+    target, target_sample_rate = mg.check(target, target_sample_rate, config, "target")
+
+    if (
+        target_sample_rate != config.internal_sample_rate
+        or channel_count(target) != 2
+        or size(target) <= config.fft_size
+    ):
+        raise ModuleError(Code.ERROR_VALIDATION)
+
+    # Levels
+    debug_line()
+    info(Code.INFO_MATCHING_LEVELS)
+    (
+        target_mid,
+        target_side,
+        target_mid_loudest_pieces,
+        target_side_loudest_pieces,
+        target_match_rms,
+        target_divisions,
+        target_piece_size,
+    ) = analyze_levels(target, "target", config)
+    del target
+
+    reference_match_rms = analysis["match_rms"]
+    rms_coefficient, target_mid, target_side = get_rms_c_and_amplify_pair(
+        target_mid, target_side, target_match_rms, reference_match_rms, config.min_value, "target",
+    )
+    target_mid_loudest_pieces = amplify(target_mid_loudest_pieces, rms_coefficient)
+    target_side_loudest_pieces = amplify(target_side_loudest_pieces, rms_coefficient)
+
+    # Frequencies
+    debug_line()
+    info(Code.INFO_MATCHING_FREQS)
+    mid_fir = _fir(target_mid_loudest_pieces, analysis["mid_fft"], "mid", config)
+    side_fir = _fir(target_side_loudest_pieces, analysis["side_fft"], "side", config)
+    del target_mid_loudest_pieces, target_side_loudest_pieces
+
+    result, result_mid = convolve(target_mid, mid_fir, target_side, side_fir)
+    del target_mid, target_side
+
+    # Level correction
+    debug_line()
+    info(Code.INFO_CORRECTING_LEVELS)
+    for step in range(1, config.rms_correction_steps + 1):
+        debug(f"Applying RMS correction #{step}...")
+        result_mid_clipped = clip(result_mid)
+        _, clipped_rmses, clipped_average_rms = get_average_rms(
+            result_mid_clipped, target_piece_size, target_divisions, "result"
+        )
+        _, result_mid_clipped_match_rms = get_lpis_and_match_rms(clipped_rmses, clipped_average_rms)
+        _, result_mid, result = get_rms_c_and_amplify_pair(
+            result_mid, result, result_mid_clipped_match_rms, reference_match_rms, config.min_value, "result",
+        )
+    return result
+
+
+def match_array(target: np.ndarray, target_sample_rate: int, analysis: dict,
+                config: mg.Config) -> np.ndarray:
+    """Same stages as `mg.process`, with the reference side read from a
+    precomputed analysis, for a target that is already in memory. Returns
+    the limited result instead of writing it.
+
+    `target` is (frames, channels); the result is (frames, 2) float32 at
+    `config.internal_sample_rate`, clipped to [-1, 1] like a PCM write would."""
+    debug_line()
+    info(Code.INFO_LOADING)
+    result = _match(np.asarray(target, dtype=np.float64), target_sample_rate, analysis, config)
+
+    debug_line()
+    info(Code.INFO_FINALIZING)
+    limited = amplify(limit(result, config), analysis["final_amplitude_coefficient"])
+    del result
+    out = limited.astype(np.float32)
+    del limited
+    np.clip(out, -1.0, 1.0, out=out)
+
+    debug_line()
+    info(Code.INFO_COMPLETED)
+    return out
@@ -0,0 +1,146 @@
+"""
+Container sizing for mastering jobs.
+
+process_audio used to request 4 CPUs / 8 GB / 10 h for every job. The
+pipeline's peak memory, though, is set by one stage — Matchering holds the
+whole target at float64 plus its mid/side/result working set — and grows
+linearly with duration, while everything after it streams. So a 3-minute
+clip needs a fraction of that, and a 2-hour show needs several times more.
+
+The per-stage model below comes from profiling runs on synthetic 44.1/48
+kHz mono and stereo input (peak RSS above the imported-process baseline,
+wall time on one core). No results file is checked in (bench_results/ is
+ignored), so treat the numbers as estimates and refresh them from
+scripts/benchmark_pipeline.py, which reports peak RSS and wall time per
+stage:
+
+    python scripts/benchmark_pipeline.py --preset standard --noise-reduction
+
+Divide each stage's peak RSS and wall time by the case's duration and
+update the constants below with the largest values across cases:
+
+    decode             4 bytes x channels x sample rate per second of audio
+    noise reduction    ~1.0 MB/s stereo, 0.043 s/s   (peaks below Matchering)
+    Matchering         ~4.0 MB/s at 44.1 kHz stereo (mono is upmixed first),
+                       0.036 s/s; 0.10 s/s when it has to resample
+    mastering chain    streamed — the held result is 0.35 MB/s, 0.013 s/s
+
+Peak = baseline + decoded target + Matchering working set. Each tier is
+sized from this model for the longest show it should take (stereo, 48 kHz,
+noise reduction on: the costliest common case), so re-measuring the model
+resizes the tiers. A job goes to the smallest tier whose memory (with
+headroom) and timeout (with a safety factor) cover it.
+
+Uploads we couldn't probe go to the large tier. Their size still gives a
+lower bound on duration (no common format packs audio denser than 24-bit
+stereo 48 kHz PCM), which moves them to xlarge if even that doesn't fit.
+"""
+
+from __future__ import annotations
+
+import math
+
+MATCHERING_SAMPLE_RATE = 44100
+
+# Process after imports + reference analysis + excerpts + handoff reserve
+BASELINE_MB = 600.0
+DECODE_BYTES_PER_SAMPLE = 4                   # float32
+MATCHERING_MB_PER_SECOND = 4.0                # stereo @ 44.1 kHz
+NOISE_REDUCTION_MB_PER_SECOND = 1.0           # stereo; peaks before Matchering
+
+MATCHERING_SECONDS_PER_SECOND = 0.036
+RESAMPLE_SECONDS_PER_SECOND = 0.065           # extra when source rate != 44.1 kHz
+NOISE_REDUCTION_SECONDS_PER_SECOND = 0.043    # stereo
+CHAIN_SECONDS_PER_SECOND = 0.013
+TRANSFER_MB_PER_SECOND = 50.0                 # R2 download + upload
+MAX_BYTES_PER_SECOND = 288000                 # 24-bit stereo 48 kHz PCM: lower bound on duration from size
+
+# Use at most this share of a tier's memory; allow this much longer than predicted
+MEMORY_HEADROOM = 0.85
+TIME_SAFETY = 4.0
+
+# Every stage runs on one core (the times above are single-core). Extra
+# cores only serve the transfer and decode threads, whose load grows with
+# the audio held, so CPU follows memory: a core per this much, at least one.
+MEMORY_MB_PER_CPU = 16384
+MEMORY_STEP_MB = 2048
+TIMEOUT_STEP_S = 600
+# Added to every timeout for what the model leaves out: analyzing an
+# uploaded reference, slow R2 transfers, cold containers
+TIMEOUT_ALLOWANCE_S = 1800
+MIN_TIMEOUT_S = 3600
+
+# Ordered smallest first: the longest show (minutes) each tier is sized for.
+# The largest is sized for Matchering's max_length (4 h at 44.1 kHz).
+TIER_MINUTES = {"small": 15, "medium": 45, "large": 90, "xlarge": 240}
+# Where uploads we couldn't probe go
+UNPROBED_TIER = "large"
+
+
+def estimate(duration_s: float, channels: int, sample_rate: int, noise_reduction: bool) -> dict:
+    """Predicted peak memory (MB) and wall time (s) of one job."""
+    channels = max(1, int(channels))
+    rate_scale = max(sample_rate, MATCHERING_SAMPLE_RATE) / MATCHERING_SAMPLE_RATE
+    decoded_mb = duration_s * channels * sample_rate * DECODE_BYTES_PER_SAMPLE / 1e6
+
+    matchering_mb = duration_s * MATCHERING_MB_PER_SECOND * rate_scale
+    peak_mb = BASELINE_MB + decoded_mb + matchering_mb
+    if noise_reduction:
+        nr_mb = duration_s * NOISE_REDUCTION_MB_PER_SECOND * channels / 2
+        peak_mb = max(peak_mb, BASELINE_MB + decoded_mb + nr_mb)
+
+    seconds = duration_s * (MATCHERING_SECONDS_PER_SECOND + CHAIN_SECONDS_PER_SECOND)
+    if sample_rate != MATCHERING_SAMPLE_RATE:
+        seconds += duration_s * RESAMPLE_SECONDS_PER_SECOND
+    if noise_reduction:
+        seconds += duration_s * NOISE_REDUCTION_SECONDS_PER_SECOND * channels / 2
+    # Download the source, upload a 16/24-bit master of about the same size
+    seconds += 2 * decoded_mb / 2 / TRANSFER_MB_PER_SECOND
+
+    return {"memory_mb": peak_mb, "seconds": seconds}
+
+
+def required_timeout(seconds: float) -> float:
+    """Timeout a job predicted to take `seconds` needs."""
+    return seconds * TIME_SAFETY + TIMEOUT_ALLOWANCE_S
+
+
+def tier_resources(minutes: float) -> dict:
+    """Modal resources ({"cpu", "memory", "timeout"}) for a job of up to
+    `minutes` of stereo 48 kHz audio with noise reduction."""
+    need = estimate(minutes * 60, 2, 48000, noise_reduction=True)
+    memory = math.ceil(need["memory_mb"] / MEMORY_HEADROOM / MEMORY_STEP_MB) * MEMORY_STEP_MB
+    return {
+        "cpu": float(max(1, math.ceil(memory / MEMORY_MB_PER_CPU))),
+        "memory": memory,
+        "timeout": max(MIN_TIMEOUT_S, math.ceil(required_timeout(need["seconds"]) / TIMEOUT_STEP_S) * TIMEOUT_STEP_S),
+    }
+
+
+TIERS = {name: tier_resources(minutes) for name, minutes in TIER_MINUTES.items()}
+LARGEST_TIER = list(TIERS)[-1]
+
+
+def fits(need: dict, tier: str) -> bool:
+    resources = TIERS[tier]
+    return (need["memory_mb"] <= resources["memory"] * MEMORY_HEADROOM
+            and required_timeout(need["seconds"]) <= resources["timeout"])
+
+
+def choose_tier(probe: dict | None, noise_reduction: bool = False, size: int | None = None) -> str:
+    """Smallest tier that fits a probed upload ({"duration", "channels",
+    "sample_rate"}), or the largest if none does. Without a probe,
+    UNPROBED_TIER unless the upload's `size` in bytes shows it can't fit."""
+    if not (probe and probe.get("duration")):
+        need = estimate((size or 0) / MAX_BYTES_PER_SECOND, 2, 48000, noise_reduction)
+        return UNPROBED_TIER if fits(need, UNPROBED_TIER) else LARGEST_TIER
+    need = estimate(
+        float(probe["duration"]),
+        int(probe.get("channels") or 2),
+        int(probe.get("sample_rate") or MATCHERING_SAMPLE_RATE),
+        noise_reduction,
+    )
+    for name in TIERS:
+        if fits(need, name):
+            return name
+    return LARGEST_TIER
@@ -0,0 +1,480 @@
+r"""
+Local benchmark of the mastering pipeline on a deterministic synthetic corpus.
+
+Nothing here touches Modal or R2: each case runs the same DSP that
+`master_job()` runs, stage by stage, and records wall time, CPU time, peak
+RSS and bytes per stage (instrumentation.Spans), then the whole chain again
+end to end. Results go to a JSON file named after the current commit, so two
+runs can be compared with --compare.
+
+Run locally:
+    cd backend
+    pip install matchering soundfile scipy pedalboard numpy noisereduce
+    python scripts/benchmark_pipeline.py                       # "quick" preset
+    python scripts/benchmark_pipeline.py --preset standard
+    python scripts/benchmark_pipeline.py --compare bench_results/<old>.json
+
+Corpus
+------
+Generated once into --corpus-dir (default bench_corpus/, reused on later
+runs) as 16-bit WAVs, block by block so even 4-hour files are written with
+flat memory. Everything is seeded by the case name, so a case is
+bit-identical across machines and commits:
+
+    speech         band-limited noise with a ~4 Hz syllable envelope, 2–6 s
+                   phrases, short pauses and a 2–5 s silence gap per minute
+    speech_music   speech over a music bed ~18 dB down
+    music          chord pads that change every few seconds + noise hats
+
+Mono and stereo, 44.1 and 48 kHz, 1 minute to 4 hours. The reference is a
+synthetic 60 s speech_music clip analyzed once per case, as a template
+analysis would be.
+
+Stages
+------
+    decode              sf.read of the WAV into float32
+    noise_reduction     noisereduce, as in master_job (skipped if not installed)
+    reference_analysis  analyze_reference() of the reference
+    matchering          match_array() — what process_audio runs instead of
+                        mg.process since the in-memory handoff
+    polish              polish chain + loudness metering pass
+    loudness_solve      solve_makeup_gain() on the excerpts
+    loudness_pass       polish -> gain -> limiter -> write (one per render)
+    write               sf.write of the matched audio alone (PCM_16)
+    end_to_end          decode -> ... -> final render, in one span
+
+Peak memory of Matchering is ~4 MB per second of stereo audio (see
+routing.py): the "full" preset's 4-hour cases need a 64 GB machine.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# mastering_chain / reference_analysis / instrumentation live in backend/
+sys.path.insert(0, str(BACKEND_DIR))
+
+TARGET_LUFS = -14.0
+TRUE_PEAK_DB = -1.0
+GEN_BLOCK_SECONDS = 10
+
+REFERENCE_CASE = ("speech_music", 60, 2, 44100)
+
+# (kind, seconds, channels, sample_rate)
+PRESETS = {
+    "quick": [
+        ("speech", 60, 1, 44100),
+        ("speech_music", 60, 2, 48000),
+        ("music", 60, 2, 44100),
+        ("speech", 600, 2, 44100),
+    ],
+    "standard": [
+        ("speech", 60, 1, 44100),
+        ("speech_music", 60, 2, 48000),
+        ("music", 60, 2, 44100),
+        ("speech", 600, 2, 44100),
+        ("speech", 600, 1, 48000),
+        ("speech_music", 1800, 2, 44100),
+        ("speech", 3600, 2, 48000),
+    ],
+    "full": [
+        ("speech", 60, 1, 44100),
+        ("speech_music", 60, 2, 48000),
+        ("music", 60, 2, 44100),
+        ("speech", 600, 2, 44100),
+        ("speech", 600, 1, 48000),
+        ("speech_music", 1800, 2, 44100),
+        ("speech", 3600, 2, 48000),
+        ("speech_music", 7200, 2, 44100),
+        ("speech", 14400, 1, 44100),
+        ("speech_music", 14400, 2, 48000),
+    ],
+}
+
+
+def case_name(kind: str, seconds: int, channels: int, sample_rate: int) -> str:
+    layout = "stereo" if channels == 2 else "mono"
+    return f"{kind}_{seconds}s_{layout}_{sample_rate // 1000}k"
+
+
+# ---------------------------------------------------------------------------
+# Synthetic corpus
+# ---------------------------------------------------------------------------
+
+def _segments(rng, seconds: float, on_range, off_range, gap_every: float | None):
+    """Boundaries (start times) and on/off flags of a phrase schedule."""
+    import numpy as np
+
+    starts, flags = [], []
+    t, next_gap = 0.0, gap_every
+    while t < seconds:
+        if next_gap is not None and t >= next_gap:
+            length, on = rng.uniform(2.0, 5.0), False        # silence gap
+            next_gap += gap_every
+        elif not flags or not flags[-1]:
+            length, on = rng.uniform(*on_range), True
+        else:
+            length, on = rng.uniform(*off_range), False
+        starts.append(t)
+        flags.append(on)
+        t += length
+    return np.array(starts), np.array(flags)
+
+
+class _Voice:
+    """Speech-like signal: band-limited noise, syllable-rate envelope, phrases."""
+
+    def __init__(self, rng, seconds: float, sample_rate: int, channels: int):
+        import numpy as np
+        from scipy import signal
+
+        self.rng = rng
+        self.sr = sample_rate
+        self.channels = channels
+        self.sos = signal.butter(4, [120.0, 4000.0], btype="bandpass", fs=sample_rate, output="sos")
+        self.zi = np.zeros((self.sos.shape[0], 2))
+        self.starts, self.on = _segments(rng, seconds, (2.0, 6.0), (0.2, 0.8), 60.0)
+        self.syllable_hz = 4.0
+        self.pan = 0.8 if channels == 2 else 1.0
+
+    def block(self, t0: float, frames: int):
+        import numpy as np
+        from scipy import signal
+
+        t = t0 + np.arange(frames) / self.sr
+        idx = np.searchsorted(self.starts, t, side="right") - 1
+        gate = self.on[idx].astype(np.float32)
+        envelope = 0.5 * (1.0 + np.sin(2 * np.pi * self.syllable_hz * t + 0.7 * np.sin(2 * np.pi * 0.3 * t)))
+        noise = self.rng.standard_normal(frames)
+        voiced, self.zi = signal.sosfilt(self.sos, noise, zi=self.zi)
+        mono = (0.25 * voiced * envelope ** 2 * gate).astype(np.float32)
+        if self.channels == 1:
+            return mono[:, None]
+        return np.stack([mono, mono * self.pan], axis=1)
+
+
+class _Bed:
+    """Music bed: chord pads changing every few seconds plus noise hats."""
+
+    def __init__(self, rng, sample_rate: int, channels: int):
+        self.rng = rng
+        self.sr = sample_rate
+        self.channels = channels
+
+    def block(self, t0: float, frames: int):
+        import numpy as np
+
+        t = t0 + np.arange(frames) / self.sr
+        roots = np.array([110.0, 130.81, 98.0, 146.83])
+        root = roots[(t // 4.0).astype(np.int64) % len(roots)]     # new chord every 4 s
+        pad = sum(np.sin(2 * np.pi * root * ratio * t) for ratio in (1.0, 1.25, 1.5, 2.0)) / 4
+        beat = (t * 2.0) % 1.0
+        hats = self.rng.standard_normal(frames) * np.exp(-beat * 40.0) * 0.3
+        mono = (0.2 * pad + hats * 0.2).astype(np.float32)
+        if self.channels == 1:
+            return mono[:, None]
+        right = (0.2 * pad * 0.9 + hats * 0.25).astype(np.float32)
+        return np.stack([mono, right], axis=1)
+
+
+def generate_case(path: Path, kind: str, seconds: int, channels: int, sample_rate: int) -> None:
+    """Write one corpus file, GEN_BLOCK_SECONDS at a time."""
+    import numpy as np
+    import soundfile as sf
+
+    seed = zlib.crc32(case_name(kind, seconds, channels, sample_rate).encode())
+    rng = np.random.default_rng(seed)
+    voice = _Voice(rng, seconds, sample_rate, channels) if kind != "music" else None
+    bed = _Bed(rng, sample_rate, channels) if kind != "speech" else None
+    bed_gain = 10 ** (-18 / 20) if kind == "speech_music" else 1.0
+
+    tmp = path.with_suffix(".partial.wav")
+    block = GEN_BLOCK_SECONDS * sample_rate
+    total = seconds * sample_rate
+    with sf.SoundFile(str(tmp), "w", samplerate=sample_rate, channels=channels, subtype="PCM_16") as out:
+        for start in range(0, total, block):
+            frames = min(block, total - start)
+            t0 = start / sample_rate
+            audio = np.zeros((frames, channels), dtype=np.float32)
+            if voice:
+                audio += voice.block(t0, frames)
+            if bed:
+                audio += bed.block(t0, frames) * bed_gain
+            out.write(np.clip(audio, -1.0, 1.0))
+    tmp.rename(path)
+
+
+def corpus_file(corpus_dir: Path, case: tuple) -> Path:
+    path = corpus_dir / f"{case_name(*case)}.wav"
+    if not path.exists():
+        print(f"Generating {path.name}...")
+        generate_case(path, *case)
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+def _noise_reduce(audio, sr):
+    import noisereduce as nr
+
+    reduced = nr.reduce_noise(
+        y=audio.T, sr=sr, stationary=False, prop_decrease=0.75, n_fft=1024, time_constant_s=2.0,
+    )
+    return reduced.T.astype("float32")
+
+
+def _buffer(audio, sample_rate: int) -> dict:
+    """Minimal in-memory handoff buffer (see handoff.py) for mastering_chain."""
+    return {"audio": audio, "sample_rate": sample_rate, "reads": 0, "nbytes": audio.nbytes}
+
+
+def _render(buf: dict, dst: str, polish_chain, meter, excerpts, spans=None):
+    """Solve + up to two render passes, as master_job does. Returns
+    (final_lufs, gain_db, passes)."""
+    from contextlib import nullcontext
+
+    import numpy as np
+    from mastering_chain import (
+        LOUDNESS_TOLERANCE_LU, MAX_GAIN_DB, render_master, solve_makeup_gain,
+    )
+
+    span = spans.span if spans else (lambda *a, **k: nullcontext({}))
+    with span("loudness_solve", sum(e.nbytes for e in excerpts)):
+        gain_db = solve_makeup_gain(meter, excerpts, buf["sample_rate"], TARGET_LUFS, TRUE_PEAK_DB)
+
+    measured, passes = float("nan"), 0
+    for pass_idx in range(2):
+        with span("loudness_pass", buf["nbytes"]) as record:
+            out_meter = render_master(
+                buf, dst, polish_chain, gain_db=gain_db, ceiling_db=TRUE_PEAK_DB,
+                subtype="PCM_16", stats=record,
+            )
+            record["pass"] = pass_idx + 1
+            record["write_s"] = round(record.get("write_s", 0.0), 3)
+        measured = out_meter.integrated_loudness()
+        passes += 1
+        if not np.isfinite(measured) or abs(TARGET_LUFS - measured) < LOUDNESS_TOLERANCE_LU:
+            break
+        gain_db = float(np.clip(gain_db + TARGET_LUFS - measured, -MAX_GAIN_DB, MAX_GAIN_DB))
+    return measured, gain_db, passes
+
+
+def run_case(target: str, reference: str, noise_reduction: bool, end_to_end: bool) -> dict:
+    """Benchmark one corpus file. Runs in its own process so peak memory of
+    one case never carries into the next."""
+    import soundfile as sf
+    from instrumentation import Spans
+    from mastering_chain import build_polish_chain, measure_polished
+    from reference_analysis import analyze_reference, match_array, podcast_config
+
+    config = podcast_config()
+    spans = Spans(Path(target).stem)
+    polish_chain = build_polish_chain("podcast")
+    has_nr = True
+    try:
+        import noisereduce  # noqa: F401
+    except ImportError:
+        has_nr = False
+    noise_reduction = noise_reduction and has_nr
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dst = os.path.join(tmp, "mastered.wav")
+
+        # --- stages in isolation -------------------------------------------
+        with spans.span("decode", os.path.getsize(target)):
+            audio, sr = sf.read(target, always_2d=True, dtype="float32")
+
+        if noise_reduction:
+            with spans.span("noise_reduction", audio.nbytes):
+                audio = _noise_reduce(audio, sr)
+
+        with spans.span("reference_analysis", os.path.getsize(reference)):
+            analysis = analyze_reference(reference, config)
+
+        with spans.span("matchering", audio.nbytes):
+            matched = match_array(audio, sr, analysis, config)
+        del audio
+        buf = _buffer(matched, config.internal_sample_rate)
+
+        with spans.span("polish", buf["nbytes"]):
+            meter, excerpts = measure_polished(buf, polish_chain)
+        final_lufs, gain_db, passes = _render(buf, dst, polish_chain, meter, excerpts, spans)
+        del excerpts
+
+        with spans.span("write", buf["nbytes"]) as record:
+            sf.write(os.path.join(tmp, "write.wav"), matched, buf["sample_rate"], subtype="PCM_16")
+            record["written_bytes"] = os.path.getsize(os.path.join(tmp, "write.wav"))
+        del matched, buf
+
+        result = {
+            "stages": spans.to_list(),
+            "noise_reduction": noise_reduction,
+            "final_lufs": round(final_lufs, 2),
+            "gain_db": round(gain_db, 2),
+            "render_passes": passes,
+        }
+
+        # --- whole chain, one span -----------------------------------------
+        if end_to_end:
+            total = Spans(Path(target).stem)
+            with total.span("end_to_end", os.path.getsize(target)):
+                audio, sr = sf.read(target, always_2d=True, dtype="float32")
+                if noise_reduction:
+                    audio = _noise_reduce(audio, sr)
+                buf = _buffer(match_array(audio, sr, analysis, config), config.internal_sample_rate)
+                del audio
+                meter, excerpts = measure_polished(buf, polish_chain)
+                _render(buf, dst, polish_chain, meter, excerpts)
+            result["end_to_end"] = total.to_list()[0]
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Results
+# ---------------------------------------------------------------------------
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _versions() -> dict:
+    from importlib import metadata
+
+    versions = {}
+    for package in ("numpy", "scipy", "soundfile", "pedalboard", "matchering", "noisereduce"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Stages whose wall time or peak RSS grew by more than `threshold`
+    (a fraction) against the baseline run. Stages under 0.5 s are ignored
+    for time — they're noise."""
+    old_cases = {c["name"]: c for c in baseline.get("cases", [])}
+    regressions = []
+    for case in current["cases"]:
+        old = old_cases.get(case["name"])
+        if not old:
+            continue
+        old_stages = {(s["stage"], s.get("pass")): s for s in old["stages"]}
+        if "end_to_end" in old:
+            old_stages[("end_to_end", None)] = old["end_to_end"]
+        stages = list(case["stages"]) + ([case["end_to_end"]] if "end_to_end" in case else [])
+        for stage in stages:
+            before = old_stages.get((stage["stage"], stage.get("pass")))
+            if not before:
+                continue
+            label = f"{case['name']} {stage['stage']}" + (f" #{stage['pass']}" if stage.get("pass") else "")
+            if before["wall_s"] >= 0.5 and stage["wall_s"] > before["wall_s"] * (1 + threshold):
+                regressions.append(f"{label}: wall {before['wall_s']:.2f} s -> {stage['wall_s']:.2f} s")
+            if stage["peak_rss_mb"] > before["peak_rss_mb"] * (1 + threshold):
+                regressions.append(
+                    f"{label}: peak RSS {before['peak_rss_mb']:.0f} MB -> {stage['peak_rss_mb']:.0f} MB"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    parser.add_argument("--cases", nargs="*", help="only run cases whose name contains one of these")
+    parser.add_argument("--corpus-dir", type=Path, default=BACKEND_DIR / "bench_corpus")
+    parser.add_argument("--output", type=Path, help="results JSON (default bench_results/<commit>.json)")
+    parser.add_argument("--noise-reduction", action="store_true", help="include the noisereduce stage")
+    parser.add_argument("--no-end-to-end", action="store_true", help="skip the end-to-end run per case")
+    parser.add_argument("--compare", type=Path, help="baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="regression threshold (default 20%%)")
+    args = parser.parse_args()
+
+    cases = PRESETS[args.preset]
+    if args.cases:
+        cases = [c for c in cases if any(f in case_name(*c) for f in args.cases)]
+
+    args.corpus_dir.mkdir(parents=True, exist_ok=True)
+    reference = corpus_file(args.corpus_dir, REFERENCE_CASE)
+
+    commit = _git_commit()
+    results = {
+        "created_at": datetime.utcnow().isoformat(),
+        "git_commit": commit,
+        "preset": args.preset,
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "versions": _versions(),
+        "target_lufs": TARGET_LUFS,
+        "cases": [],
+    }
+
+    for case in cases:
+        name = case_name(*case)
+        target = corpus_file(args.corpus_dir, case)
+        with open(target, "rb") as f:
+            digest = hashlib.sha256(f.read(1 << 20)).hexdigest()[:12]
+        print(f"\n=== {name} ===")
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            result = pool.submit(
+                run_case, str(target), str(reference), args.noise_reduction, not args.no_end_to_end,
+            ).result()
+        kind, seconds, channels, sample_rate = case
+        results["cases"].append({
+            "name": name,
+            "kind": kind,
+            "duration": seconds,
+            "channels": channels,
+            "sample_rate": sample_rate,
+            "corpus_sha256_1mb": digest,
+            **result,
+        })
+        e2e = result.get("end_to_end")
+        print(
+            f"{name}: {result['final_lufs']:.2f} LUFS in {result['render_passes']} pass(es)"
+            + (f", end to end {e2e['wall_s']:.1f} s, peak {e2e['peak_rss_mb']:.0f} MB" if e2e else "")
+        )
+
+    output = args.output or BACKEND_DIR / "bench_results" / f"{commit or 'nocommit'}-{args.preset}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) vs {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions vs {args.compare} (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
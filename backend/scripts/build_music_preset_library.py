@@ -11,7 +11,7 @@ music page can filter for them.
 
 USAGE (locally, NOT in Modal):
     cd backend
-    pip install requests librosa pyloudnorm pedalboard pydub numpy
+    pip install requests librosa pedalboard pydub numpy scipy soundfile
     python scripts/build_music_preset_library.py
 
     # then redeploy Modal so the new references + manifest get baked in:
@@ -29,7 +29,8 @@ from urllib.parse import quote
 
 import requests
 
-REFS_DIR = Path(__file__).resolve().parent.parent / "references"
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+REFS_DIR = BACKEND_DIR / "references"
 MANIFEST_PATH = REFS_DIR / "manifest.json"
 TARGET_LUFS = -14.0
 TRUE_PEAK_DB = -1.0
@@ -38,6 +39,9 @@ SAMPLE_DURATION_S = 180     # 3 min is plenty for spectral matching
 MIN_USABLE_DURATION_S = 120
 MAX_BYTES = 80 * 1024 * 1024   # cap per-track download (most music tracks are 5-15 MB)
 
+# mastering_chain / loudness live in backend/
+sys.path.insert(0, str(BACKEND_DIR))
+
 
 # Each query targets a genre. We take the top CC-BY audio result, prefer
 # items with descriptive titles, and bundle as a music preset.
@@ -150,10 +154,10 @@ def download_to(url: str, dest: Path, session: requests.Session, max_bytes: int
 def process_to_preset(src: Path, dst: Path) -> tuple[float, float]:
     import numpy as np
     import librosa
-    import pyloudnorm as pyln
-    from pedalboard import Pedalboard, Gain, Limiter
     from pydub import AudioSegment
 
+    from mastering_chain import normalize_loudness
+
     audio_arr, sr = librosa.load(str(src), sr=None, mono=False)
     if audio_arr.ndim == 1:
         audio = audio_arr[None, :]
@@ -172,38 +176,10 @@ def process_to_preset(src: Path, dst: Path) -> tuple[float, float]:
         start, end = 0, n_samples
     audio = audio[:, start:end].astype("float32")
 
-    audio_for_meter = audio.T
-    meter = pyln.Meter(sr)
-    try:
-        source_lufs = float(meter.integrated_loudness(audio_for_meter))
-    except Exception:
-        source_lufs = -23.0
+    out, source_lufs, final_lufs, _, _ = normalize_loudness(audio, sr, TARGET_LUFS, TRUE_PEAK_DB)
     if not np.isfinite(source_lufs) or source_lufs < -70:
         source_lufs = -40.0
 
-    audio_pb = np.ascontiguousarray(audio)
-    delta_db = (TARGET_LUFS - source_lufs) + 0.3
-    final_lufs = source_lufs
-    for _ in range(3):
-        delta_db = float(np.clip(delta_db, -24.0, 24.0))
-        chain = Pedalboard([
-            Gain(gain_db=delta_db),
-            Limiter(threshold_db=TRUE_PEAK_DB, release_ms=100.0),
-        ])
-        audio_pb = chain(audio_pb, sr)
-        try:
-            measured = float(meter.integrated_loudness(audio_pb.T))
-        except Exception:
-            break
-        if not np.isfinite(measured):
-            break
-        final_lufs = measured
-        diff = TARGET_LUFS - measured
-        if abs(diff) < 0.3:
-            break
-        delta_db = diff
-
-    out = np.clip(audio_pb, -1.0, 1.0)
     int16 = (out.T * 32767.0).astype("int16")
     channels = int16.shape[1] if int16.ndim == 2 else 1
 
@@ -10,7 +10,7 @@ follow-up code change is required to expose the new presets in /templates.
 
 USAGE (locally, NOT in Modal):
     cd backend
-    pip install requests feedparser librosa pyloudnorm pedalboard pydub numpy
+    pip install requests feedparser librosa pedalboard pydub numpy scipy soundfile
     # ffmpeg must be on PATH for pydub's MP3 encode.  On Windows:
     #     winget install Gyan.FFmpeg
     python scripts/build_preset_library.py
@@ -34,7 +34,8 @@ import time
 from pathlib import Path
 from urllib.parse import quote
 
-REFS_DIR = Path(__file__).resolve().parent.parent / "references"
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+REFS_DIR = BACKEND_DIR / "references"
 MANIFEST_PATH = REFS_DIR / "manifest.json"
 TARGET_LUFS = -14.0
 TRUE_PEAK_DB = -1.0
@@ -42,6 +43,9 @@ SAMPLE_OFFSET_S = 120      # skip first 2 minutes (intros / sponsor reads)
 SAMPLE_DURATION_S = 300    # take 5 minutes of representative audio
 MIN_USABLE_DURATION_S = 180  # if episode is shorter than 3 min, skip
 
+# mastering_chain / loudness live in backend/
+sys.path.insert(0, str(BACKEND_DIR))
+
 
 # --- The curated list ---------------------------------------------------------
 # Shows known for above-average audio production. Order in this list is the
@@ -180,10 +184,10 @@ def process_to_preset(src_mp3: Path, dst_mp3: Path) -> tuple[float, float]:
     """
     import numpy as np
     import librosa
-    import pyloudnorm as pyln
-    from pedalboard import Pedalboard, Gain, Limiter
     from pydub import AudioSegment
 
+    from mastering_chain import normalize_loudness
+
     # Load (librosa handles MP3/M4A via audioread / soundfile / ffmpeg).
     audio_mono_or_stereo, sr = librosa.load(str(src_mp3), sr=None, mono=False)
     if audio_mono_or_stereo.ndim == 1:
@@ -207,40 +211,11 @@ def process_to_preset(src_mp3: Path, dst_mp3: Path) -> tuple[float, float]:
         start, end = 0, n_samples
     audio = audio[:, start:end].astype("float32")
 
-    # Measure source loudness (pyloudnorm expects (samples, channels))
-    audio_for_meter = audio.T
-    meter = pyln.Meter(sr)
-    try:
-        source_lufs = float(meter.integrated_loudness(audio_for_meter))
-    except Exception:
-        source_lufs = -23.0
+    # Same solver as the main pipeline: one render, one correction at most.
+    out, source_lufs, final_lufs, _, _ = normalize_loudness(audio, sr, TARGET_LUFS, TRUE_PEAK_DB)
     if not np.isfinite(source_lufs) or source_lufs < -70:
         source_lufs = -40.0
 
-    # Iterative LUFS targeting (same convergence loop as the main pipeline).
-    audio_pb = np.ascontiguousarray(audio)  # (channels, samples) for pedalboard
-    delta_db = (TARGET_LUFS - source_lufs) + 0.3
-    final_lufs = source_lufs
-    for _ in range(3):
-        delta_db = float(np.clip(delta_db, -24.0, 24.0))
-        chain = Pedalboard([
-            Gain(gain_db=delta_db),
-            Limiter(threshold_db=TRUE_PEAK_DB, release_ms=100.0),
-        ])
-        audio_pb = chain(audio_pb, sr)
-        try:
-            measured = float(meter.integrated_loudness(audio_pb.T))
-        except Exception:
-            break
-        if not np.isfinite(measured):
-            break
-        final_lufs = measured
-        diff = TARGET_LUFS - measured
-        if abs(diff) < 0.3:
-            break
-        delta_db = diff
-
-    out = np.clip(audio_pb, -1.0, 1.0)
     # Convert (channels, samples) float32 → int16 interleaved (samples, channels)
     int16 = (out.T * 32767.0).astype("int16")
     channels = int16.shape[1] if int16.ndim == 2 else 1
@@ -0,0 +1,124 @@
+r"""
+Precompute the Matchering analysis of every reference template so jobs don't
+have to decode and re-analyze the same baked-in audio on every run.
+
+For each built-in template and each manifest entry, picks the same file
+modal_app.py would use (`.wav` if present, else `.mp3`), runs the reference
+half of Matchering's analysis, and writes `<base>.analysis.npz` next to it.
+Manifest entries get an `"analysis"` field pointing at their file; built-in
+templates are found by the `<base_path>.analysis.npz` naming convention.
+
+At job time reference_analysis.load_analysis() checks the cached file still
+matches the audio (name + size) and the Matchering config, and falls back to
+analyzing the audio if it doesn't — so a stale cache is slow, never wrong.
+
+Run locally (NOT in Modal), after build_preset_library.py /
+remaster_references.py:
+    cd backend
+    pip install matchering numpy scipy
+    python scripts/build_reference_analysis.py
+    modal deploy modal_app.py
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+REFS_DIR = BACKEND_DIR / "references"
+MANIFEST_PATH = REFS_DIR / "manifest.json"
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Base names of the templates hard-coded in modal_app._REFERENCE_TEMPLATE_DEFS
+BUILTIN_BASES = [
+    "voice-optimized",
+    "femalepodcast",
+    "maleonlyvoicesfullproduction",
+    "maleandfemalenewssounds",
+]
+
+
+def pick_reference(base: str) -> Path | None:
+    """Mirror of modal_app._pick_reference_path()."""
+    wav = REFS_DIR / f"{base}.wav"
+    mp3 = REFS_DIR / f"{base}.mp3"
+    if wav.exists():
+        return wav
+    if mp3.exists():
+        return mp3
+    return None
+
+
+def build_one(base: str, config) -> str | None:
+    """Analyze one reference; returns the analysis file name, or None."""
+    from reference_analysis import ANALYSIS_SUFFIX, analyze_reference, load_analysis, save_analysis
+
+    src = pick_reference(base)
+    if src is None:
+        print(f"  MISS : {base} (no .wav/.mp3)")
+        return None
+
+    dst = REFS_DIR / f"{base}{ANALYSIS_SUFFIX}"
+    if load_analysis(str(dst), config, str(src)) is not None:
+        print(f"  KEEP : {src.name}")
+        return dst.name
+
+    analysis = analyze_reference(str(src), config)
+    save_analysis(analysis, str(dst))
+    print(
+        f"  OK   : {src.name:<45} "
+        f"match_rms {analysis['match_rms']:.4f}  -> {dst.name}"
+    )
+    return dst.name
+
+
+def main() -> int:
+    from reference_analysis import podcast_config
+
+    if not REFS_DIR.exists():
+        print(f"References dir not found: {REFS_DIR}", file=sys.stderr)
+        return 1
+
+    config = podcast_config()
+    print(f"Building reference analysis -> {REFS_DIR}\n")
+
+    failed: list[tuple[str, str]] = []
+    for base in BUILTIN_BASES:
+        try:
+            build_one(base, config)
+        except Exception as e:
+            failed.append((base, str(e)))
+            print(f"  FAIL : {base} ({e})")
+
+    entries: list[dict] = []
+    if MANIFEST_PATH.exists():
+        entries = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+
+    for entry in entries:
+        base = Path(entry["file"]).stem
+        try:
+            analysis_file = build_one(base, config)
+        except Exception as e:
+            failed.append((base, str(e)))
+            print(f"  FAIL : {base} ({e})")
+            analysis_file = None
+        if analysis_file:
+            entry["analysis"] = analysis_file
+        else:
+            entry.pop("analysis", None)
+
+    if entries:
+        MANIFEST_PATH.write_text(json.dumps(entries, indent=2), encoding="utf-8")
+
+    print(f"\nDone. failed={len(failed)}")
+    for name, err in failed:
+        print(f"  - {name}: {err}")
+    print("Next: `modal deploy modal_app.py` to bake the analysis files into the image.")
+    return 0 if not failed else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
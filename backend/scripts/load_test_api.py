@@ -0,0 +1,210 @@
+r"""
+Load test for the web API (fastapi_app): how many concurrent requests one
+deployment serves, and whether slow requests stall the others.
+
+For each concurrency level, N client threads send requests back to back
+for --duration seconds. Meanwhile a canary thread times `GET /` (no Dict
+or R2 work) once every 100 ms. If handlers block the event loop, the
+canary's latency climbs with load. If they don't, it stays flat while
+the scenario's own latency grows.
+
+Run it against a dev deployment, not production. `upload-url` creates
+file_metadata entries, though cleanup expires them like any other
+upload:
+
+    cd backend
+    modal serve modal_app.py                       # prints the dev URL
+    python scripts/load_test_api.py --url https://...-dev.modal.run
+    python scripts/load_test_api.py --url ... --scenario mixed --concurrency 1,32,128,512
+    python scripts/load_test_api.py --url ... --job-id <id> --out load.json
+
+Scenarios
+---------
+    status        GET /status/{id}: the --job-id given (cache hits) or a
+                  fresh random id per request (a Dict read each)
+    download      GET /download/{id} without following the redirect
+                  (a Dict read + presigning); needs a completed --job-id
+    upload-url    POST /get-upload-url (presigning + Dict writes)
+    confirm       POST /confirm-upload for an unknown file (Dict read, 404)
+    mixed         all of the above, round robin
+
+404s from random ids are expected and counted as answered. Only 5xx
+responses and transport errors count as errors.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ("status", "download", "upload-url", "confirm", "mixed")
+CANARY_INTERVAL_S = 0.1
+REQUEST_TIMEOUT_S = 60
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def request(method: str, url: str) -> tuple[int, float]:
+    """(HTTP status or 0 on transport error, seconds)."""
+    started = time.perf_counter()
+    try:
+        with _opener.open(urllib.request.Request(url, method=method), timeout=REQUEST_TIMEOUT_S) as r:
+            r.read()
+            code = r.status
+    except urllib.error.HTTPError as e:
+        code = e.code
+    except Exception:
+        code = 0
+    return code, time.perf_counter() - started
+
+
+def scenario_requests(base: str, scenario: str, job_id: str | None):
+    """Endless (method, url) iterator for a scenario."""
+    def status():
+        return "GET", f"{base}/status/{job_id or uuid.uuid4()}"
+
+    def download():
+        return "GET", f"{base}/download/{job_id or uuid.uuid4()}"
+
+    def upload_url():
+        return "POST", f"{base}/get-upload-url?filename=loadtest-{uuid.uuid4().hex[:8]}.wav"
+
+    def confirm():
+        return "POST", f"{base}/confirm-upload?file_id={uuid.uuid4()}"
+
+    makers = {"status": [status], "download": [download], "upload-url": [upload_url], "confirm": [confirm]}
+    makers["mixed"] = [status, download, upload_url, confirm]
+    for make in itertools.cycle(makers[scenario]):
+        yield make()
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def summarize(latencies: list[float], codes: dict, seconds: float) -> dict:
+    ms = [x * 1000 for x in latencies]
+    return {
+        "requests": len(ms),
+        "req_per_s": round(len(ms) / seconds, 1) if seconds else None,
+        "p50_ms": round(percentile(ms, 50), 1) if ms else None,
+        "p95_ms": round(percentile(ms, 95), 1) if ms else None,
+        "p99_ms": round(percentile(ms, 99), 1) if ms else None,
+        "mean_ms": round(statistics.fmean(ms), 1) if ms else None,
+        "codes": {str(k): v for k, v in sorted(codes.items())},
+        "errors": sum(v for k, v in codes.items() if k == 0 or k >= 500),
+    }
+
+
+def run_level(base: str, scenario: str, job_id: str | None, concurrency: int, duration: float) -> dict:
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies: list[float] = []
+    codes: dict[int, int] = {}
+    canary: list[float] = []
+    canary_codes: dict[int, int] = {}
+
+    def client():
+        for method, url in scenario_requests(base, scenario, job_id):
+            if stop.is_set():
+                return
+            code, seconds = request(method, url)
+            with lock:
+                latencies.append(seconds)
+                codes[code] = codes.get(code, 0) + 1
+
+    def probe():
+        while not stop.is_set():
+            code, seconds = request("GET", f"{base}/")
+            canary.append(seconds)
+            canary_codes[code] = canary_codes.get(code, 0) + 1
+            stop.wait(CANARY_INTERVAL_S)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency + 1) as pool:
+        pool.submit(probe)
+        for _ in range(concurrency):
+            pool.submit(client)
+        time.sleep(duration)
+        stop.set()
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 1),
+        **summarize(latencies, codes, elapsed),
+        "canary": summarize(canary, canary_codes, elapsed),
+    }
+
+
+def print_table(levels: list[dict]) -> None:
+    print(f"\n{'conc':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}   canary p50 / p99 ms (GET /)")
+    for r in levels:
+        c = r["canary"]
+        print(
+            f"{r['concurrency']:>6} {r['req_per_s'] or 0:>8.1f} {r['p50_ms'] or 0:>8.0f} {r['p95_ms'] or 0:>8.0f} "
+            f"{r['p99_ms'] or 0:>8.0f} {r['errors']:>7}   {c['p50_ms'] or 0:.0f} / {c['p99_ms'] or 0:.0f}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default=os.environ.get("API_URL") or os.environ.get("NEXT_PUBLIC_API_URL"),
+                        help="API base URL (default: $API_URL or $NEXT_PUBLIC_API_URL)")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="status")
+    parser.add_argument("--concurrency", default="1,16,64,256",
+                        help="comma-separated client counts, one run each (default: 1,16,64,256)")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per concurrency level")
+    parser.add_argument("--job-id", help="existing job for status/download (default: random ids)")
+    parser.add_argument("--out", help="write results as JSON here")
+    args = parser.parse_args()
+
+    if not args.url:
+        parser.error("--url (or API_URL) is required")
+    base = args.url.rstrip("/")
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    code, seconds = request("GET", f"{base}/")
+    if code != 200:
+        print(f"{base}/ answered {code or 'nothing'}; is the app deployed?", file=sys.stderr)
+        return 1
+    print(f"{base}: {args.scenario}, {args.duration:.0f} s per level (warm-up {seconds * 1000:.0f} ms)")
+
+    results = []
+    for concurrency in levels:
+        result = run_level(base, args.scenario, args.job_id, concurrency, args.duration)
+        results.append(result)
+        print(
+            f"  x{concurrency}: {result['req_per_s']} req/s, p95 {result['p95_ms']} ms, "
+            f"{result['errors']} errors, canary p95 {result['canary']['p95_ms']} ms"
+        )
+    print_table(results)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"url": base, "scenario": args.scenario, "job_id": args.job_id,
+                       "duration_s": args.duration, "levels": results}, f, indent=2)
+        print(f"\nWrote {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,7 +8,7 @@ them automatically. The script is idempotent — re-running just overwrites.
 
 Run locally (NOT in Modal):
     cd backend
-    pip install soundfile pyloudnorm pedalboard numpy librosa
+    pip install soundfile scipy pedalboard numpy librosa
     python scripts/remaster_references.py
     # Then `modal deploy modal_app.py` (references/ is gitignored — it's
     # uploaded directly to Modal at deploy time via add_local_dir).
@@ -37,10 +37,14 @@ from __future__ import annotations
 import sys
 from pathlib import Path
 
-REFS_DIR = Path(__file__).resolve().parent.parent / "references"
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+REFS_DIR = BACKEND_DIR / "references"
 TARGET_LUFS = -14.0
 TRUE_PEAK_DB = -1.0
 
+# mastering_chain / loudness live in backend/
+sys.path.insert(0, str(BACKEND_DIR))
+
 REFERENCE_FILES = [
     "voice-optimized.mp3",
     "femalepodcast.mp3",
@@ -52,8 +56,8 @@ REFERENCE_FILES = [
 def remaster_one(src: Path, dst: Path) -> None:
     import numpy as np
     import soundfile as sf
-    import pyloudnorm as pyln
-    from pedalboard import Pedalboard, Gain, Limiter
+
+    from mastering_chain import normalize_loudness
 
     # soundfile can't read MP3 on all platforms; use librosa for decode.
     if src.suffix.lower() == ".mp3":
@@ -69,46 +73,14 @@ def remaster_one(src: Path, dst: Path) -> None:
 
     audio = audio.astype("float32")
 
-    # Measure loudness
-    meter = pyln.Meter(sr)
-    try:
-        current_lufs = float(meter.integrated_loudness(audio))
-    except Exception:
-        current_lufs = -23.0
+    # Same solver as the main pipeline: the gain is predicted from one
+    # metering pass, so the reference is rendered once (twice at most).
+    out, current_lufs, final_lufs, applied_gain_db, _ = normalize_loudness(
+        audio.T, sr, TARGET_LUFS, TRUE_PEAK_DB,
+    )
     if not np.isfinite(current_lufs):
         current_lufs = -23.0
-
-    # 2-pass iterative gain to actually hit the target. BS.1770's gating
-    # makes single-pass `target - measured` overshoot by 1-3 dB on dynamic
-    # content. Iterate up to 3 times with corrective gains.
-    audio_pb = np.ascontiguousarray(audio.T)
-    applied_gain_db = 0.0
-    delta_db = TARGET_LUFS - current_lufs + 0.3
-
-    final_lufs = float("nan")
-    for _ in range(3):
-        delta_db = float(np.clip(delta_db, -24.0, 24.0))
-        chain = Pedalboard([
-            Gain(gain_db=delta_db),
-            Limiter(threshold_db=TRUE_PEAK_DB, release_ms=100.0),
-        ])
-        audio_pb = chain(audio_pb, sr)
-        applied_gain_db += delta_db
-        try:
-            measured = float(meter.integrated_loudness(audio_pb.T))
-        except Exception:
-            break
-        if not np.isfinite(measured):
-            break
-        final_lufs = measured
-        diff = TARGET_LUFS - measured
-        if abs(diff) < 0.3:
-            break
-        delta_db = diff
-
-    out = audio_pb.T
-    out = np.nan_to_num(out, nan=0.0, posinf=1.0, neginf=-1.0)
-    out = np.clip(out, -1.0, 1.0)
+    out = out.T
 
     # Write 24-bit WAV
     sf.write(str(dst), out, sr, subtype="PCM_24")
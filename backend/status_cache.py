@@ -0,0 +1,82 @@
+"""
+Short-lived read cache in front of the status Dicts.
+
+Every `GET /status/{job_id}` (and `/transcribe/{job_id}`) used to be its
+own modal.Dict read, so a popular job polled from many tabs cost one
+remote read per poll. `TTLCache` keeps each value for `ttl_s` (sub-second,
+so clients still see progress move) in the API container's memory, and
+collapses concurrent misses for the same key into a single fetch: callers
+arriving while a read is in flight wait for that read.
+
+`get_many()` fetches a list of keys concurrently (modal.Dict has no
+multi-get), at most `concurrency` reads at a time, for `POST /status/batch`
+and `/batch/{batch_id}`.
+
+Cached values are shared between callers — copy before modifying.
+
+Usage:
+    statuses = TTLCache(job_statuses.get.aio)
+    status = await statuses.get(job_id)
+    by_id = await statuses.get_many(job_ids)     # {job_id: status | None}
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+TTL_S = 0.5
+CONCURRENCY = 32
+# Expired entries are swept once the cache grows past this
+MAX_ENTRIES = 10_000
+
+
+class TTLCache:
+    """Per-process cache of async `fetch(key)` results, `ttl_s` fresh."""
+
+    def __init__(self, fetch: Callable[[str], Awaitable], ttl_s: float = TTL_S,
+                 concurrency: int = CONCURRENCY):
+        self.fetch = fetch
+        self.ttl_s = ttl_s
+        self._entries: dict[str, tuple[float, object]] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl_s:
+            self.hits += 1
+            return entry[1]
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._inflight[key] = asyncio.create_task(self._load(key))
+        # Shielded: one caller giving up (client disconnect) doesn't cancel
+        # the read the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str):
+        try:
+            async with self._semaphore:
+                value = await self.fetch(key)
+            if len(self._entries) >= MAX_ENTRIES:
+                self._sweep()
+            self._entries[key] = (time.monotonic(), value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _sweep(self) -> None:
+        cutoff = time.monotonic() - self.ttl_s
+        for key in [k for k, (at, _) in self._entries.items() if at < cutoff]:
+            del self._entries[key]
+
+    async def get_many(self, keys: list[str]) -> dict:
+        values = await asyncio.gather(*(self.get(k) for k in keys))
+        return dict(zip(keys, values))
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
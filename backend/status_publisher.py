@@ -0,0 +1,125 @@
+"""
+Coalescing job-status writer.
+
+master_job used to read and rewrite the job's modal.Dict entry on every
+progress tick — two remote round trips per `update_status` call and per
+Matchering log line, on the worker's critical path. A `StatusPublisher`
+keeps the job's status locally instead: updates only merge into that copy,
+and a background thread writes it out
+
+  * at most once every `interval_s` while updates keep coming, and
+  * promptly (without waiting out the interval) when a stage changes.
+
+`close(final)` stops the thread and writes the final state synchronously,
+so nothing published afterwards can overwrite a completed/failed status.
+Like every write, it is merged into the entry as read at construction,
+so fields other writers set (`batch_id` from /master/batch) survive.
+
+Usage:
+    status = StatusPublisher(job_statuses, job_id)
+    status.update(progress=40, message="Analyzing...")          # coalesced
+    status.update(progress=75, message="Polishing...", stage=True)
+    status.close({"status": "completed", ...})
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+FLUSH_INTERVAL_S = 0.5
+# The final write is retried (with a growing pause) before close() raises
+FINAL_WRITE_ATTEMPTS = 3
+
+
+class StatusPublisher:
+    """Background writer for one job's entry in a Dict-like store."""
+
+    def __init__(self, store, job_id: str, interval_s: float = FLUSH_INTERVAL_S):
+        self.store = store
+        self.job_id = job_id
+        self.interval_s = interval_s
+        self.writes = 0
+        self.updates = 0
+        try:
+            self._state = dict(store.get(job_id) or {})
+        except Exception as e:
+            print(f"[status] could not read status for {job_id}: {e}")
+            self._state = {}
+        self._dirty = False
+        self._urgent = False
+        self._closed = False
+        self._last_flush = 0.0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"status-{job_id}", daemon=True)
+        self._thread.start()
+
+    def update(self, stage: bool = False, **fields) -> None:
+        """Merge `fields` into the status. `stage=True` marks a stage change,
+        which is flushed right away (in the background) instead of waiting
+        for the interval."""
+        with self._cond:
+            if self._closed:
+                return
+            self._state.update(fields)
+            self._dirty = True
+            self._urgent = self._urgent or stage
+            self.updates += 1
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and not (self._dirty and self._ready()):
+                    timeout = None
+                    if self._dirty:
+                        timeout = max(0.0, self._last_flush + self.interval_s - time.monotonic())
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                snapshot = dict(self._state)
+                self._dirty = self._urgent = False
+                self._last_flush = time.monotonic()
+            self._write(snapshot)
+
+    def _ready(self) -> bool:
+        return self._urgent or time.monotonic() - self._last_flush >= self.interval_s
+
+    def _write(self, state: dict) -> None:
+        try:
+            self.store[self.job_id] = state
+            self.writes += 1
+        except Exception as e:
+            # Leave it to the next tick / close() rather than failing the job
+            print(f"[status] write failed for {self.job_id}: {e}")
+            with self._cond:
+                self._dirty = True
+
+    def close(self, final: dict | None = None) -> None:
+        """Stop publishing. With `final`, merge it into the status and write
+        that before returning (raising if FINAL_WRITE_ATTEMPTS writes fail);
+        without, pending updates are dropped — the caller is about to write
+        the status itself."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        # A write already in flight finishes before we write the final state
+        self._thread.join()
+        try:
+            if final is not None:
+                self._write_final(final)
+        finally:
+            print(f"[status] {self.job_id}: {self.updates} updates in {self.writes} writes")
+
+    def _write_final(self, final: dict) -> None:
+        self._state.update(final)
+        for attempt in range(1, FINAL_WRITE_ATTEMPTS + 1):
+            try:
+                self.store[self.job_id] = dict(self._state)
+                self.writes += 1
+                return
+            except Exception as e:
+                if attempt == FINAL_WRITE_ATTEMPTS:
+                    raise
+                print(f"[status] final write failed for {self.job_id} (attempt {attempt}): {e}")
+                time.sleep(0.5 * attempt)
@@ -0,0 +1,186 @@
+"""
+Push job status to clients instead of having every tab poll.
+
+Each open tab polling `GET /status/{job_id}` once a second is one store
+read per tab per second. `StatusWatchers` runs one upstream watcher per
+job per process: an asyncio task that reads the job's status every
+`interval_s` and wakes all of that job's subscribers when it changes.
+A hundred tabs on one job cost one read per interval. The watcher stops
+when the job reaches a terminal state, disappears, or loses its last
+subscriber.
+
+Both servers build their endpoints on it:
+
+    GET /status/{job_id}/stream         Server-sent events: the full status
+                                        first, then only the fields that
+                                        changed; an `end` event on a
+                                        terminal state.
+    GET /status/{job_id}/wait?etag=...  Long poll: answers as soon as the
+                                        status differs from `etag` (or at
+                                        `timeout`), with the status and its
+                                        new etag.
+
+Usage:
+    watchers = StatusWatchers(fetch_status)       # async fetch(job_id) -> dict | None
+    return StreamingResponse(watchers.sse(job_id), media_type="text/event-stream")
+    state = await watchers.wait_for_change(job_id, etag, timeout_s=25)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+TERMINAL_STATUSES = ("completed", "failed")
+POLL_INTERVAL_S = 1.0
+# Comment line sent on an idle stream so proxies don't close it
+KEEPALIVE_S = 15
+# Close streams before the serving function's request timeout; EventSource
+# reconnects on its own
+STREAM_MAX_S = 240
+LONG_POLL_MAX_S = 30
+
+# Yielded by subscribe() when nothing changed for heartbeat_s
+KEEPALIVE = object()
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def status_etag(state: dict | None) -> str:
+    raw = json.dumps(state, sort_keys=True, default=str).encode()
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def changed_fields(previous: dict | None, current: dict) -> dict:
+    if previous is None:
+        return dict(current)
+    return {k: v for k, v in current.items() if previous.get(k) != v}
+
+
+class _Watcher:
+    def __init__(self):
+        self.state: dict | None = None
+        self.version = 0
+        self.done = False
+        self.subscribers = 0
+        self.cond = asyncio.Condition()
+        self.task: asyncio.Task | None = None
+
+
+class StatusWatchers:
+    """One polling task per watched job, fanned out to every subscriber."""
+
+    def __init__(self, fetch: Callable[[str], Awaitable[dict | None]], interval_s: float = POLL_INTERVAL_S):
+        self.fetch = fetch
+        self.interval_s = interval_s
+        self._watchers: dict[str, _Watcher] = {}
+
+    async def _watch(self, job_id: str, watcher: _Watcher) -> None:
+        try:
+            while True:
+                try:
+                    state = await self.fetch(job_id)
+                except Exception as e:
+                    # Transient store error: keep the last state, try again
+                    print(f"[status] watch {job_id}: {e}")
+                else:
+                    finished = state is None or state.get("status") in TERMINAL_STATUSES
+                    if state != watcher.state or finished:
+                        async with watcher.cond:
+                            if state != watcher.state:
+                                watcher.state = state
+                                watcher.version += 1
+                            watcher.done = finished
+                            watcher.cond.notify_all()
+                    if finished:
+                        return
+                await asyncio.sleep(self.interval_s)
+        finally:
+            # A finished watcher is replaced on the next subscribe
+            if self._watchers.get(job_id) is watcher:
+                del self._watchers[job_id]
+
+    async def subscribe(self, job_id: str, heartbeat_s: float | None = None) -> AsyncIterator:
+        """Yield the job's status now and after each change (None once if
+        the job doesn't exist or is removed); stops after a terminal state.
+        With `heartbeat_s`, yields KEEPALIVE after that long without one."""
+        watcher = self._watchers.get(job_id)
+        if watcher is None:
+            watcher = self._watchers[job_id] = _Watcher()
+            watcher.task = asyncio.create_task(self._watch(job_id, watcher))
+        watcher.subscribers += 1
+        seen = 0
+        try:
+            while True:
+                state, done = KEEPALIVE, False
+                async with watcher.cond:
+                    ready = lambda: watcher.version > seen or watcher.done
+                    try:
+                        await asyncio.wait_for(watcher.cond.wait_for(ready), heartbeat_s)
+                    except asyncio.TimeoutError:
+                        pass
+                    else:
+                        if watcher.version > seen:
+                            seen = watcher.version
+                            state = watcher.state
+                        done = watcher.done
+                # Yield outside the lock: a slow client mustn't hold up the watcher
+                if state is not KEEPALIVE or not done:
+                    yield state
+                if done:
+                    return
+        finally:
+            watcher.subscribers -= 1
+            if watcher.subscribers == 0 and not watcher.done:
+                # Unregister first so a new subscriber starts a fresh watcher
+                if self._watchers.get(job_id) is watcher:
+                    del self._watchers[job_id]
+                watcher.task.cancel()
+
+    async def sse(self, job_id: str, public: Callable[[dict], dict] = dict) -> AsyncIterator[str]:
+        """Server-sent events for one job. `public` picks the fields sent."""
+        deadline = time.monotonic() + STREAM_MAX_S
+        sent = None
+        yield "retry: 2000\n\n"
+        async for state in self.subscribe(job_id, heartbeat_s=KEEPALIVE_S):
+            if state is KEEPALIVE:
+                yield ": keepalive\n\n"
+            elif state is None:
+                yield 'event: end\ndata: {"status": "not_found"}\n\n'
+                return
+            else:
+                state = public(state)
+                changes = changed_fields(sent, state)
+                sent = state
+                if changes:
+                    yield f"event: status\ndata: {json.dumps(changes, default=str)}\n\n"
+                if state.get("status") in TERMINAL_STATUSES:
+                    yield f"event: end\ndata: {json.dumps({'status': state['status']})}\n\n"
+                    return
+            if time.monotonic() > deadline:
+                return
+
+    async def wait_for_change(self, job_id: str, etag: str | None, timeout_s: float,
+                              public: Callable[[dict], dict] = dict) -> tuple[dict | None, str]:
+        """Long poll: the job's status once its etag differs from `etag`, or
+        the unchanged status after `timeout_s`. Returns (status, etag)."""
+        latest = {}
+
+        async def first_change():
+            async for state in self.subscribe(job_id):
+                latest["state"] = None if state is None else public(state)
+                if latest["state"] is None or status_etag(latest["state"]) != etag:
+                    return
+
+        try:
+            await asyncio.wait_for(first_change(), min(timeout_s, LONG_POLL_MAX_S))
+        except asyncio.TimeoutError:
+            pass
+        if "state" not in latest:
+            # Timed out before the first read came back
+            state = await self.fetch(job_id)
+            latest["state"] = None if state is None else public(state)
+        return latest["state"], status_etag(latest["state"])
@@ -6,7 +6,6 @@ Uses OpenAI Whisper for accurate transcription
 import modal
 from pathlib import Path
 import tempfile
-import os
 
 # Create transcription-specific image with whisper
 transcription_image = (
@@ -17,6 +16,7 @@ transcription_image = (
         "fastapi>=0.109.0",
         "boto3>=1.34.0",
     )
+    .add_local_python_source("r2_transfer")  # Parallel ranged R2 downloads
 )
 
 app = modal.App("podcast-transcription")
@@ -29,15 +29,9 @@ R2_ENDPOINT = f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com"
 
 
 def get_r2_client():
-    """Create an S3 client configured for Cloudflare R2"""
-    import boto3
-    return boto3.client(
-        "s3",
-        endpoint_url=R2_ENDPOINT,
-        aws_access_key_id=os.environ["R2_ACCESS_KEY_ID"],
-        aws_secret_access_key=os.environ["R2_SECRET_ACCESS_KEY"],
-        region_name="auto",
-    )
+    """The container's S3 client for Cloudflare R2 (created once, reused)"""
+    from r2_transfer import shared_client
+    return shared_client(R2_ENDPOINT)
 
 
 @app.function(
@@ -54,7 +48,7 @@ def transcribe_audio(audio_r2_key: str, job_id: str):
     """
     import whisper
     import tempfile
-    import os
+    from r2_transfer import download_file
     
     s3 = get_r2_client()
     
@@ -62,7 +56,7 @@ def transcribe_audio(audio_r2_key: str, job_id: str):
     with tempfile.TemporaryDirectory() as temp_dir:
         # Download audio from R2
         local_path = Path(temp_dir) / "audio.wav"
-        s3.download_file(R2_BUCKET, audio_r2_key, str(local_path))
+        download_file(s3, R2_BUCKET, audio_r2_key, str(local_path))
         
         # Load Whisper model (base is good balance of speed/accuracy)
         print(f"[{job_id}] Loading Whisper model...")